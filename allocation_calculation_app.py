@@ -1,10 +1,10 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import math
 import json
 import time
 from datetime import datetime
+from portfolio_common.holdings_ingest import ingest_holdings
 
 # Set wide layout
 st.set_page_config(layout="wide")
@@ -21,14 +21,13 @@ name_mapping_inv = {
 # Create a mapping for yfinance tickers using the above values.
 yfinance_symbols = {k: f"{k}.NS" for k in name_mapping_inv.values()}
 
-# Aggregate holdings from multiple CSVs
+# Aggregate holdings from any number of broker CSV/JSON statements, streamed in chunks
 def aggregate_holdings(files):
-    dfs = [pd.read_csv(file) for file in files]
-    combined_df = pd.concat(dfs, ignore_index=True).rename(columns={'Qty.': 'Qty', 'Cur. val': 'Cur_val'})
-    return combined_df.groupby('Instrument').agg({'Qty': 'sum', 'LTP': 'first', 'Cur_val': 'sum'}).reset_index()
+    return ingest_holdings(files)
 
 # Fetch latest prices using yfinance; use fallback if the stock isn’t in yfinance_symbols.
 def fetch_latest_prices(stocks):
+    import yfinance as yf  # imported on first fetch, not at start-up
     latest_prices = {}
     for stock in stocks:
         # Use predefined ticker if available; otherwise assume stock + ".NS"
@@ -185,7 +184,7 @@ col1, col2 = st.columns([1, 2])
 
 with col1:
     st.subheader("Input Data")
-    uploaded_files = st.file_uploader("Upload CSV Files", accept_multiple_files=True, type="csv", help="Upload your portfolio CSV files")
+    uploaded_files = st.file_uploader("Upload Holdings Files", accept_multiple_files=True, type=["csv", "json", "jsonl"], help="Upload your broker CSV or JSON statements")
 
     default_ratios = {
         "BAJFINANCE": 6, "RELIANCE": 6, "KPITTECH": 5, "SOLARINDS": 5, "TATAPOWER": 5,
@@ -205,9 +204,13 @@ with col1:
 
     if st.button("Calculate", key="calc_button"):
         if not uploaded_files:
-            st.warning("Please upload CSV files to proceed.")
+            st.warning("Please upload holdings files to proceed.")
         else:
-            holdings_df = aggregate_holdings(uploaded_files)
+            try:
+                holdings_df = aggregate_holdings(uploaded_files)
+            except ValueError as e:
+                st.error(f"Couldn't read holdings: {e}")
+                st.stop()
             holdings_df['Current Value'] = holdings_df['Qty'] * holdings_df['LTP']
             total_value = holdings_df['Current Value'].sum()
             holdings_df['Allocation %'] = (
@@ -1,11 +1,19 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-import math
+import io
 import json
 import time
 from datetime import datetime
 import os
+from portfolio_common.holdings_ingest import ingest_holdings
+from portfolio_common.reference_bundle import ASSET_ALLOCATION_PATH, reference
+from rebalancing.cost_aware_optimizer import DEFAULT_COST_MODEL, DEFAULT_DRIFT_PENALTY
+from rebalancing.lookthrough_rebalancing import LookThroughSolver, load_fund_values
+from rebalancing.order_book import OrderBook, iter_child_orders, write_orders
+from rebalancing.rebalance_plan import plan_rebalancing
+from rebalancing.sector_caps import UNCLASSIFIED, sector_totals
+from update_asset_allocation.sector_taxonomy import load_symbol_sectors
+from refresh_prices.live_price_feed import BackgroundPriceRefresher, IncrementalAllocation, PriceTable
 
 # Set wide layout
 st.set_page_config(layout="wide")
@@ -23,23 +31,14 @@ name_mapping_inv = {
 # Create a mapping for yfinance tickers
 yfinance_symbols = {k: f"{k}.NS" for k in name_mapping_inv.values()}
 
-# Process JSON holdings
-def process_json_holdings(file):
-    data = json.load(file)
-    df = pd.DataFrame(data)
-    # Rename columns to match expected format
-    df = df.rename(columns={
-        "Symbol": "Instrument",
-        "Value": "Cur_val"
-    })
-    # Add Qty and LTP columns (we'll calculate LTP from Value if Qty isn't provided)
-    if 'Qty' not in df.columns:
-        df['Qty'] = 0  # Initial quantity can be 0 since we'll use current value
-    df['LTP'] = df['Cur_val']  # Will be updated with real prices
-    return df.groupby('Instrument').agg({'Qty': 'sum', 'LTP': 'first', 'Cur_val': 'sum'}).reset_index()
+# Process holdings statements (JSON breakdowns and broker CSVs), streamed in chunks and
+# aggregated by instrument; LTP is implied from value / quantity until real prices replace it
+def process_holdings_files(files):
+    return ingest_holdings(files)
 
 # Fetch latest prices using yfinance
 def fetch_latest_prices(stocks):
+    import yfinance as yf  # imported on first fetch, not at start-up
     latest_prices = {}
     for stock in stocks:
         ticker_symbol = yfinance_symbols.get(stock, f"{stock}.NS")
@@ -53,140 +52,65 @@ def fetch_latest_prices(stocks):
             latest_prices[stock] = 0
     return latest_prices
 
-# Calculate ideal allocation percentages
-def calculate_ideal_allocations(target_ratios):
-    total_ratio = sum(target_ratios.values())
-    return {stock: round(ratio / total_ratio * 100, 2) if total_ratio > 0 else 0 for stock, ratio in target_ratios.items()}
-
-# Calculate rebalancing actions
-def calculate_rebalancing(holdings_df, target_ratios, extra_funds=0, allocation_margin_percent=2.0):
-    if not target_ratios:
-        return [], {"status": "No Action", "amount": 0, "message": "No target ratios provided"}, holdings_df, [], {}
-
-    target_stocks = list(target_ratios.keys())
-    latest_prices = fetch_latest_prices(target_stocks)
-
-    # Include all target stocks
-    if not holdings_df.empty:
-        existing_holdings = holdings_df[holdings_df['Instrument'].isin(target_stocks)].copy()
-    else:
-        existing_holdings = pd.DataFrame()
-    existing_stocks = set(existing_holdings['Instrument'].tolist()) if not existing_holdings.empty else set()
-    missing_stocks = [stock for stock in target_stocks if stock not in existing_stocks]
-
-    new_stock_entries = pd.DataFrame([
-        {"Instrument": stock, "Qty": 0, "LTP": latest_prices.get(stock, 0), "Cur_val": 0}
-        for stock in missing_stocks
-    ])
-
-    filtered_holdings = pd.concat([existing_holdings, new_stock_entries], ignore_index=True)
-
-    # Update current value with latest prices
-    filtered_holdings['Current Value'] = filtered_holdings.apply(
-        lambda row: row['Qty'] * latest_prices.get(row['Instrument'], row['LTP']) if row['Qty'] > 0 else row['Cur_val'],
-        axis=1)
-    sell_proceeds = filtered_holdings['Current Value'].sum()
-    total_available_funds = sell_proceeds + extra_funds
-
-    total_ratio = sum(target_ratios.values())
-    if total_ratio == 0:
-        return [], {"status": "No Action", "amount": 0, "message": "Sum of target ratios is zero"}, filtered_holdings, [], {}
-
-    target_values = {stock: (target_ratios[stock] / total_ratio) * total_available_funds for stock in target_stocks}
-    ideal_allocations_percent = calculate_ideal_allocations(target_ratios)
-
-    updated_quantities = {
-        stock: math.floor(target_values[stock] / latest_prices.get(stock, 0))
-        if latest_prices.get(stock, 0) > 0 else 0
-        for stock in target_stocks
-    }
-    initial_cost = sum(updated_quantities[stock] * latest_prices.get(stock, 0) for stock in target_stocks)
-    available_funds = total_available_funds - initial_cost
-
-    min_price = min((price for price in latest_prices.values() if price > 0), default=float('inf'))
-    while available_funds > min_price:
-        current_portfolio_value = sum(updated_quantities[stock] * latest_prices.get(stock, 0) for stock in target_stocks)
-        total_value = current_portfolio_value + available_funds
-        candidates = [
-            (stock, ideal_allocations_percent[stock] - (updated_quantities[stock] * latest_prices.get(stock, 0) / total_value * 100 if total_value > 0 else 0), latest_prices[stock])
-            for stock in target_stocks if latest_prices.get(stock, 0) <= available_funds and latest_prices.get(stock, 0) > 0
-        ]
-        if not candidates:
-            break
-        stock_to_buy, _, ltp = max(candidates, key=lambda x: x[1])
-        updated_quantities[stock_to_buy] += 1
-        available_funds -= ltp
-
-    rebalancing_actions = []
-    for stock in target_stocks:
-        original_qty = filtered_holdings.loc[filtered_holdings['Instrument'] == stock, 'Qty'].iloc[0] if stock in filtered_holdings['Instrument'].values else 0
-        updated_qty = updated_quantities[stock]
-        stock_price = latest_prices.get(stock, 0)
-        if updated_qty > original_qty:
-            shares = math.floor(updated_qty - original_qty) # floor for buy
-            if shares > 0: # only add action if shares > 0
-                rebalancing_actions.append({
-                    "Instrument": stock,
-                    "Original Qty": original_qty,
-                    "Action": "Buy",
-                    "Shares": shares,
-                    "Value Bought/Sold": shares * stock_price,
-                    "Stock Price": stock_price,
-                    "New Qty": updated_qty
-                })
-        elif updated_qty < original_qty:
-            shares = math.floor(original_qty - updated_qty) # floor for sell
-            if shares > 0: # only add action if shares > 0
-                rebalancing_actions.append({
-                    "Instrument": stock,
-                    "Original Qty": original_qty,
-                    "Action": "Sell",
-                    "Shares": shares,
-                    "Value Bought/Sold": shares * stock_price,
-                    "Stock Price": stock_price,
-                    "New Qty": updated_qty
-                })
-
-    updated_holdings_df = pd.DataFrame([
-        {"Instrument": stock, "Qty": qty, "LTP": latest_prices.get(stock, 0), "Current Value": qty * latest_prices.get(stock, 0)}
-        for stock, qty in updated_quantities.items()
-    ])
-    new_portfolio_value = updated_holdings_df['Current Value'].sum()
-    updated_holdings_df['Allocation %'] = (
-        updated_holdings_df['Current Value'] / new_portfolio_value * 100
-    ).round(2) if new_portfolio_value > 0 else 0
-
-    non_target_holdings = holdings_df[~holdings_df['Instrument'].isin(target_stocks)].copy() if not holdings_df.empty else pd.DataFrame()
-    if not non_target_holdings.empty:
-        non_target_holdings['Current Value'] = non_target_holdings['Qty'] * non_target_holdings['Instrument'].map(latest_prices)
-        non_target_holdings['Allocation %'] = (
-            non_target_holdings['Current Value'] / (new_portfolio_value + non_target_holdings['Current Value'].sum()) * 100
-        ).round(2) if (new_portfolio_value + non_target_holdings['Current Value'].sum()) > 0 else 0
-        updated_holdings_df = pd.concat([updated_holdings_df, non_target_holdings], ignore_index=True)
-
-    funds_display = {
-        "status": "Excess Funds",
-        "amount": available_funds,
-        "message": f"₹{available_funds:.2f} remains unused after rebalancing."
-    }
-    tentative_holdings = [
-        {
-            "Stock": name_mapping_inv.get(row['Instrument'], row['Instrument']),
-            "Qty": row['Qty'],
-            "LTP": row['LTP'],
-            "Current Value (Qty × LTP)": row['Current Value'],
-            "Ideal Allocation %": ideal_allocations_percent.get(row['Instrument'], 0),
-            "Actual Allocation %": row['Allocation %']
-        }
-        for _, row in updated_holdings_df.iterrows()
-    ]
-
-    return (
-        sorted(rebalancing_actions, key=lambda x: x["Instrument"]),
-        funds_display,
-        updated_holdings_df,
-        sorted(tentative_holdings, key=lambda x: x["Stock"]),
-        ideal_allocations_percent
+# Fund→stock matrix is loaded once per session and reused across solves
+@st.cache_resource
+def get_lookthrough_solver():
+    return LookThroughSolver()
+
+# One background refresher per browser session, replaced (and the old one stopped) when the
+# holdings or the interval change. A closed session stops reading prices, and its refresher
+# then stops itself after LIVE_FEED_IDLE_SECONDS.
+LIVE_FEED_IDLE_SECONDS = 120
+
+def get_live_price_table(symbols, interval):
+    live_feed = st.session_state.get("live_feed")
+    if live_feed and live_feed["key"] == (symbols, interval) and live_feed["refresher"].is_alive():
+        return live_feed["price_table"]
+    stop_live_price_feed()
+    price_table = PriceTable()
+    refresher = BackgroundPriceRefresher(symbols, price_table, interval, max_idle=LIVE_FEED_IDLE_SECONDS)
+    refresher.start()
+    st.session_state["live_feed"] = {"key": (symbols, interval), "price_table": price_table, "refresher": refresher}
+    return price_table
+
+def stop_live_price_feed():
+    live_feed = st.session_state.pop("live_feed", None)
+    if live_feed:
+        live_feed["refresher"].stop()
+
+# Live view reruns on its own timer; only rows whose prices changed are revalued
+@st.fragment(run_every=15)
+def render_live_holdings():
+    live = st.session_state.get("live_allocation")
+    if live is None:
+        return
+    price_table = get_live_price_table(tuple(live.instruments), st.session_state["live_interval"])
+    changed_rows = set(live.sync(price_table).tolist())
+    live_df = pd.DataFrame({
+        "Instrument": live.instruments,
+        "Qty": live.quantities,
+        "LTP": live.prices,
+        "Current Value": live.values,
+        "Allocation %": live.allocation_percent().round(2),
+    })
+    st.subheader("Live Holdings")
+    st.dataframe(
+        live_df.style.format({
+            "LTP": "₹{:.2f}", "Current Value": "₹{:.2f}", "Allocation %": "{:.2f}%"
+        }, na_rep="-").apply(lambda row: ["background-color: #fff3cd" if row.name in changed_rows else "" for _ in row], axis=1),
+        use_container_width=True
+    )
+    if price_table.last_updated:
+        st.caption(f"Total ₹{live.total_value:,.2f} · {len(changed_rows)} rows updated · prices as of {datetime.fromtimestamp(price_table.last_updated).strftime('%H:%M:%S')}")
+
+# Calculate rebalancing actions at freshly fetched prices (the planning itself lives in rebalance_plan.py)
+def calculate_rebalancing(holdings_df, target_ratios, extra_funds=0, allocation_margin_percent=2.0,
+                          optimizer="greedy", cost_model=None, drift_penalty=DEFAULT_DRIFT_PENALTY,
+                          stock_sectors=None, sector_caps=None):
+    latest_prices = fetch_latest_prices(list(target_ratios)) if target_ratios else {}
+    return plan_rebalancing(
+        holdings_df, target_ratios, latest_prices, extra_funds, optimizer, cost_model, drift_penalty,
+        stock_sectors, sector_caps, display_names=name_mapping_inv
     )
 
 # Streamlit UI
@@ -197,15 +121,15 @@ col1, col2 = st.columns([1, 2])
 
 with col1:
     st.subheader("Input Data")
-    uploaded_file = st.file_uploader("Upload Holdings JSON File", type="json", help="Upload your portfolio holdings JSON file")
+    uploaded_files = st.file_uploader("Upload Holdings Files", accept_multiple_files=True, type=["json", "jsonl", "csv"],
+                                      help="Upload your portfolio holdings JSON files and broker CSV statements")
 
     st.subheader("Target Ratios")
-    target_ratio_file = "data/mapping_data/asset_allocation.json"
+    target_ratio_file = ASSET_ALLOCATION_PATH
     
     user_target_ratios = {} # Initialize as empty dictionary
     try:
-        with open(target_ratio_file, 'r') as f:
-            ratios_list = json.load(f) # Load as list
+        ratios_list = reference('asset_allocation') # List from the reference bundle
         st.success(f"Target ratios loaded from `{target_ratio_file}`")
 
         for item in ratios_list: # Iterate through the list
@@ -227,24 +151,70 @@ with col1:
         user_target_ratios = {}
 
 
+    target_mode = st.radio("Target Mode", ["Direct weights", "Look-through exposure"], horizontal=True,
+                           help="Look-through treats 'Total Weight (%)' as total exposure and only buys what the held funds don't already provide")
+
     extra_funds = st.number_input("Extra Funds (₹)", min_value=0.0, value=0.0, step=1000.0)
     allocation_margin_percent = st.slider("Allocation Margin (%)", 0.0, 10.0, 2.0, 0.5)
 
+    optimizer_label = st.radio("Optimizer", ["Greedy", "Cost-aware"], horizontal=True,
+                               help="Cost-aware skips trades whose brokerage, STT and slippage outweigh the drift they fix")
+    optimizer = "cost_aware" if optimizer_label == "Cost-aware" else "greedy"
+    cost_model = dict(DEFAULT_COST_MODEL)
+    drift_penalty = DEFAULT_DRIFT_PENALTY
+    if optimizer == "cost_aware":
+        cost_model["brokerage_fixed"] = st.number_input("Brokerage per Order (₹)", min_value=0.0, value=DEFAULT_COST_MODEL["brokerage_fixed"], step=5.0)
+        cost_model["stt_pct"] = st.number_input("STT (%)", min_value=0.0, value=DEFAULT_COST_MODEL["stt_pct"], step=0.01)
+        cost_model["slippage_pct"] = st.number_input("Slippage (%)", min_value=0.0, value=DEFAULT_COST_MODEL["slippage_pct"], step=0.01)
+        drift_penalty = st.number_input("Drift Penalty (₹ per ₹ misallocated)", min_value=0.0, value=DEFAULT_DRIFT_PENALTY, step=0.005, format="%.3f")
+
+    use_sector_caps = st.checkbox("Sector Caps", help="Limit each sector's share of the rebalanced portfolio")
+    stock_sectors, sector_caps = {}, {}
+    if use_sector_caps:
+        try:
+            stock_sectors = load_symbol_sectors()
+        except FileNotFoundError:
+            st.warning("portfolio_stockbreakdown.json not found; run update_asset_allocation/portfolio_stockbreakdown.py first. All stocks count as 'N/A'.")
+        default_cap = st.number_input("Default Sector Cap (%)", min_value=0.0, max_value=100.0, value=30.0, step=5.0)
+        target_sectors = sorted({stock_sectors.get(stock, UNCLASSIFIED) for stock in user_target_ratios})
+        caps_df = st.data_editor(
+            pd.DataFrame({"Sector": target_sectors, "Max Weight (%)": [default_cap] * len(target_sectors)}),
+            disabled=["Sector"], hide_index=True, use_container_width=True
+        )
+        sector_caps = dict(zip(caps_df["Sector"], caps_df["Max Weight (%)"].astype(float)))
+
+    live_prices = st.checkbox("Live Prices", help="Keep allocations updated from a background batched price feed")
+    live_interval = st.slider("Live Refresh Interval (s)", 15, 300, 60, 15, disabled=not live_prices)
+
     if st.button("Calculate", key="calc_button"):
-        if not uploaded_file:
-            st.warning("Please upload a holdings JSON file to proceed.")
+        if not uploaded_files:
+            st.warning("Please upload holdings files to proceed.")
         elif not user_target_ratios:
             st.warning("Target ratios are not loaded correctly. Please check the file and path.")
         else:
-            holdings_df = process_json_holdings(uploaded_file)
-            holdings_df['Current Value'] = holdings_df['Cur_val']  # Use value from JSON initially
+            try:
+                holdings_df = process_holdings_files(uploaded_files)
+            except ValueError as e:
+                st.error(f"Couldn't read holdings: {e}")
+                st.stop()
+            holdings_df['Current Value'] = holdings_df['Cur_val']  # Use value from the statements initially
             # holdings_df['Current Value'] = holdings_df['Qty'] * holdings_df['LTP']
             total_value = holdings_df['Current Value'].sum()
             holdings_df['Allocation %'] = (
                 holdings_df['Current Value'] / total_value * 100
             ).round(2) if total_value > 0 else 0
+            if live_prices:
+                st.session_state["live_allocation"] = IncrementalAllocation(
+                    holdings_df['Instrument'], holdings_df['Qty'], holdings_df['Current Value']
+                )
+                st.session_state["live_interval"] = live_interval
+    if not live_prices:
+        st.session_state.pop("live_allocation", None)
+        stop_live_price_feed()
 
 with col2:
+    render_live_holdings()
+
     if 'holdings_df' in locals():
         st.subheader("Initial Holdings")
         st.dataframe(
@@ -255,9 +225,36 @@ with col2:
             use_container_width=True
         )
 
-        rebalancing_actions, funds_info, _, tentative_holdings, _ = calculate_rebalancing(
-            holdings_df, user_target_ratios, extra_funds, allocation_margin_percent
-        )
+        rebalance_ratios = user_target_ratios
+        if target_mode == "Look-through exposure":
+            try:
+                rebalance_ratios, lookthrough_rows = get_lookthrough_solver().direct_targets(
+                    user_target_ratios, load_fund_values(), holdings_df['Current Value'].sum(), extra_funds
+                )
+                st.subheader("Look-through Targets")
+                st.dataframe(pd.DataFrame(lookthrough_rows), use_container_width=True)
+            except FileNotFoundError as e:
+                st.error(f"Look-through data not found ({e}). Falling back to direct weights.")
+                rebalance_ratios = user_target_ratios
+
+        try:
+            rebalancing_actions, funds_info, updated_holdings_df, tentative_holdings, _ = calculate_rebalancing(
+                holdings_df, rebalance_ratios, extra_funds, allocation_margin_percent,
+                optimizer, cost_model, drift_penalty, stock_sectors, sector_caps
+            )
+        except ValueError as e:
+            st.error(f"Sector caps can't be met: {e}")
+            st.stop()
+
+        if sector_caps:
+            st.subheader("Sector Weights")
+            target_holdings = updated_holdings_df[updated_holdings_df['Instrument'].isin(rebalance_ratios.keys())]
+            sector_values = sector_totals(dict(zip(target_holdings['Instrument'], target_holdings['Current Value'])), stock_sectors)
+            sector_total = sum(sector_values.values())
+            st.dataframe(pd.DataFrame([
+                {"Sector": sector, "Weight (%)": round(value / sector_total * 100, 2) if sector_total > 0 else 0, "Cap (%)": sector_caps.get(sector)}
+                for sector, value in sorted(sector_values.items(), key=lambda x: -x[1])
+            ]), use_container_width=True)
 
         if rebalancing_actions:
             st.subheader("Rebalancing Actions")
@@ -269,6 +266,11 @@ with col2:
                 }),
                 use_container_width=True
             )
+            order_book = OrderBook()
+            order_book.add_plan("portfolio", rebalancing_actions)
+            orders_file = io.StringIO()
+            write_orders(orders_file, iter_child_orders(order_book), "csv")
+            st.download_button("Download Exchange Orders (CSV)", orders_file.getvalue(), "exchange_orders.csv", "text/csv")
 
         st.subheader(funds_info["status"])
         st.write(f"{funds_info['message']} (Prices as of {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} PST)")
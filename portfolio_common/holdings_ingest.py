@@ -0,0 +1,181 @@
+import argparse
+import json
+import math
+import os
+import re
+import pandas as pd
+
+CHUNK_ROWS = 50000
+
+# Canonical columns and the headers brokers / our own JSON files use for them
+COLUMN_ALIASES = {
+    "Instrument": ["Instrument", "Symbol", "Security", "Stock", "Scheme Name", "Scheme", "Fund Name"],
+    "Qty": ["Qty.", "Qty", "Quantity", "Units", "Balance Units"],
+    "LTP": ["LTP", "Last Price", "Price", "NAV"],
+    "Cur_val": ["Cur. val", "Cur_val", "Value", "Current Value", "Market Value"],
+}
+DTYPES = {"Instrument": "string", "Qty": "float64", "LTP": "float64", "Cur_val": "float64"}
+NUMERIC_COLUMNS = ["Qty", "LTP", "Cur_val"]
+# Formatting brokers put around numbers ("₹1,200.50", "12.5%", "Rs. 300")
+NUMBER_NOISE = r'₹|Rs\.?|INR|[,%\s]'
+
+def _header_key(name):
+    # "Cur. val", "cur_val" and "CUR VAL" all match
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+def column_mapping(headers):
+    """
+    Maps a file's headers to the canonical columns. Where several headers match one column the
+    earlier alias wins (e.g. "Symbol" over "Stock"); unrecognised headers are dropped.
+
+    Raises:
+        ValueError: no instrument column, or neither a quantity nor a value column.
+    """
+    headers_by_key = {}
+    for header in headers:
+        headers_by_key.setdefault(_header_key(header), header)
+    mapping = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        header = next((headers_by_key[_header_key(a)] for a in aliases if _header_key(a) in headers_by_key), None)
+        if header is not None:
+            mapping[header] = column
+    found = set(mapping.values())
+    if "Instrument" not in found or not found & {"Qty", "Cur_val"}:
+        raise ValueError(f"Unrecognised holdings columns: {', '.join(map(str, headers))}")
+    return mapping
+
+def _name(file):
+    return getattr(file, 'name', file)
+
+def _rewind(file):
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+def _to_number(values):
+    # The one place numeric columns are parsed; anything still unparseable becomes NaN
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values, errors='coerce')
+    cleaned = values.astype("string").str.replace(NUMBER_NOISE, '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+def _csv_chunks(file, chunk_rows):
+    # Header first, so usecols can be given per raw column name; everything is read as text and
+    # the numeric columns are parsed by iter_chunks
+    _rewind(file)
+    headers = list(pd.read_csv(file, nrows=0).columns)
+    mapping = column_mapping(headers)
+    _rewind(file)
+    reader = pd.read_csv(file, usecols=list(mapping), dtype=str, chunksize=chunk_rows)
+    for chunk in reader:
+        yield chunk.rename(columns=mapping)
+
+def _json_chunks(file, chunk_rows):
+    if str(_name(file)).lower().endswith('.jsonl'):
+        _rewind(file)
+        for chunk in pd.read_json(file, lines=True, chunksize=chunk_rows, dtype=False):
+            mapping = column_mapping(chunk.columns)
+            yield chunk[list(mapping)].rename(columns=mapping)
+        return
+    # Statements are plain JSON arrays (or {"holdings": [...]}, like updated_portfolio.json);
+    # only one file is held at a time and it's fed to the aggregator in chunks
+    if hasattr(file, 'read'):
+        _rewind(file)
+        data = json.load(file)
+    else:
+        with open(file, 'r') as f:
+            data = json.load(f)
+    records = data.get("holdings", []) if isinstance(data, dict) else data
+    for start in range(0, len(records), chunk_rows):
+        chunk = pd.DataFrame.from_records(records[start:start + chunk_rows])
+        mapping = column_mapping(chunk.columns)
+        yield chunk[list(mapping)].rename(columns=mapping)
+
+def iter_chunks(file, chunk_rows=CHUNK_ROWS):
+    """
+    Yields DataFrames of at most chunk_rows rows with canonical, typed columns from one CSV,
+    JSON or JSON-lines statement (a path or an uploaded file object).
+    """
+    reader = _csv_chunks if str(_name(file)).lower().endswith('.csv') else _json_chunks
+    for chunk in reader(file, chunk_rows):
+        for column in NUMERIC_COLUMNS:
+            if column in chunk:
+                chunk[column] = _to_number(chunk[column])
+        yield chunk.astype({column: dtype for column, dtype in DTYPES.items() if column in chunk})
+
+
+class HoldingsAggregator:
+    """
+    Running per-instrument totals (Qty and Cur_val summed, first LTP seen) fed one chunk at a time,
+    so memory grows with the number of distinct instruments rather than rows or files.
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, chunk):
+        chunk = chunk.dropna(subset=["Instrument"])
+        chunk = chunk.assign(Instrument=chunk["Instrument"].str.strip())
+        grouped = chunk.groupby("Instrument", sort=False).agg(
+            {column: ("first" if column == "LTP" else "sum") for column in NUMERIC_COLUMNS if column in chunk}
+        )
+        for instrument, qty, ltp, value in zip(
+            grouped.index,
+            grouped["Qty"] if "Qty" in grouped else [0.0] * len(grouped),
+            grouped["LTP"] if "LTP" in grouped else [math.nan] * len(grouped),
+            grouped["Cur_val"] if "Cur_val" in grouped else [0.0] * len(grouped),
+        ):
+            totals = self.totals.setdefault(instrument, [0.0, math.nan, 0.0])
+            totals[0] += qty
+            if math.isnan(totals[1]):
+                totals[1] = ltp
+            totals[2] += value
+
+    def add_file(self, file, chunk_rows=CHUNK_ROWS):
+        rows = 0
+        for chunk in iter_chunks(file, chunk_rows):
+            self.add(chunk)
+            rows += len(chunk)
+        return rows
+
+    def to_frame(self):
+        frame = pd.DataFrame(
+            [(instrument, *totals) for instrument, totals in self.totals.items()],
+            columns=["Instrument", "Qty", "LTP", "Cur_val"]
+        ).astype(DTYPES)
+        # Statements without a price column: LTP from value / quantity, until live prices replace it
+        implied = (frame["Cur_val"] / frame["Qty"]).where(frame["Qty"] > 0, frame["Cur_val"])
+        frame["LTP"] = frame["LTP"].fillna(implied)
+        return frame.sort_values("Instrument", ignore_index=True)
+
+def ingest_holdings(files, chunk_rows=CHUNK_ROWS):
+    """
+    Streams any number of broker CSV / JSON statements into one holdings table.
+
+    Returns:
+        A DataFrame with one row per instrument: Instrument, Qty, LTP, Cur_val.
+
+    Raises:
+        ValueError: a file's columns can't be mapped (the message names the file).
+    """
+    aggregator = HoldingsAggregator()
+    for file in files:
+        try:
+            aggregator.add_file(file, chunk_rows)
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(str(_name(file)))}: {str(e)}") from e
+    return aggregator.to_frame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate broker CSV/JSON holdings statements by instrument")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--output", help="Write the aggregated holdings to this JSON file")
+    args = parser.parse_args()
+
+    holdings = ingest_holdings(args.files, args.chunk_rows)
+    print(holdings.to_string(index=False))
+    print(f"\n{len(holdings)} instruments from {len(args.files)} files, total value ₹{holdings['Cur_val'].sum():,.2f}")
+    if args.output:
+        holdings.to_json(args.output, orient="records", indent=4)
+        print(f"Saved to {args.output}")
@@ -0,0 +1,286 @@
+import json
+import sys
+import numpy as np
+
+# Column kinds: 'int' and 'float' are NumPy arrays, 'cat' is an interned string column stored as
+# int32 codes into a shared vocabulary, 'obj' holds anything else (e.g. nested dicts) as a list.
+MISSING_CODE = -1
+
+
+class StringInterner:
+    """Assigns dense integer IDs to strings; one instance is shared by every categorical column."""
+
+    __slots__ = ('ids', 'values')
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        code = self.ids.get(value)
+        if code is None:
+            code = len(self.values)
+            self.ids[value] = code
+            self.values.append(sys.intern(value))
+        return code
+
+    def lookup(self, code):
+        return None if code == MISSING_CODE else self.values[code]
+
+
+class HoldingRow:
+    """Dict-like view of one row; reads and writes go straight to the table's columns."""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, name):
+        if not self._table.has_value(name, self._index):
+            raise KeyError(name)
+        return self._table.value(name, self._index)
+
+    def __setitem__(self, name, value):
+        self._table.set_value(name, self._index, value)
+
+    def __contains__(self, name):
+        return self._table.has_value(name, self._index)
+
+    def get(self, name, default=None):
+        return self._table.value(name, self._index) if self._table.has_value(name, self._index) else default
+
+    @property
+    def index(self):
+        return self._index
+
+    def to_dict(self):
+        return self._table.record(self._index)
+
+
+class HoldingsTable:
+    """
+    Typed columnar container for holdings rows (portfolio holdings, fund breakdowns, stock breakdowns).
+
+    Numeric fields live in NumPy arrays, string fields are interned to int32 codes, and rows are
+    exposed through __slots__ views so stages can work on it without copying dicts around.
+    """
+
+    def __init__(self, length=0, interner=None):
+        self.length = length
+        self.interner = interner or StringInterner()
+        self.columns = {}   # name -> np.ndarray or list
+        self.kinds = {}     # name -> 'int' | 'float' | 'cat' | 'obj'
+        self.present = {}   # name -> bool mask, only for columns some rows don't have
+        self.order = []     # column order for export
+
+    # Construction and export
+
+    @classmethod
+    def from_records(cls, records, interner=None):
+        table = cls(len(records), interner)
+        names = []
+        for record in records:
+            for name in record:
+                if name not in table.kinds and name not in names:
+                    names.append(name)
+        for name in names:
+            table._build_column(name, [record.get(name) for record in records], [name in record for record in records])
+        return table
+
+    @classmethod
+    def load_json(cls, path, key=None, interner=None):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls.from_records(data[key] if key else data, interner)
+
+    def record(self, index):
+        return {name: self.value(name, index) for name in self.order if self.has_value(name, index)}
+
+    def to_records(self):
+        return [self.record(i) for i in range(self.length)]
+
+    def save_json(self, path, key=None):
+        records = self.to_records()
+        with open(path, 'w') as f:
+            json.dump({key: records} if key else records, f, indent=4)
+
+    def _build_column(self, name, values, present):
+        non_null = [v for v in values if v is not None]
+        if all(isinstance(v, int) and not isinstance(v, bool) for v in non_null) and len(non_null) == len(values):
+            kind, column = 'int', np.array(values, dtype=np.int64)
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in non_null):
+            kind, column = 'float', np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif all(isinstance(v, str) for v in non_null):
+            kind = 'cat'
+            column = np.array([MISSING_CODE if v is None else self.interner.intern(v) for v in values], dtype=np.int32)
+        else:
+            kind, column = 'obj', list(values)
+        self.columns[name] = column
+        self.kinds[name] = kind
+        if name not in self.order:
+            self.order.append(name)
+        if not all(present):
+            self.present[name] = np.array(present, dtype=bool)
+        else:
+            self.present.pop(name, None)
+
+    # Column access
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return (HoldingRow(self, i) for i in range(self.length))
+
+    def row(self, index):
+        return HoldingRow(self, index)
+
+    def has_column(self, name):
+        return name in self.columns
+
+    def has_value(self, name, index):
+        if name not in self.columns:
+            return False
+        mask = self.present.get(name)
+        return True if mask is None else bool(mask[index])
+
+    def value(self, name, index):
+        kind = self.kinds[name]
+        raw = self.columns[name][index]
+        if kind == 'cat':
+            return self.interner.lookup(int(raw))
+        if kind == 'float':
+            return None if np.isnan(raw) else float(raw)
+        if kind == 'int':
+            return int(raw)
+        return raw
+
+    def numeric(self, name):
+        # Float view of a numeric column (NaN where missing)
+        column = self.columns[name]
+        return column.astype(np.float64) if self.kinds[name] == 'int' else column
+
+    def strings(self, name):
+        kind = self.kinds.get(name)
+        if kind == 'cat':
+            return [self.interner.lookup(int(code)) for code in self.columns[name]]
+        return [self.value(name, i) for i in range(self.length)]
+
+    def codes(self, name):
+        # Interned int32 codes of a categorical column, for joins and group-bys
+        return self.columns[name]
+
+    def set_value(self, name, index, value):
+        if name not in self.columns:
+            if isinstance(value, str):
+                self.add_column(name, 'cat')
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) or value is None:
+                self.add_column(name, 'float')
+            else:
+                self.add_column(name, 'obj')
+        kind = self.kinds[name]
+        if kind == 'int' and (value is None or not isinstance(value, int) or isinstance(value, bool)):
+            self._convert(name, 'float' if isinstance(value, float) or value is None else 'obj')
+        elif kind == 'float' and value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            self._convert(name, 'obj')
+        elif kind == 'cat' and value is not None and not isinstance(value, str):
+            self._convert(name, 'obj')
+        kind = self.kinds[name]
+        if kind == 'cat':
+            self.columns[name][index] = MISSING_CODE if value is None else self.interner.intern(value)
+        elif kind == 'float':
+            self.columns[name][index] = np.nan if value is None else value
+        else:
+            self.columns[name][index] = value
+        mask = self.present.get(name)
+        if mask is not None:
+            mask[index] = True
+            if mask.all():
+                del self.present[name]
+
+    def set_column(self, name, values):
+        # Replace a whole column at once (vectorized writes)
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'fi':
+            self.columns[name] = values.astype(np.float64 if values.dtype.kind == 'f' else np.int64)
+            self.kinds[name] = 'float' if values.dtype.kind == 'f' else 'int'
+            if name not in self.order:
+                self.order.append(name)
+            self.present.pop(name, None)
+        else:
+            self._build_column(name, list(values), [True] * self.length)
+
+    def add_column(self, name, kind='float'):
+        # New columns start out missing on every row
+        if kind == 'cat':
+            column = np.full(self.length, MISSING_CODE, dtype=np.int32)
+        elif kind == 'float':
+            column = np.full(self.length, np.nan)
+        elif kind == 'int':
+            column = np.zeros(self.length, dtype=np.int64)
+        else:
+            column = [None] * self.length
+        self.columns[name] = column
+        self.kinds[name] = kind
+        self.order.append(name)
+        self.present[name] = np.zeros(self.length, dtype=bool)
+
+    def drop_column(self, name):
+        self.columns.pop(name, None)
+        self.kinds.pop(name, None)
+        self.present.pop(name, None)
+        if name in self.order:
+            self.order.remove(name)
+
+    def _convert(self, name, kind):
+        values = [self.value(name, i) for i in range(self.length)]
+        present = self.present.get(name)
+        self._build_column(name, values, present.tolist() if present is not None else [True] * self.length)
+        if self.kinds[name] != kind:
+            # _build_column picks the narrowest kind; force the requested one
+            if kind == 'obj':
+                self.columns[name] = values
+            elif kind == 'float':
+                self.columns[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            self.kinds[name] = kind
+
+    # Aggregation
+
+    def group_sum(self, key, value_columns):
+        """
+        Sums numeric columns by a categorical key with one bincount per column.
+
+        Returns:
+            A new HoldingsTable with one row per distinct key, in first-seen order, sharing this
+            table's interner. Non-aggregated columns take the first row's value.
+        """
+        codes = self.codes(key)
+        unique_codes, first_rows, inverse = np.unique(codes, return_index=True, return_inverse=True)
+        order = np.argsort(first_rows)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        group = rank[inverse]
+
+        grouped = self.take(first_rows[order])
+        for name in value_columns:
+            grouped.set_column(name, np.bincount(group, weights=np.nan_to_num(self.numeric(name)), minlength=len(order)))
+        return grouped
+
+    def take(self, rows):
+        # New table holding copies of the given rows
+        rows = np.asarray(rows, dtype=int)
+        table = HoldingsTable(len(rows), self.interner)
+        for name in self.order:
+            column = self.columns[name]
+            table.columns[name] = [column[i] for i in rows] if self.kinds[name] == 'obj' else column[rows].copy()
+            table.kinds[name] = self.kinds[name]
+            table.order.append(name)
+            if name in self.present:
+                mask = self.present[name][rows]
+                if not mask.all():
+                    table.present[name] = mask
+        return table
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values() if isinstance(column, np.ndarray))
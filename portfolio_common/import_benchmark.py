@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common import reference_bundle
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points the scripts and the Streamlit app import on start-up
+MODULES = [
+    'portfolio_common.portfolio_store',
+    'portfolio_common.scheme_resolver',
+    'refresh_prices.live_price_feed',
+    'refresh_prices.update_mf_prices',
+    'refresh_prices.update_stock_prices',
+    'refresh_prices.async_refresh',
+    'rebalancing.cost_aware_optimizer',
+    'rebalancing.lookthrough_rebalancing',
+    'update_asset_allocation.stock_symbols',
+    'update_asset_allocation.sector_taxonomy',
+    'update_asset_allocation.fund_overlap_analytics',
+    'scrapers_mf_allocations.mf_scraper',
+]
+# Streamlit apps, timed as a full script run (imports, reference data, first render)
+APPS = ['allocation_calculation_app_v2.py']
+# Network, fuzzy-matching and sparse-matrix libraries must only load when they're first used
+LAZY_MODULES = ['yfinance', 'mftool', 'fuzzywuzzy', 'aiohttp', 'firecrawl', 'scipy']
+# Per-module budget for a cold import in a fresh interpreter (interpreter start-up excluded)
+IMPORT_BUDGET_MS = 400
+# An app run also imports pandas and loads its reference data
+APP_BUDGET_MS = 1000
+REPEATS = 3
+
+# Run in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+# Runs an app script with streamlit replaced by a stand-in whose widgets return their defaults (no
+# button pressed, nothing uploaded), so only the app's own start-up is measured, without a server
+APP_PROBE = """
+import json, runpy, sys, time, types
+
+class _Container:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __getattr__(self, name):
+        return _widget(name)
+
+def _widget(name):
+    def call(*args, **kwargs):
+        if name == 'columns':
+            spec = args[0] if args else kwargs.get('spec', 1)
+            return [_Container() for _ in range(spec if isinstance(spec, int) else len(spec))]
+        if name in ('cache_resource', 'cache_data', 'fragment'):
+            return args[0] if args and callable(args[0]) else (lambda func: func)
+        if name in ('radio', 'selectbox'):
+            options = list(args[1] if len(args) > 1 else kwargs.get('options', []))
+            return options[kwargs.get('index', 0)] if options else None
+        if name in ('slider', 'number_input'):
+            return kwargs.get('value', args[3] if len(args) > 3 else args[1] if len(args) > 1 else 0)
+        if name in ('button', 'checkbox', 'toggle'):
+            return kwargs.get('value', False)
+        if name == 'stop':
+            raise SystemExit
+        return None
+    return call
+
+streamlit = types.ModuleType('streamlit')
+streamlit.__getattr__ = _widget
+streamlit.session_state = {{}}
+sys.modules['streamlit'] = streamlit
+sys.path.insert(0, '')  # streamlit run puts the script's folder on sys.path
+start = time.perf_counter()
+runpy.run_path({script!r}, run_name='__main__')
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+# The reference data a typical run needs, read the old way (straight from the source files)
+def parse_sources():
+    from portfolio_common.scheme_resolver import build_index
+    from update_asset_allocation.stock_symbols import clean_stock_name
+
+    raw = {name: reference_bundle.read_source(name, path) for name, path in reference_bundle.SOURCES.items()}
+    stock_symbol_map = {clean_stock_name(company): symbol for symbol, company, _ in raw['equity_list']}
+    return raw, stock_symbol_map, build_index(raw['all_schemes'])
+
+def run_probe(code, repeats=REPEATS):
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ['unknown error'])[-1]
+            return {"ms": None, "loaded": [], "error": error}
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run["ms"])
+
+def time_import(module, repeats=REPEATS):
+    return run_probe(PROBE.format(module=module, lazy=LAZY_MODULES), repeats)
+
+def time_app(script, repeats=REPEATS):
+    return run_probe(APP_PROBE.format(script=script, lazy=LAZY_MODULES), repeats)
+
+def time_reference_data(repeats=REPEATS):
+    # Best-of timings: parsing the sources vs loading the compiled bundle from disk
+    reference_bundle.load_bundle()  # make sure the bundle is current before timing it
+    parse_ms, load_ms = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        parse_sources()
+        parse_ms.append((time.perf_counter() - start) * 1000)
+        reference_bundle._loaded.clear()
+        start = time.perf_counter()
+        reference_bundle.load_bundle()
+        load_ms.append((time.perf_counter() - start) * 1000)
+    return min(parse_ms), min(load_ms)
+
+def run_benchmark(modules=MODULES, budget_ms=IMPORT_BUDGET_MS, repeats=REPEATS, apps=APPS, app_budget_ms=APP_BUDGET_MS):
+    """
+    Times a cold import of every entry module and a start-up run of every app, and checks none of
+    them pulls in a LAZY_MODULES library.
+
+    Returns:
+        A list of failure messages; empty if everything is within budget.
+    """
+    failures = []
+    print(f"{'Module':<50} {'Import (ms)':>12}  Eagerly loaded")
+    entries = [(module, time_import, budget_ms) for module in modules] + [(app, time_app, app_budget_ms) for app in apps]
+    for module, probe, budget in entries:
+        result = probe(module, repeats)
+        if result["ms"] is None:
+            # A dependency that isn't installed here is an environment problem, not a start-up regression
+            skipped = result['error'].startswith('ModuleNotFoundError')
+            print(f"{module:<50} {'skipped' if skipped else 'error':>12}  {result['error']}")
+            if not skipped:
+                failures.append(f"{module}: {result['error']}")
+            continue
+        print(f"{module:<50} {result['ms']:>12.1f}  {', '.join(result['loaded']) or '-'}")
+        if result["ms"] > budget:
+            failures.append(f"{module} took {result['ms']:.0f} ms (budget {budget} ms)")
+        if result["loaded"]:
+            failures.append(f"{module} imports {', '.join(result['loaded'])} at start-up")
+
+    parse_ms, load_ms = time_reference_data(repeats)
+    print(f"\nReference data: parsing sources {parse_ms:.1f} ms, loading bundle {load_ms:.1f} ms "
+          f"({parse_ms / load_ms:.1f}x faster)")
+    if load_ms > parse_ms:
+        failures.append(f"Reference bundle ({load_ms:.0f} ms) is slower than parsing the sources ({parse_ms:.0f} ms)")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Guard start-up time: cold import timings and lazy-import checks")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--app-budget-ms", type=float, default=APP_BUDGET_MS)
+    parser.add_argument("--no-apps", action="store_true", help="Only time the module imports")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)  # data paths are relative to the repo root
+    failures = run_benchmark(args.modules, args.budget_ms, args.repeats, [] if args.no_apps else APPS, args.app_budget_ms)
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nAll modules within budget.")
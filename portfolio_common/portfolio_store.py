@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date
+from portfolio_common.symbol_registry import scheme_key
+
+STORE_PATH = 'data/portfolio.sqlite'
+HOLDINGS_FILE_PATH = 'data/portfolio_data/updated_portfolio.json'
+STOCK_BREAKDOWN_PATH = 'data/portfolio_data/portfolio_stockbreakdown.json'
+BREAKDOWN_DIR = 'data/mf_stock_breakdown_data'
+DEFAULT_PORTFOLIO = 'default'
+
+# Typed columns are what queries filter and join on; `record` keeps the full original row so the
+# JSON export reproduces the files exactly (field order and all). Rows are keyed on the same TEXT
+# symbols and scheme codes as the JSON files; SymbolRegistry's integer IDs stay in memory.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS holdings (
+    portfolio TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    security TEXT NOT NULL,
+    scheme_code TEXT,
+    symbol TEXT,
+    qty REAL,
+    value REAL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (portfolio, position)
+);
+CREATE INDEX IF NOT EXISTS holdings_by_scheme ON holdings (scheme_code);
+CREATE INDEX IF NOT EXISTS holdings_by_symbol ON holdings (symbol);
+CREATE TABLE IF NOT EXISTS constituents (
+    scheme_code TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    fund_name TEXT NOT NULL,
+    stock TEXT NOT NULL,
+    symbol TEXT,
+    sector TEXT,
+    weight REAL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (scheme_code, as_of, position)
+);
+CREATE INDEX IF NOT EXISTS constituents_by_symbol ON constituents (symbol, as_of);
+CREATE INDEX IF NOT EXISTS constituents_by_stock ON constituents (stock);
+CREATE VIEW IF NOT EXISTS latest_constituents AS
+    SELECT c.* FROM constituents c
+    JOIN (SELECT scheme_code, MAX(as_of) AS as_of FROM constituents GROUP BY scheme_code) latest
+    USING (scheme_code, as_of);
+CREATE TABLE IF NOT EXISTS lookthrough (
+    portfolio TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    stock TEXT NOT NULL,
+    symbol TEXT,
+    sector TEXT,
+    value REAL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (portfolio, position)
+);
+CREATE INDEX IF NOT EXISTS lookthrough_by_symbol ON lookthrough (symbol);
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS navs (
+    scheme_code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    nav REAL NOT NULL,
+    PRIMARY KEY (scheme_code, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+
+def _scheme_code(value):
+    # 'N/A' and missing mean "not a fund"
+    return None if value is None or value == 'N/A' else scheme_key(value)
+
+
+class PortfolioStore:
+    """
+    Embedded SQLite store for holdings, fund constituents, look-through holdings, prices and NAVs.
+
+    Stages ingest with executemany and export the JSON files the rest of the tree still reads.
+    The JSON files stay editable: load_*_json re-ingests a file only if it changed on disk since
+    the store last read or wrote it.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # Holdings (updated_portfolio.json)
+
+    def put_holdings(self, records, portfolio=DEFAULT_PORTFOLIO):
+        rows = []
+        for position, record in enumerate(records):
+            scheme_code = _scheme_code(record.get('SchemeID'))
+            rows.append((
+                portfolio, position, record.get('Security', ''), scheme_code,
+                record.get('Symbol') or (record.get('Security') if scheme_code is None else None),
+                record.get('Qty'), record.get('Value'), json.dumps(record)
+            ))
+        with self.conn:
+            self.conn.execute("DELETE FROM holdings WHERE portfolio = ?", (portfolio,))
+            self.conn.executemany("INSERT INTO holdings VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def holdings(self, portfolio=DEFAULT_PORTFOLIO):
+        return [json.loads(record) for (record,) in self.conn.execute(
+            "SELECT record FROM holdings WHERE portfolio = ? ORDER BY position", (portfolio,)
+        )]
+
+    def load_holdings_json(self, path=HOLDINGS_FILE_PATH, portfolio=DEFAULT_PORTFOLIO):
+        if self._changed_on_disk(path):
+            with open(path, 'r') as f:
+                self.put_holdings(json.load(f)['holdings'], portfolio)
+            self._mark_synced(path)
+        elif not os.path.exists(path) and not self._has_rows('holdings', portfolio):
+            raise FileNotFoundError(path)
+        return self.holdings(portfolio)
+
+    def fund_values(self, portfolio=DEFAULT_PORTFOLIO):
+        # Current ₹ value held in each fund, keyed by scheme code
+        return dict(self.conn.execute(
+            "SELECT scheme_code, SUM(value) FROM holdings WHERE portfolio = ? AND scheme_code IS NOT NULL GROUP BY scheme_code",
+            (portfolio,)
+        ).fetchall())
+
+    def export_holdings_json(self, path=HOLDINGS_FILE_PATH, portfolio=DEFAULT_PORTFOLIO):
+        self._write_json(path, {"holdings": self.holdings(portfolio)})
+
+    # Fund constituents (mf_stock_breakdown_data/<fund>_<scheme code>.json)
+
+    def put_constituents(self, scheme_code, fund_name, records, as_of=None):
+        scheme_code = _scheme_code(scheme_code)
+        as_of = as_of or date.today().isoformat()
+        rows = [
+            (scheme_code, as_of, position, fund_name, record.get('Stock', ''), record.get('Symbol'),
+             record.get('Sector'), record.get('Percentage_of_Total_Holdings'), json.dumps(record))
+            for position, record in enumerate(records)
+        ]
+        with self.conn:
+            self.conn.execute("DELETE FROM constituents WHERE scheme_code = ? AND as_of = ?", (scheme_code, as_of))
+            self.conn.executemany("INSERT INTO constituents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def import_breakdown_file(self, file_path, as_of=None):
+        fund_name, scheme_code = os.path.basename(file_path).replace('.json', '').rsplit('_', 1)
+        with open(file_path, 'r') as f:
+            records = json.load(f)
+        as_of = as_of or date.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+        self.put_constituents(scheme_code, fund_name, records, as_of)
+        self._mark_synced(file_path)
+
+    def sync_breakdown_dir(self, breakdown_dir=BREAKDOWN_DIR):
+        # Ingest only the breakdown files that changed since the last sync
+        changed = [
+            os.path.join(breakdown_dir, f) for f in sorted(os.listdir(breakdown_dir))
+            if f.endswith('.json') and self._changed_on_disk(os.path.join(breakdown_dir, f))
+        ]
+        for file_path in changed:
+            self.import_breakdown_file(file_path)
+        return len(changed)
+
+    def latest_constituents(self):
+        # {scheme code: (fund name, records)} from each fund's most recent breakdown
+        funds = {}
+        for scheme_code, fund_name, record in self.conn.execute(
+            "SELECT scheme_code, fund_name, record FROM latest_constituents ORDER BY scheme_code, position"
+        ):
+            funds.setdefault(scheme_code, (fund_name, []))[1].append(json.loads(record))
+        return funds
+
+    def constituent_weights(self, scheme_code):
+        # {symbol: weight} of a fund's latest breakdown; constituents without a symbol are left out
+        return dict(self.conn.execute(
+            "SELECT symbol, SUM(weight) FROM latest_constituents WHERE scheme_code = ? AND symbol IS NOT NULL "
+            "AND symbol != 'N/A' AND weight IS NOT NULL GROUP BY symbol",
+            (_scheme_code(scheme_code),)
+        ).fetchall())
+
+    def unresolved_constituent_stocks(self):
+        return [stock for (stock,) in self.conn.execute("SELECT DISTINCT stock FROM constituents WHERE symbol IS NULL")]
+
+    def set_constituent_symbols(self, symbol_by_stock):
+        # Fill in resolved NSE symbols so exposure queries can join on them ('N/A' marks "tried, no match")
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE constituents SET symbol = ? WHERE stock = ? AND symbol IS NULL",
+                [(symbol or 'N/A', stock) for stock, symbol in symbol_by_stock.items()]
+            )
+
+    # Look-through holdings (portfolio_stockbreakdown.json)
+
+    def put_lookthrough(self, records, portfolio=DEFAULT_PORTFOLIO):
+        rows = [
+            (portfolio, position, record.get('Stock', ''), record.get('Symbol'), record.get('Sector'),
+             record.get('Value'), json.dumps(record))
+            for position, record in enumerate(records)
+        ]
+        with self.conn:
+            self.conn.execute("DELETE FROM lookthrough WHERE portfolio = ?", (portfolio,))
+            self.conn.executemany("INSERT INTO lookthrough VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def lookthrough(self, portfolio=DEFAULT_PORTFOLIO):
+        return [json.loads(record) for (record,) in self.conn.execute(
+            "SELECT record FROM lookthrough WHERE portfolio = ? ORDER BY position", (portfolio,)
+        )]
+
+    def load_lookthrough_json(self, path=STOCK_BREAKDOWN_PATH, portfolio=DEFAULT_PORTFOLIO):
+        if self._changed_on_disk(path):
+            with open(path, 'r') as f:
+                self.put_lookthrough(json.load(f), portfolio)
+            self._mark_synced(path)
+        elif not os.path.exists(path) and not self._has_rows('lookthrough', portfolio):
+            raise FileNotFoundError(path)
+        return self.lookthrough(portfolio)
+
+    def export_lookthrough_json(self, path=STOCK_BREAKDOWN_PATH, portfolio=DEFAULT_PORTFOLIO):
+        self._write_json(path, self.lookthrough(portfolio))
+
+    # Prices and NAVs
+
+    def put_prices(self, prices, price_date=None):
+        price_date = price_date or date.today().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+                [(symbol, price_date, price) for symbol, price in prices.items() if price is not None]
+            )
+
+    def put_navs(self, navs, nav_date=None):
+        nav_date = nav_date or date.today().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO navs VALUES (?, ?, ?)",
+                [(_scheme_code(code), nav_date, nav) for code, nav in navs.items() if nav is not None]
+            )
+
+    def price_history(self, symbols=None, start=None, end=None):
+        # [(symbol, date, price)] ordered by date; served by the (symbol, date) primary key
+        query = "SELECT symbol, date, price FROM prices WHERE 1 = 1"
+        params = []
+        if symbols is not None:
+            symbols = list(symbols)
+            query += f" AND symbol IN ({','.join('?' * len(symbols))})"
+            params += symbols
+        if start:
+            query += " AND date >= ?"
+            params.append(start)
+        if end:
+            query += " AND date <= ?"
+            params.append(end)
+        return self.conn.execute(query + " ORDER BY date, symbol", params).fetchall()
+
+    def nav_history(self, scheme_code, start=None):
+        return self.conn.execute(
+            "SELECT date, nav FROM navs WHERE scheme_code = ? AND date >= ? ORDER BY date",
+            (_scheme_code(scheme_code), start or '')
+        ).fetchall()
+
+    # Queries
+
+    def exposure(self, symbol):
+        """
+        ₹ exposure to one NSE symbol in every portfolio, direct and through each fund's latest
+        breakdown. Both halves are index lookups on symbol, not scans of the files.
+        """
+        return self.conn.execute("""
+            SELECT portfolio, 'direct' AS via, security, value AS exposure
+            FROM holdings WHERE symbol = ?
+            UNION ALL
+            SELECT h.portfolio, 'fund', h.security, h.value * c.weight
+            FROM latest_constituents c JOIN holdings h ON h.scheme_code = c.scheme_code
+            WHERE c.symbol = ?
+            ORDER BY exposure DESC
+        """, (symbol, symbol)).fetchall()
+
+    # Source file bookkeeping
+
+    def _has_rows(self, table, portfolio):
+        return self.conn.execute(f"SELECT 1 FROM {table} WHERE portfolio = ? LIMIT 1", (portfolio,)).fetchone() is not None
+
+    def _changed_on_disk(self, path):
+        if not os.path.exists(path):
+            return False
+        row = self.conn.execute("SELECT mtime FROM sources WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return row is None or os.path.getmtime(path) > row[0]
+
+    def _mark_synced(self, path):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (os.path.abspath(path), os.path.getmtime(path)))
+
+    def _write_json(self, path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+        self._mark_synced(path)  # our own export must not be re-imported as an edit
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portfolio SQLite store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("import", help="Ingest the JSON files that changed since the last import")
+    subparsers.add_parser("export", help="Write the JSON files from the store")
+    exposure_parser = subparsers.add_parser("exposure", help="Exposure to one NSE symbol across all portfolios")
+    exposure_parser.add_argument("symbol")
+    args = parser.parse_args()
+
+    store = PortfolioStore()
+    if args.command == "import":
+        count = store.sync_breakdown_dir() if os.path.isdir(BREAKDOWN_DIR) else 0
+        holdings = store.load_holdings_json() if os.path.exists(HOLDINGS_FILE_PATH) else []
+        lookthrough = store.load_lookthrough_json() if os.path.exists(STOCK_BREAKDOWN_PATH) else []
+        print(f"Store {STORE_PATH}: {len(holdings)} holdings, {len(lookthrough)} look-through rows, {count} breakdown files ingested")
+    elif args.command == "export":
+        store.export_holdings_json()
+        store.export_lookthrough_json()
+        print(f"Exported {HOLDINGS_FILE_PATH} and {STOCK_BREAKDOWN_PATH}")
+    else:
+        rows = store.exposure(args.symbol)
+        for portfolio, via, security, exposure in rows:
+            print(f"{portfolio:<12} {via:<7} ₹{exposure:>14,.2f}  {security}")
+        print(f"Total: ₹{sum(row[3] or 0 for row in rows):,.2f}")
+    store.close()
@@ -0,0 +1,187 @@
+import csv
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BUNDLE_PATH = 'data/mapping_data/reference_bundle.pkl'
+EQUITY_LIST_PATH = 'data/mapping_data/EQUITY_L.csv'
+ALL_SCHEMES_PATH = 'data/mapping_data/all_schemes.json'
+SCHEMA_LINKS_PATH = 'data/mapping_data/schema_links_mf.json'
+ASSET_ALLOCATION_PATH = 'data/mapping_data/asset_allocation.json'
+BUNDLE_VERSION = 2  # bump when the bundle's layout changes
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = {
+    'equity_list': EQUITY_LIST_PATH,
+    'all_schemes': ALL_SCHEMES_PATH,
+    'scheme_links': SCHEMA_LINKS_PATH,
+    'asset_allocation': ASSET_ALLOCATION_PATH,
+}
+# Which source file each piece of the bundle is compiled from
+COMPONENT_SOURCES = {
+    'equity_symbols': 'equity_list',
+    'stock_symbol_map': 'equity_list',
+    'company_names': 'equity_list',
+    'market_lots': 'equity_list',
+    'all_schemes': 'all_schemes',
+    'scheme_index': 'all_schemes',
+    'scheme_links': 'scheme_links',
+    'asset_allocation': 'asset_allocation',
+}
+
+# The code whose output is stored in the bundle; editing any of it rebuilds the bundle
+CODE_SOURCES = [
+    os.path.join(REPO_ROOT, 'portfolio_common', 'reference_bundle.py'),
+    os.path.join(REPO_ROOT, 'portfolio_common', 'scheme_resolver.py'),
+    os.path.join(REPO_ROOT, 'update_asset_allocation', 'stock_symbols.py'),
+]
+
+# Bundles already loaded in this process, keyed by path
+_loaded = {}
+# path → (size, mtime, sha1) of each code file, so its content is only hashed again after it changed
+_code_hashes = {}
+
+
+def code_hash(path):
+    stat = os.stat(path)
+    cached = _code_hashes.get(path)
+    if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+        with open(path, 'rb') as f:
+            cached = (stat.st_size, stat.st_mtime_ns, hashlib.sha1(f.read()).hexdigest())
+        _code_hashes[path] = cached
+    return cached[2]
+
+
+def source_signature(sources=SOURCES):
+    # (size, mtime) of every source (None for a missing file), plus a content hash of the compiling code
+    signature = {}
+    for name, path in sources.items():
+        try:
+            stat = os.stat(path)
+            signature[name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            signature[name] = None
+    signature['code'] = [code_hash(path) for path in CODE_SOURCES]
+    return signature
+
+
+def read_source(name, path):
+    if name == 'equity_list':
+        with open(path, mode='r', encoding='utf-8') as csvfile:
+            return [
+                (row['SYMBOL'], row['NAME OF COMPANY'], int(row.get(' MARKET LOT') or 1))
+                for row in csv.DictReader(csvfile)
+            ]
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if name == 'all_schemes':
+        data.pop("Scheme Code", None)  # header row
+    return data
+
+
+def compile_bundle(sources=SOURCES):
+    """
+    Parses the reference files once and precomputes what the scripts derive from them on start-up:
+    the cleaned-name → symbol map for stock matching, market lots and the scheme resolver's token index.
+
+    A source that is missing or unreadable is stored as None; reference() then re-reads it so the
+    caller sees the same error as before.
+    """
+    # Imported here: the bundle is only compiled after a reference file changed
+    from portfolio_common.scheme_resolver import build_index
+    from update_asset_allocation.stock_symbols import clean_stock_name
+
+    raw = {}
+    for name, path in sources.items():
+        try:
+            raw[name] = read_source(name, path)
+        except FileNotFoundError:
+            raw[name] = None  # reported by whichever script needs it
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: {path} not bundled: {str(e)}")
+            raw[name] = None
+
+    data = dict.fromkeys(COMPONENT_SOURCES)
+    if raw['equity_list'] is not None:
+        cleaned = [(symbol, clean_stock_name(company)) for symbol, company, _ in raw['equity_list']]
+        data['equity_symbols'] = [symbol for symbol, _ in cleaned]
+        data['stock_symbol_map'] = {company: symbol for symbol, company in cleaned}
+        data['company_names'] = [company for _, company in cleaned]
+        # Only the exceptions; every other listing trades in lots of one share
+        data['market_lots'] = {symbol: lot for symbol, _, lot in raw['equity_list'] if lot > 1}
+    if raw['all_schemes'] is not None:
+        data['all_schemes'] = raw['all_schemes']
+        data['scheme_index'] = build_index(raw['all_schemes'])
+    data['scheme_links'] = raw['scheme_links']
+    data['asset_allocation'] = raw['asset_allocation']
+    return data
+
+
+def build_bundle(bundle_path=BUNDLE_PATH, sources=SOURCES):
+    bundle = {'version': BUNDLE_VERSION, 'signature': source_signature(sources), 'data': compile_bundle(sources)}
+    # Written to a temporary file first so a concurrent reader never sees half a bundle
+    temp_path = f"{bundle_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, bundle_path)
+    except OSError as e:
+        print(f"Warning: couldn't save {bundle_path}, using it from memory only: {str(e)}")
+    _loaded[bundle_path] = bundle
+    return bundle
+
+
+def load_bundle(bundle_path=BUNDLE_PATH, sources=SOURCES):
+    """
+    Returns the compiled reference data, rebuilding it if any source file changed since the build.
+
+    The check is one stat() per source and code file (code is re-hashed only after it changed), so
+    callers can ask for the bundle as often as they like.
+    """
+    signature = source_signature(sources)
+    bundle = _loaded.get(bundle_path)
+    if bundle is None and os.path.exists(bundle_path):
+        try:
+            with open(bundle_path, 'rb') as f:
+                bundle = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f"Warning: rebuilding unreadable {bundle_path}: {str(e)}")
+            bundle = None
+    if bundle is None or bundle.get('version') != BUNDLE_VERSION or bundle.get('signature') != signature:
+        return build_bundle(bundle_path, sources)
+    _loaded[bundle_path] = bundle
+    return bundle
+
+
+def reference(name, bundle_path=BUNDLE_PATH, sources=SOURCES):
+    """
+    One piece of the bundle (see COMPONENT_SOURCES), e.g. reference('scheme_links').
+
+    Raises:
+        FileNotFoundError, json.JSONDecodeError: the source file is missing or invalid, exactly as
+            reading it directly would.
+    """
+    value = load_bundle(bundle_path, sources)['data'][name]
+    if value is None:
+        source = COMPONENT_SOURCES[name]
+        read_source(source, sources[source])  # raises the original error
+        value = build_bundle(bundle_path, sources)['data'][name]
+    return value
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    bundle = build_bundle()
+    built = time.perf_counter() - start
+    _loaded.clear()
+    start = time.perf_counter()
+    load_bundle()
+    loaded = time.perf_counter() - start
+    print(f"Compiled {', '.join(name for name, value in bundle['data'].items() if value is not None)}")
+    print(f"Bundle saved to {BUNDLE_PATH} ({os.path.getsize(BUNDLE_PATH) / 1024:.0f} KiB): "
+          f"built in {built * 1000:.0f} ms, loads in {loaded * 1000:.0f} ms")
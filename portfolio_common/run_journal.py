@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import time
+
+JOURNAL_PATH = 'data/run_journal.sqlite'
+RESUME_WINDOW = 12 * 3600  # an unfinished run older than this is abandoned and started over
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    item_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, item_key)
+);
+CREATE INDEX IF NOT EXISTS runs_by_kind ON runs (kind, finished_at);
+"""
+
+
+class RunJournal:
+    """
+    Per-item checkpoints for long batch runs (scrapes, NAV refreshes) in a small SQLite file.
+
+    A run of a given kind stays open until every item succeeded. Starting the same kind again
+    within RESUME_WINDOW picks that run back up: finished items keep their payloads and only the
+    failed or missing ones are handed out again.
+    """
+
+    def __init__(self, kind, path=JOURNAL_PATH, resume_window=RESUME_WINDOW):
+        self.kind = kind
+        self.resume_window = resume_window
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.run_id = None
+
+    def start(self, keys, resume=True):
+        """
+        Opens (or resumes) a run over keys.
+
+        Returns:
+            The keys still to do, in the given order.
+        """
+        keys = [str(key) for key in keys]
+        row = self.conn.execute(
+            "SELECT run_id, started_at FROM runs WHERE kind = ? AND finished_at IS NULL ORDER BY run_id DESC LIMIT 1",
+            (self.kind,)
+        ).fetchone()
+        if resume and row and time.time() - row[1] <= self.resume_window:
+            self.run_id = row[0]
+            done = self.done_keys()
+            pending = [key for key in keys if key not in done]
+            print(f"Resuming {self.kind} run {self.run_id}: {len(keys) - len(pending)} done, {len(pending)} to go")
+            return pending
+        with self.conn:
+            if row:
+                self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), row[0]))
+            self.run_id = self.conn.execute(
+                "INSERT INTO runs (kind, started_at) VALUES (?, ?)", (self.kind, time.time())
+            ).lastrowid
+        return keys
+
+    def record(self, key, status, payload=None, error=None):
+        # Commits immediately, so a crash loses at most the item in progress
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO items (run_id, item_key, status, payload, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_id, str(key), status, json.dumps(payload) if payload is not None else None, error, time.time())
+            )
+
+    def done(self, key, payload=None):
+        self.record(key, 'done', payload)
+
+    def failed(self, key, error):
+        self.record(key, 'failed', error=str(error))
+
+    def done_keys(self):
+        return {key for (key,) in self.conn.execute(
+            "SELECT item_key FROM items WHERE run_id = ? AND status = 'done'", (self.run_id,)
+        )}
+
+    def failed_items(self):
+        return dict(self.conn.execute(
+            "SELECT item_key, error FROM items WHERE run_id = ? AND status = 'failed'", (self.run_id,)
+        ).fetchall())
+
+    def payloads(self):
+        # {key: payload} of every finished item in this run
+        return {key: json.loads(payload) if payload is not None else None for key, payload in self.conn.execute(
+            "SELECT item_key, payload FROM items WHERE run_id = ? AND status = 'done'", (self.run_id,)
+        )}
+
+    def finish_if_complete(self, keys):
+        # Closes the run when every key is done; otherwise leaves it open for the next resume
+        remaining = {str(key) for key in keys} - self.done_keys()
+        if not remaining:
+            with self.conn:
+                self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        return remaining
+
+    def close(self):
+        self.conn.close()
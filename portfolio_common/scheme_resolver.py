@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.reference_bundle import ALL_SCHEMES_PATH, reference
+
+RESOLUTION_CACHE_PATH = 'data/mapping_data/scheme_resolution_cache.json'
+
+# Minimum cosine similarity and share of the query (by IDF weight) a match has to cover
+MIN_SCORE = 0.8
+MIN_COVERAGE = 0.75
+
+# Broker and file-name abbreviations seen in holdings statements
+TOKEN_ALIASES = {
+    "pru": "prudential", "eq": "equity", "mom": "momentum", "mf": "",
+    "govt": "government", "intl": "international", "corp": "corporate",
+}
+STOPWORDS = {"fund", "scheme", "plan", "option", "the", "of", "and", "formerly", "known", "as", "an", "open", "ended"}
+PLAN_TOKENS = {"direct": "direct", "dir": "direct", "regular": "regular", "reg": "regular"}
+OPTION_TOKENS = {
+    "growth": "growth", "g": "growth", "cumulative": "growth",
+    "idcw": "idcw", "dividend": "idcw", "div": "idcw", "payout": "idcw", "reinvestment": "idcw",
+    "income": "idcw", "distribution": "idcw", "cum": "idcw", "capital": "idcw", "withdrawal": "idcw",
+    "bonus": "bonus",
+}
+# "Mid Cap" / "Midcap" / "mid_cap" all become one token
+CAP_PATTERN = re.compile(r'\b(mid|small|large|flexi|multi|micro|focused)\s+cap\b')
+SAVER_PATTERN = re.compile(r'\btax\s+saver\b')
+
+
+def tokenize(name):
+    """
+    Splits a scheme or broker security name into core tokens plus plan and option variant.
+
+    Returns:
+        A tuple (core_tokens, plan, option) where plan is 'direct'/'regular'/None and
+        option is 'growth'/'idcw'/'bonus'/None.
+    """
+    text = name.lower().replace('&', ' and ').replace('_', ' ')
+    text = re.sub(r'(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])', ' ', text)  # nifty200 -> nifty 200
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    text = CAP_PATTERN.sub(r'\1cap', text)
+    text = SAVER_PATTERN.sub('taxsaver', text)
+
+    core = []
+    plan = None
+    options = set()
+    for token in text.split():
+        token = TOKEN_ALIASES.get(token, token)
+        if not token or token in STOPWORDS:
+            continue
+        if token in PLAN_TOKENS:
+            plan = PLAN_TOKENS[token]
+        elif token in OPTION_TOKENS:
+            options.add(OPTION_TOKENS[token])
+        else:
+            core.append(token)
+    # "Growth Plan - Bonus Option" is a bonus variant; IDCW wins over a stray "growth"
+    option = next((o for o in ("bonus", "idcw", "growth") if o in options), None)
+    return core, plan, option
+
+
+def build_index(schemes):
+    """
+    Token index over {scheme code: scheme name}, as the plain dict of attributes SchemeResolver uses
+    (so it can be pickled into the reference bundle).
+    """
+    codes = []
+    names = []
+    tokens = []
+    plans = []
+    options = []
+    postings = defaultdict(list)
+    for code, name in schemes.items():
+        core, plan, option = tokenize(name)
+        index = len(codes)
+        codes.append(code)
+        names.append(name)
+        tokens.append(set(core))
+        # Scheme names that don't mention a plan predate direct plans, i.e. regular
+        plans.append(plan or "regular")
+        options.append(option)
+        for token in set(core):
+            postings[token].append(index)
+
+    scheme_count = len(codes)
+    idf = {token: math.log(1 + scheme_count / len(indexes)) for token, indexes in postings.items()}
+    return {
+        "codes": codes, "names": names, "tokens": tokens, "plans": plans, "options": options,
+        "postings": dict(postings), "idf": idf,
+        "norms": [math.sqrt(sum(idf[t] ** 2 for t in scheme_tokens)) for scheme_tokens in tokens],
+        "max_idf": max(idf.values(), default=1.0),
+    }
+
+
+class SchemeResolver:
+    """
+    Token inverted index over all_schemes.json for mapping broker security names to scheme codes.
+
+    Matching is an IDF-weighted cosine over core tokens; Direct/Regular and Growth/IDCW are
+    treated as variants so a name like "Axis Midcap Direct Growth" lands on the right plan.
+    """
+
+    def __init__(self, schemes_path=ALL_SCHEMES_PATH, cache_path=RESOLUTION_CACHE_PATH):
+        if schemes_path == ALL_SCHEMES_PATH:
+            # Prebuilt in the reference bundle; rebuilt there only when all_schemes.json changes
+            index = reference('scheme_index')
+        else:
+            with open(schemes_path, 'r') as f:
+                schemes = json.load(f)
+            schemes.pop("Scheme Code", None)  # header row
+            index = build_index(schemes)
+        self.__dict__.update(index)
+
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self.cache = json.load(f)
+        self._misses = set()
+
+    def candidates(self, name, limit=5):
+        # Ranked (score, coverage, code, scheme name) matches that respect the requested variant
+        core, plan, option = tokenize(name)
+        query = set(core)
+        known = [t for t in query if t in self.idf]
+        if not known:
+            return []
+        query_norm = math.sqrt(sum(self.idf[t] ** 2 for t in known))
+        # Unknown query tokens still count against coverage
+        query_weight = sum(self.idf.get(t, self.max_idf) for t in query)
+
+        overlap = defaultdict(float)
+        for token in known:
+            weight = self.idf[token] ** 2
+            for index in self.postings[token]:
+                overlap[index] += weight
+
+        matches = []
+        for index, shared in overlap.items():
+            if plan and self.plans[index] != plan:
+                continue
+            if option and self.options[index] not in (option, None):
+                continue
+            score = shared / (query_norm * self.norms[index])
+            coverage = sum(self.idf[t] for t in known if t in self.tokens[index]) / query_weight
+            # Unspecified variants fall back to Direct / Growth
+            preference = (self.plans[index] == (plan or "direct")) + (self.options[index] == (option or "growth"))
+            matches.append((round(score, 6), preference, coverage, index))
+        matches.sort(key=lambda m: (m[0], m[1]), reverse=True)
+        return [(score, coverage, self.codes[index], self.names[index]) for score, _, coverage, index in matches[:limit]]
+
+    def resolve(self, name):
+        # Scheme code for a security name, or None if nothing matches confidently
+        if name in self.cache:
+            return self.cache[name]
+        if name in self._misses:
+            return None
+        best = next(iter(self.candidates(name, limit=1)), None)
+        if best is None or best[0] < MIN_SCORE or best[1] < MIN_COVERAGE:
+            self._misses.add(name)
+            return None
+        self.cache[name] = best[2]
+        self._save_cache()
+        return best[2]
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        with open(self.cache_path, 'w') as f:
+            json.dump(self.cache, f, indent=4, sort_keys=True)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    resolver = SchemeResolver(cache_path=None)
+    print(f"Indexed {len(resolver.codes)} schemes in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for query in sys.argv[1:]:
+        start = time.perf_counter()
+        matches = resolver.candidates(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"\n{query} ({elapsed:.2f} ms)")
+        for score, coverage, code, name in matches:
+            print(f"  {score:.3f} cov={coverage:.2f} {code} {name}")
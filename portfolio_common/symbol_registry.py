@@ -0,0 +1,124 @@
+import csv
+import json
+import os
+import numpy as np
+from portfolio_common.reference_bundle import ALL_SCHEMES_PATH, EQUITY_LIST_PATH, reference
+
+REGISTRY_PATH = 'data/mapping_data/symbol_registry.json'
+UNKNOWN_ID = -1
+
+
+def scheme_key(scheme_code):
+    # Scheme codes show up as ints (mf_dict), strings (schema_links_mf.json) and file-name suffixes
+    return str(scheme_code).strip().lstrip('0') or '0'
+
+
+class SymbolRegistry:
+    """
+    Dense, persistent integer IDs for NSE symbols and mutual fund scheme codes.
+
+    IDs are append-only: once assigned they never change, so arrays and caches keyed by them
+    stay valid across runs. Symbols and schemes have separate ID spaces. Only NSE symbols belong
+    in the symbol space; callers leave names that don't resolve to one unregistered.
+    """
+
+    def __init__(self, registry_path=REGISTRY_PATH):
+        self.registry_path = registry_path
+        self.symbols = []
+        self.schemes = []
+        if registry_path and os.path.exists(registry_path):
+            with open(registry_path, 'r') as f:
+                data = json.load(f)
+            self.symbols = data.get('symbols', [])
+            self.schemes = data.get('schemes', [])
+        self._symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._scheme_ids = {scheme: i for i, scheme in enumerate(self.schemes)}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, registry_path=REGISTRY_PATH, equity_list_path=EQUITY_LIST_PATH, all_schemes_path=ALL_SCHEMES_PATH):
+        # Registry seeded from the reference files; new listings get the next free IDs
+        registry = cls(registry_path)
+        registry.sync(equity_list_path, all_schemes_path)
+        return registry
+
+    def sync(self, equity_list_path=EQUITY_LIST_PATH, all_schemes_path=ALL_SCHEMES_PATH):
+        for symbol in self._reference_keys('equity_symbols', equity_list_path, EQUITY_LIST_PATH):
+            self.symbol_id(symbol, register=True)
+        for code in self._reference_keys('all_schemes', all_schemes_path, ALL_SCHEMES_PATH):
+            self.scheme_id(code, register=True)
+        self.save()
+
+    @staticmethod
+    def _reference_keys(component, path, default_path):
+        # Symbols / scheme codes from the reference bundle, or straight from a non-default file
+        if not path or not os.path.exists(path):
+            return []
+        if path == default_path:
+            return reference(component)
+        if component == 'equity_symbols':
+            with open(path, mode='r', encoding='utf-8') as csvfile:
+                return [row['SYMBOL'] for row in csv.DictReader(csvfile)]
+        with open(path, 'r') as f:
+            return [code for code in json.load(f) if code != "Scheme Code"]  # skip the header row
+
+    def save(self):
+        if not self._dirty or not self.registry_path:
+            return
+        with open(self.registry_path, 'w') as f:
+            json.dump({'symbols': self.symbols, 'schemes': self.schemes}, f)
+        self._dirty = False
+
+    # Single lookups
+
+    def symbol_id(self, symbol, register=False):
+        if symbol is None:
+            return UNKNOWN_ID
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            if not register or symbol == 'N/A':
+                return UNKNOWN_ID
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self._symbol_ids[symbol] = symbol_id
+            self._dirty = True
+        return symbol_id
+
+    def scheme_id(self, scheme_code, register=False):
+        if scheme_code is None or scheme_code == 'N/A':
+            return UNKNOWN_ID
+        key = scheme_key(scheme_code)
+        scheme_id = self._scheme_ids.get(key)
+        if scheme_id is None:
+            if not register:
+                return UNKNOWN_ID
+            scheme_id = len(self.schemes)
+            self.schemes.append(key)
+            self._scheme_ids[key] = scheme_id
+            self._dirty = True
+        return scheme_id
+
+    def symbol(self, symbol_id):
+        return None if symbol_id == UNKNOWN_ID else self.symbols[symbol_id]
+
+    def scheme(self, scheme_id):
+        return None if scheme_id == UNKNOWN_ID else self.schemes[scheme_id]
+
+    # Vectorized lookups
+
+    def symbol_ids(self, symbols, register=False):
+        return np.fromiter((self.symbol_id(s, register) for s in symbols), dtype=np.int32)
+
+    def scheme_ids(self, scheme_codes, register=False):
+        return np.fromiter((self.scheme_id(c, register) for c in scheme_codes), dtype=np.int32)
+
+    def symbols_for(self, symbol_ids):
+        return [self.symbol(int(i)) for i in symbol_ids]
+
+    def schemes_for(self, scheme_ids):
+        return [self.scheme(int(i)) for i in scheme_ids]
+
+
+if __name__ == "__main__":
+    registry = SymbolRegistry.load()
+    print(f"Registry has {len(registry.symbols)} symbols and {len(registry.schemes)} schemes: {REGISTRY_PATH}")
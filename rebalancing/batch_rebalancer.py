@@ -0,0 +1,172 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_ingest import ingest_holdings
+from portfolio_common.reference_bundle import ASSET_ALLOCATION_PATH, reference
+from rebalancing.order_book import BOOK_FIELDS, MAX_CHILD_VALUE, OrderBook, iter_child_orders, write_orders
+from rebalancing.rebalance_plan import plan_rebalancing, target_ratios_from_allocation
+
+HOLDINGS_DIR = 'data/account_holdings'
+OUTPUT_DIR = 'data/batch_orders'
+HOLDINGS_EXTENSIONS = ('.csv', '.json', '.jsonl')
+ORDER_FIELDS = ["Instrument", "Action", "Shares", "Stock Price", "Value Bought/Sold", "Original Qty", "New Qty"]
+
+# Set once per worker process by the pool initializer, so the targets and the price snapshot
+# are pickled once per worker instead of once per portfolio
+_worker_state = {}
+
+def discover_accounts(holdings_dir=HOLDINGS_DIR):
+    # One account per statement file, or per sub-folder of statements (e.g. a household's demat and MF files).
+    # Files and folders that share a name (a.csv, a.json, a/) are one account holding all of their statements.
+    accounts = {}
+    for entry in sorted(os.listdir(holdings_dir)):
+        path = os.path.join(holdings_dir, entry)
+        if os.path.isdir(path):
+            account = entry
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(HOLDINGS_EXTENSIONS))
+        elif entry.lower().endswith(HOLDINGS_EXTENSIONS):
+            account = os.path.splitext(entry)[0]
+            files = [path]
+        else:
+            continue
+        if files and account in accounts:
+            print(f"Note: merging {path} into account {account} ({len(accounts[account])} files so far)")
+        if files:
+            accounts.setdefault(account, []).extend(files)
+    return accounts
+
+def load_target_ratios(path=ASSET_ALLOCATION_PATH):
+    if path == ASSET_ALLOCATION_PATH:
+        return target_ratios_from_allocation(reference('asset_allocation'))
+    with open(path, 'r') as f:
+        return target_ratios_from_allocation(json.load(f))
+
+def load_price_snapshot(symbols, prices_path=None):
+    """
+    One price per target symbol, shared by every account in the batch: read from a saved snapshot
+    ({symbol: price}) or fetched once in batched yfinance requests.
+    """
+    if prices_path:
+        with open(prices_path, 'r') as f:
+            return {symbol: float(price) for symbol, price in json.load(f).items() if price}
+    from refresh_prices.update_stock_prices import fetch_prices_chunked, report_missing
+
+    prices, missing = fetch_prices_chunked(list(symbols))
+    report_missing(missing)
+    return prices
+
+def _init_worker(target_ratios, prices, options):
+    _worker_state.update(target_ratios=target_ratios, prices=prices, options=options)
+
+def rebalance_account(account, files):
+    # Runs in a worker process; errors are returned rather than raised so one bad account doesn't stop the batch
+    start = time.perf_counter()
+    try:
+        holdings = ingest_holdings(files)
+        actions, funds, _, _, _ = plan_rebalancing(
+            holdings, _worker_state["target_ratios"], _worker_state["prices"], **_worker_state["options"]
+        )
+    except Exception as e:
+        return {"account": account, "error": f"{type(e).__name__}: {str(e)}"}
+    return {
+        "account": account,
+        "orders": actions,
+        "portfolio_value": float(holdings["Cur_val"].sum()),
+        "unused_funds": float(funds["amount"]),
+        "seconds": time.perf_counter() - start,
+    }
+
+def run_batch(accounts, target_ratios, prices, options, workers=None):
+    """
+    Plans every account against the same targets and prices.
+
+    Returns:
+        A list of per-account results (see rebalance_account), in account order.
+    """
+    names, files = list(accounts), list(accounts.values())
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(target_ratios, prices, options)
+        return [rebalance_account(name, account_files) for name, account_files in zip(names, files)]
+    # A few tasks per worker keeps the pool busy without a round trip per portfolio
+    chunksize = max(1, len(names) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(target_ratios, prices, options)) as executor:
+        return list(executor.map(rebalance_account, names, files, chunksize=chunksize))
+
+def write_csv(path, fields, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def write_outputs(output_dir, results, prices, book, summary, child_orders):
+    os.makedirs(os.path.join(output_dir, 'orders'), exist_ok=True)
+    for result in results:
+        if "orders" in result:
+            write_csv(os.path.join(output_dir, 'orders', f"{result['account']}.csv"), ORDER_FIELDS, result["orders"])
+    write_csv(os.path.join(output_dir, 'order_book.csv'), BOOK_FIELDS, book.rows())
+    summary["child_orders"] = write_orders(os.path.join(output_dir, 'exchange_orders.csv'), child_orders)
+    with open(os.path.join(output_dir, 'prices.json'), 'w') as f:
+        json.dump(prices, f, indent=4, sort_keys=True)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebalance many accounts against one target model without the UI")
+    parser.add_argument("holdings_dir", nargs="?", default=HOLDINGS_DIR,
+                        help="Folder with one holdings file (or one sub-folder of statements) per account")
+    parser.add_argument("--targets", default=ASSET_ALLOCATION_PATH, help="Target model in asset_allocation.json format")
+    parser.add_argument("--prices", help="Use this {symbol: price} JSON snapshot instead of fetching prices")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU; 1 runs in-process)")
+    parser.add_argument("--extra-funds", type=float, default=0.0, help="Cash added to every account")
+    parser.add_argument("--optimizer", choices=["greedy", "cost_aware"], default="greedy")
+    parser.add_argument("--max-child-value", type=float, default=MAX_CHILD_VALUE, help="Largest exchange child order in ₹")
+    args = parser.parse_args()
+
+    accounts = discover_accounts(args.holdings_dir)
+    if not accounts:
+        print(f"Error: no holdings files found in {args.holdings_dir}")
+        sys.exit(1)
+    target_ratios = load_target_ratios(args.targets)
+
+    start = time.perf_counter()
+    prices = load_price_snapshot(target_ratios, args.prices)
+    price_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = run_batch(accounts, target_ratios, prices, {"extra_funds": args.extra_funds, "optimizer": args.optimizer}, args.workers)
+    plan_seconds = time.perf_counter() - start
+
+    failed = {result["account"]: result["error"] for result in results if "error" in result}
+    for account, error in failed.items():
+        print(f"Error rebalancing {account}: {error}")
+    book = OrderBook()
+    for result in results:
+        book.add_plan(result["account"], result.get("orders", []))
+    summary = {
+        "accounts": len(accounts),
+        "failed": len(failed),
+        "orders": sum(len(result.get("orders", [])) for result in results),
+        "net_orders": len(book.net()),
+        "priced_symbols": len(prices),
+        "target_symbols": len(target_ratios),
+        "price_snapshot_seconds": round(price_seconds, 3),
+        "planning_seconds": round(plan_seconds, 3),
+        "portfolios_per_second": round(len(accounts) / plan_seconds, 2) if plan_seconds > 0 else None,
+    }
+    write_outputs(args.output_dir, results, prices, book, summary,
+                  iter_child_orders(book, max_child_value=args.max_child_value))
+
+    print(f"Priced {len(prices)}/{len(target_ratios)} target symbols in {price_seconds:.2f}s")
+    print(f"Rebalanced {len(accounts) - len(failed)}/{len(accounts)} accounts in {plan_seconds:.2f}s "
+          f"({summary['portfolios_per_second']} portfolios/s)")
+    print(f"{summary['orders']} account orders netted to {summary['net_orders']} book orders "
+          f"({summary['child_orders']} exchange child orders): {args.output_dir}")
@@ -0,0 +1,298 @@
+import argparse
+import heapq
+import math
+import random
+import time
+from rebalancing.sector_caps import UNCLASSIFIED, sector_totals, within_sector_cap
+
+# Default per-trade cost model for NSE delivery trades.
+# brokerage_fixed is charged once per order, the *_pct values are % of traded value.
+DEFAULT_COST_MODEL = {
+    "brokerage_fixed": 20.0,
+    "brokerage_pct": 0.0,
+    "stt_pct": 0.1,
+    "slippage_pct": 0.05,
+}
+
+# Penalty (₹ per ₹ of misallocation) used to trade off drift against trading cost.
+DEFAULT_DRIFT_PENALTY = 0.02
+
+# Above this many stocks the exact frontier search is replaced by the heuristic
+EXACT_MAX_STOCKS = 12
+
+
+def trade_cost(trade_value, cost_model=None):
+    cost_model = cost_model or DEFAULT_COST_MODEL
+    trade_value = abs(trade_value)
+    if trade_value <= 0:
+        return 0.0
+    proportional_pct = cost_model.get("brokerage_pct", 0) + cost_model.get("stt_pct", 0) + cost_model.get("slippage_pct", 0)
+    return cost_model.get("brokerage_fixed", 0) + trade_value * proportional_pct / 100
+
+
+# Original share-by-share greedy loop of calculate_rebalancing.
+# With sector_caps, leftover cash is never spent on a stock whose sector is already at its cap.
+def greedy_allocation(target_ratios, latest_prices, total_available_funds, stock_sectors=None, sector_caps=None):
+    target_stocks = list(target_ratios.keys())
+    total_ratio = sum(target_ratios.values())
+    target_values = {stock: (target_ratios[stock] / total_ratio) * total_available_funds for stock in target_stocks}
+    ideal_allocations_percent = {stock: round(ratio / total_ratio * 100, 2) for stock, ratio in target_ratios.items()}
+
+    updated_quantities = {
+        stock: math.floor(target_values[stock] / latest_prices.get(stock, 0))
+        if latest_prices.get(stock, 0) > 0 else 0
+        for stock in target_stocks
+    }
+    initial_cost = sum(updated_quantities[stock] * latest_prices.get(stock, 0) for stock in target_stocks)
+    available_funds = total_available_funds - initial_cost
+
+    stock_sectors = stock_sectors or {}
+    sector_caps = sector_caps or {}
+    min_price = min((price for price in latest_prices.values() if price > 0), default=float('inf'))
+    while available_funds > min_price:
+        holding_values = {stock: updated_quantities[stock] * latest_prices.get(stock, 0) for stock in target_stocks}
+        total_value = sum(holding_values.values()) + available_funds
+        sector_values = sector_totals(holding_values, stock_sectors) if sector_caps else {}
+        candidates = [
+            (stock, ideal_allocations_percent[stock] - (holding_values[stock] / total_value * 100 if total_value > 0 else 0), latest_prices[stock])
+            for stock in target_stocks if latest_prices.get(stock, 0) <= available_funds and latest_prices.get(stock, 0) > 0
+            and (not sector_caps or within_sector_cap(stock, latest_prices[stock], sector_values, total_value, stock_sectors, sector_caps))
+        ]
+        if not candidates:
+            break
+        stock_to_buy, _, ltp = max(candidates, key=lambda x: x[1])
+        updated_quantities[stock_to_buy] += 1
+        available_funds -= ltp
+
+    return updated_quantities, available_funds
+
+
+# Candidate end positions for one stock: keep, move to the share count just below/above target, or
+# buy up to the target net of the trade's own cost (so a fully funded plan still fits its budget).
+# Each option is (objective, net_spend, qty) where net_spend includes trading costs.
+def _stock_options(original_qty, price, target_value, cost_model, drift_penalty):
+    if price <= 0:
+        return [(0.0, 0.0, original_qty)]
+    floor_qty = math.floor(target_value / price)
+    net_qty = math.floor((target_value - trade_cost(target_value - original_qty * price, cost_model)) / price)
+    options = {}
+    for qty in (original_qty, floor_qty, floor_qty + 1, net_qty):
+        if qty < 0 or qty in options:
+            continue
+        traded_value = (qty - original_qty) * price
+        cost = trade_cost(traded_value, cost_model) if qty != original_qty else 0.0
+        drift = abs(qty * price - target_value)
+        options[qty] = (cost + drift_penalty * drift, traded_value + cost, qty)
+    return sorted(options.values(), key=lambda x: x[1])
+
+
+# Exact multiple-choice knapsack over the Pareto frontier of (spend, objective)
+def _solve_exact(stock_options, budget):
+    frontier = [(0.0, 0.0, ())]  # (spend, objective, chosen option indexes)
+    for options in stock_options:
+        expanded = [
+            (spend + opt_spend, obj + opt_obj, chosen + (idx,))
+            for spend, obj, chosen in frontier
+            for idx, (opt_obj, opt_spend, _) in enumerate(options)
+        ]
+        expanded.sort(key=lambda x: (x[0], x[1]))
+        frontier = []
+        best_obj = float('inf')
+        for state in expanded:
+            if state[1] < best_obj:  # drop states that spend more for no improvement
+                frontier.append(state)
+                best_obj = state[1]
+    # Sells can make earlier partial spends negative, so the budget is only checked at the end
+    feasible = [state for state in frontier if state[0] <= budget + 1e-9]
+    if not feasible:
+        return None
+    return list(min(feasible, key=lambda x: x[1])[2])
+
+
+# Lagrangian-style heuristic: start from each stock's best option and, while over budget,
+# step back along the option with the smallest objective increase per rupee saved.
+def _solve_heuristic(stock_options, budget):
+    chosen = [min(range(len(options)), key=lambda i: options[i][0]) for options in stock_options]
+    spend = sum(options[i][1] for options, i in zip(stock_options, chosen))
+
+    heap = []
+
+    def push_downgrade(stock_idx):
+        options = stock_options[stock_idx]
+        current = options[chosen[stock_idx]]
+        for idx, option in enumerate(options):
+            saved = current[1] - option[1]
+            if saved > 0:
+                heapq.heappush(heap, ((option[0] - current[0]) / saved, stock_idx, chosen[stock_idx], idx))
+
+    for stock_idx in range(len(stock_options)):
+        push_downgrade(stock_idx)
+
+    while spend > budget + 1e-9 and heap:
+        _, stock_idx, from_idx, to_idx = heapq.heappop(heap)
+        if chosen[stock_idx] != from_idx:
+            continue  # stale entry
+        options = stock_options[stock_idx]
+        spend += options[to_idx][1] - options[from_idx][1]
+        chosen[stock_idx] = to_idx
+        push_downgrade(stock_idx)
+
+    if spend > budget + 1e-9:
+        return None
+
+    # Spend any slack on upgrades that still lower the objective, best ratio first
+    improved = True
+    while improved:
+        improved = False
+        best = None
+        for stock_idx, options in enumerate(stock_options):
+            current = options[chosen[stock_idx]]
+            for idx, option in enumerate(options):
+                extra = option[1] - current[1]
+                gain = current[0] - option[0]
+                if gain > 0 and spend + extra <= budget + 1e-9:
+                    ratio = gain / extra if extra > 0 else float('inf')
+                    if best is None or ratio > best[0]:
+                        best = (ratio, stock_idx, idx, extra)
+        if best:
+            _, stock_idx, idx, extra = best
+            chosen[stock_idx] = idx
+            spend += extra
+            improved = True
+    return chosen
+
+
+# Rounding and skipped trades can leave a sector over its cap even when the target ratios respect
+# it; shares are taken off the sector's most overweight stock until the cap holds again.
+def _trim_to_sector_caps(quantities, latest_prices, target_values, total_value, stock_sectors, sector_caps):
+    values = {stock: qty * latest_prices.get(stock, 0) for stock, qty in quantities.items()}
+    for sector, cap in sector_caps.items():
+        members = [stock for stock in quantities if stock_sectors.get(stock, UNCLASSIFIED) == sector]
+        while members and total_value > 0:
+            excess = sector_totals(values, stock_sectors).get(sector, 0) - cap / 100 * total_value
+            sellable = [stock for stock in members if quantities[stock] > 0 and latest_prices.get(stock, 0) > 0]
+            if excess <= 1e-9 or not sellable:
+                break
+            stock = max(sellable, key=lambda s: values[s] - target_values[s])
+            price = latest_prices[stock]
+            shares = min(quantities[stock], math.ceil(excess / price - 1e-9))
+            quantities[stock] -= shares
+            values[stock] = quantities[stock] * price
+    return quantities
+
+
+def cost_aware_allocation(target_ratios, latest_prices, original_quantities, extra_funds=0,
+                          cost_model=None, drift_penalty=DEFAULT_DRIFT_PENALTY, exact_max_stocks=EXACT_MAX_STOCKS,
+                          total_available_funds=None, stock_sectors=None, sector_caps=None):
+    """
+    Chooses integer share counts that trade off drift from the target ratios against trading costs.
+
+    Args:
+        target_ratios: Mapping of stock to target ratio (need not sum to 100).
+        latest_prices: Mapping of stock to latest price.
+        original_quantities: Mapping of stock to currently held quantity.
+        extra_funds: Fresh cash available on top of the current holdings.
+        cost_model: Per-trade cost model, see DEFAULT_COST_MODEL.
+        drift_penalty: ₹ of penalty per ₹ of absolute misallocation.
+        exact_max_stocks: Largest universe solved exactly; bigger ones use the heuristic.
+        total_available_funds: Total value to allocate, as greedy_allocation takes it. Defaults to
+            the held shares at latest prices plus extra_funds; pass it when some holdings only
+            have a value (no quantity), which then counts as cash like extra_funds.
+        stock_sectors: Optional {symbol: sector}, used with sector_caps.
+        sector_caps: Optional {sector: max %}; the chosen quantities are trimmed until every
+            capped sector is within its cap, and the cash freed is left unspent.
+
+    Returns:
+        A tuple (updated_quantities, available_funds, total_cost).
+    """
+    cost_model = cost_model or DEFAULT_COST_MODEL
+    target_stocks = list(target_ratios.keys())
+    total_ratio = sum(target_ratios.values())
+    current_value = sum(original_quantities.get(stock, 0) * latest_prices.get(stock, 0) for stock in target_stocks)
+    if total_available_funds is None:
+        total_available_funds = current_value + extra_funds
+    # Cash the plan may spend: everything that isn't already held as shares
+    budget = total_available_funds - current_value
+    target_values = {stock: (target_ratios[stock] / total_ratio) * total_available_funds for stock in target_stocks}
+
+    stock_options = [
+        _stock_options(original_quantities.get(stock, 0), latest_prices.get(stock, 0), target_values[stock], cost_model, drift_penalty)
+        for stock in target_stocks
+    ]
+
+    chosen = None
+    if len(target_stocks) <= exact_max_stocks:
+        chosen = _solve_exact(stock_options, budget)
+    if chosen is None:
+        chosen = _solve_heuristic(stock_options, budget)
+    if chosen is None:
+        # Not even holding still fits the budget (e.g. negative extra funds); keep everything as is
+        chosen = [next(i for i, option in enumerate(options) if option[2] == original_quantities.get(stock, 0))
+                  if len(options) > 1 else 0
+                  for stock, options in zip(target_stocks, stock_options)]
+
+    updated_quantities = {stock: options[idx][2] for stock, options, idx in zip(target_stocks, stock_options, chosen)}
+    if sector_caps:
+        updated_quantities = _trim_to_sector_caps(updated_quantities, latest_prices, target_values,
+                                                  total_available_funds, stock_sectors or {}, sector_caps)
+
+    total_spend = 0.0
+    total_cost = 0.0
+    for stock, qty in updated_quantities.items():
+        traded_value = (qty - original_quantities.get(stock, 0)) * latest_prices.get(stock, 0)
+        cost = trade_cost(traded_value, cost_model)
+        total_spend += traded_value + cost
+        total_cost += cost
+
+    return updated_quantities, budget - total_spend, total_cost
+
+
+# Plan quality summary used by the benchmark
+def evaluate_plan(target_ratios, latest_prices, original_quantities, updated_quantities, cost_model=None):
+    total_ratio = sum(target_ratios.values())
+    orders = 0
+    total_cost = 0.0
+    for stock in target_ratios:
+        traded_value = (updated_quantities[stock] - original_quantities.get(stock, 0)) * latest_prices[stock]
+        if traded_value:
+            orders += 1
+            total_cost += trade_cost(traded_value, cost_model)
+    portfolio_value = sum(updated_quantities[stock] * latest_prices[stock] for stock in target_ratios)
+    tracking_error = sum(
+        abs(updated_quantities[stock] * latest_prices[stock] / portfolio_value * 100 - target_ratios[stock] / total_ratio * 100)
+        for stock in target_ratios
+    ) if portfolio_value > 0 else 0.0
+    return {"orders": orders, "cost": total_cost, "abs_drift_pct": tracking_error}
+
+
+def run_benchmark(sizes=(10, 50, 200), extra_funds=50000, seed=7):
+    rng = random.Random(seed)
+    print(f"{'n':>5} {'method':>10} {'orders':>7} {'cost (₹)':>10} {'drift %':>8} {'time (ms)':>10}")
+    for n in sizes:
+        stocks = [f"STK{i}" for i in range(n)]
+        prices = {stock: round(rng.uniform(50, 5000), 2) for stock in stocks}
+        ratios = {stock: rng.uniform(1, 10) for stock in stocks}
+        # Start from a portfolio that is roughly on target, as after a previous rebalance
+        total_ratio = sum(ratios.values())
+        holdings = {stock: max(0, round(ratios[stock] / total_ratio * 20_00_000 * rng.uniform(0.9, 1.1) / prices[stock])) for stock in stocks}
+        total_funds = sum(holdings[stock] * prices[stock] for stock in stocks) + extra_funds
+
+        start = time.perf_counter()
+        greedy_qty, _ = greedy_allocation(ratios, prices, total_funds)
+        greedy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        optimal_qty, _, _ = cost_aware_allocation(ratios, prices, holdings, extra_funds)
+        optimal_ms = (time.perf_counter() - start) * 1000
+
+        for method, qty, elapsed in (("greedy", greedy_qty, greedy_ms), ("cost-aware", optimal_qty, optimal_ms)):
+            stats = evaluate_plan(ratios, prices, holdings, qty)
+            print(f"{n:>5} {method:>10} {stats['orders']:>7} {stats['cost']:>10.2f} {stats['abs_drift_pct']:>8.3f} {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the greedy rebalancing loop against the cost-aware optimizer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--extra-funds", type=float, default=50000)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.extra_funds)
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_ingest import ingest_holdings
+from portfolio_common.reference_bundle import ASSET_ALLOCATION_PATH
+from rebalancing.batch_rebalancer import load_target_ratios
+from refresh_prices.live_price_feed import BackgroundPriceRefresher, IncrementalAllocation, PriceTable, fetch_batch_quotes
+
+OUTBOX_DIR = 'data/alerts/outbox'
+CHECK_INTERVAL = 60  # seconds between drift checks
+PRICE_INTERVAL = 300  # seconds between batched quote requests
+# A symbol is out of band when |current - target| exceeds the larger of the two bands, so small
+# targets aren't flagged for a few basis points of noise and large ones get a proportional band
+ABSOLUTE_BAND_PCT = 0.5
+RELATIVE_BAND = 0.25
+REALERT_SECONDS = 6 * 3600  # a breach that persists is reported again after this long
+
+
+class DriftMonitor:
+    """
+    Tracks how far a portfolio's allocation is from its targets as prices change.
+
+    Like plan_rebalancing, only holdings of target symbols are considered: other holdings (MFs,
+    stocks outside the model) are left alone and drift is measured against the value of the rest.
+
+    Holdings are valued with IncrementalAllocation, so a tick only revalues the rows whose price
+    moved (and skips the drift pass when none did); per-symbol values are kept up to date from the
+    same deltas, and drift against every target is then one vectorized pass.
+
+    When state_path is given, the time each breach was last reported is kept there, so a run
+    started from cron doesn't repeat alerts that an earlier run already wrote.
+    """
+
+    def __init__(self, account, holdings_df, target_ratios, absolute_band=ABSOLUTE_BAND_PCT,
+                 relative_band=RELATIVE_BAND, realert_seconds=REALERT_SECONDS, state_path=None):
+        self.account = account
+        targeted = holdings_df[holdings_df['Instrument'].isin(list(target_ratios))]
+        self.untracked_holdings = len(holdings_df) - len(targeted)
+        # Targets that aren't held get a zero-quantity row, so they show up as underweight
+        held = set(targeted['Instrument'])
+        missing = [symbol for symbol in target_ratios if symbol not in held]
+        instruments = list(targeted['Instrument']) + missing
+        self.allocation = IncrementalAllocation(
+            instruments,
+            list(targeted['Qty']) + [0] * len(missing),
+            list(targeted['Cur_val']) + [0] * len(missing),
+        )
+        self.symbols, self.row_symbol = np.unique(np.array(instruments), return_inverse=True)
+        self.symbols = self.symbols.tolist()
+        self.row_values = self.allocation.values.copy()
+        self.symbol_values = np.bincount(self.row_symbol, weights=self.row_values, minlength=len(self.symbols))
+
+        total_ratio = sum(target_ratios.values())
+        self.targets = np.array([
+            target_ratios.get(symbol, 0) / total_ratio * 100 if total_ratio > 0 else 0 for symbol in self.symbols
+        ])
+        self.bands = np.maximum(absolute_band, relative_band * self.targets)
+        self.realert_seconds = realert_seconds
+        self.state_path = state_path
+        self.last_alerted = load_state(state_path)  # symbol → time its breach was last reported
+        self.checked = False
+
+    def held_symbols(self):
+        # Rows with a quantity or a value need quotes (value-only rows get their quantity from the
+        # first one); the zero rows added for unheld targets stay at 0
+        held = (self.allocation.quantities > 0) | (self.allocation.values > 0)
+        return sorted({self.allocation.instruments[row] for row in np.flatnonzero(held).tolist()})
+
+    def drift(self):
+        # Current minus target allocation in percentage points, per symbol
+        total = self.allocation.total_value
+        current = self.symbol_values / total * 100 if total > 0 else np.zeros_like(self.symbol_values)
+        return current, current - self.targets
+
+    def check(self, price_table, now=None):
+        """
+        Applies the price table's changes since the last check.
+
+        Returns:
+            An alert dict when a symbol newly breached its band (or has stayed out of band for
+            realert_seconds), otherwise None.
+        """
+        now = time.time() if now is None else now
+        rows = self.allocation.sync(price_table)
+        if rows.size:
+            np.add.at(self.symbol_values, self.row_symbol[rows], self.allocation.values[rows] - self.row_values[rows])
+            self.row_values[rows] = self.allocation.values[rows]
+        elif self.checked:
+            return None
+        self.checked = True
+
+        current, drift = self.drift()
+        breached = np.flatnonzero(np.abs(drift) > self.bands)
+        breached_symbols = {self.symbols[i] for i in breached.tolist()}
+        # Breaches that cleared are forgotten, so they alert again if they come back
+        last_alerted = {symbol: t for symbol, t in self.last_alerted.items() if symbol in breached_symbols}
+        due = [symbol for symbol in breached_symbols if now - last_alerted.get(symbol, -np.inf) >= self.realert_seconds]
+        for symbol in due:
+            last_alerted[symbol] = now
+        if last_alerted != self.last_alerted:
+            self.last_alerted = last_alerted
+            save_state(self.state_path, last_alerted)
+        if not due:
+            return None
+
+        order = breached[np.argsort(-np.abs(drift[breached]))]
+        return {
+            "account": self.account,
+            "created_at": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            "target_holdings_value": round(self.allocation.total_value, 2),
+            "untracked_holdings": self.untracked_holdings,
+            "new_breaches": sorted(due),
+            "breaches": [
+                {
+                    "Symbol": self.symbols[i],
+                    "Action": "Sell" if drift[i] > 0 else "Buy",
+                    "Current (%)": round(float(current[i]), 2),
+                    "Target (%)": round(float(self.targets[i]), 2),
+                    "Drift (%)": round(float(drift[i]), 2),
+                    "Band (%)": round(float(self.bands[i]), 2),
+                }
+                for i in order.tolist()
+            ],
+        }
+
+
+def state_file(outbox_dir, account):
+    # Kept in a hidden sub-folder so outbox consumers only see alerts
+    return os.path.join(outbox_dir, '.state', f"{account}.json")
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return {symbol: float(t) for symbol, t in json.load(f).items()}
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Warning: ignoring unreadable alert state {path}: {str(e)}")
+        return {}
+
+
+def save_state(path, last_alerted):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(last_alerted, f, indent=4, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def write_alert(alert, outbox_dir=OUTBOX_DIR):
+    # One JSON file per alert; written under a temporary name first so a consumer never picks up half a file
+    os.makedirs(outbox_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(outbox_dir, f"{stamp}_{alert['account']}_drift.json")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(alert, f, indent=4)
+    os.replace(temp_path, path)
+    return path
+
+
+def run_monitor(monitor, price_table, stop_event, interval=CHECK_INTERVAL, outbox_dir=OUTBOX_DIR):
+    # Checks on every tick until stop_event is set; the wait sleeps without spinning between ticks
+    while True:
+        alert = monitor.check(price_table)
+        if alert:
+            path = write_alert(alert, outbox_dir)
+            print(f"{alert['created_at']} {len(alert['breaches'])} symbols out of band "
+                  f"(new: {', '.join(alert['new_breaches'])}): {path}")
+        if stop_event.wait(interval):
+            return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a portfolio's drift from its targets and write alerts to an outbox")
+    parser.add_argument("holdings", nargs="+", help="Holdings files (CSV/JSON) of the account to watch")
+    parser.add_argument("--account", help="Account name used in alerts (default: first file's name)")
+    parser.add_argument("--targets", default=ASSET_ALLOCATION_PATH, help="Target model in asset_allocation.json format")
+    parser.add_argument("--outbox", default=OUTBOX_DIR)
+    parser.add_argument("--interval", type=float, default=CHECK_INTERVAL, help="Seconds between drift checks")
+    parser.add_argument("--price-interval", type=float, default=PRICE_INTERVAL, help="Seconds between quote requests")
+    parser.add_argument("--absolute-band", type=float, default=ABSOLUTE_BAND_PCT, help="Band in percentage points")
+    parser.add_argument("--relative-band", type=float, default=RELATIVE_BAND, help="Band as a fraction of the target")
+    parser.add_argument("--realert-hours", type=float, default=REALERT_SECONDS / 3600)
+    parser.add_argument("--once", action="store_true", help="Fetch prices, check once and exit (e.g. from cron)")
+    args = parser.parse_args()
+
+    account = args.account or os.path.splitext(os.path.basename(args.holdings[0]))[0]
+    try:
+        holdings = ingest_holdings(args.holdings)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    monitor = DriftMonitor(account, holdings, load_target_ratios(args.targets),
+                           args.absolute_band, args.relative_band, args.realert_hours * 3600,
+                           state_file(args.outbox, account))
+    price_table = PriceTable()
+    symbols = monitor.held_symbols()
+    if not symbols:
+        print(f"Error: {account} holds none of the target symbols, so there is no drift to watch")
+        sys.exit(1)
+
+    if args.once:
+        price_table.update(fetch_batch_quotes(symbols))
+        alert = monitor.check(price_table)
+        print(f"Alert written: {write_alert(alert, args.outbox)}" if alert else "No new breaches to report")
+        sys.exit(0)
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    refresher = BackgroundPriceRefresher(symbols, price_table, args.price_interval)
+    refresher.start()
+    print(f"Watching {account}: {len(symbols)} target holdings ({monitor.untracked_holdings} others ignored) against {int(np.count_nonzero(monitor.targets))} targets "
+          f"every {args.interval:g}s (alerts: {args.outbox})")
+    try:
+        run_monitor(monitor, price_table, stop_event, args.interval, args.outbox)
+    except KeyboardInterrupt:
+        pass
+    refresher.stop()
+    print("Drift monitor stopped")
@@ -0,0 +1,73 @@
+import numpy as np
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.symbol_registry import UNKNOWN_ID, SymbolRegistry
+from update_asset_allocation.fund_stock_matrix import BREAKDOWN_DIR, MATRIX_CACHE_PATH, FundStockMatrix
+
+HOLDINGS_FILE_PATH = 'data/portfolio_data/updated_portfolio.json'
+
+
+def load_fund_values(holdings_file_path=HOLDINGS_FILE_PATH):
+    # Current ₹ value held in each fund, keyed by SchemeID (one GROUP BY in the portfolio store)
+    with PortfolioStore() as store:
+        store.load_holdings_json(holdings_file_path)
+        return store.fund_values()
+
+
+class LookThroughSolver:
+    """
+    Converts total look-through exposure targets into direct-stock target ratios.
+
+    The sparse fund→stock matrix is loaded once; each solve is a single matrix-vector product.
+    """
+
+    def __init__(self, breakdown_dir=BREAKDOWN_DIR, cache_path=MATRIX_CACHE_PATH, registry=None):
+        self.registry = registry or SymbolRegistry.load()
+        matrix = FundStockMatrix.load(self.registry, breakdown_dir, cache_path)
+        self.scheme_ids, self.symbol_ids, self.weights = matrix.scheme_ids, matrix.symbol_ids, matrix.weights
+        # Registry ID -> matrix row, as an array so fund values can be scattered in one step
+        self.row_of_scheme = np.full(len(self.registry.schemes), UNKNOWN_ID, dtype=np.int32)
+        self.row_of_scheme[self.scheme_ids] = np.arange(len(self.scheme_ids), dtype=np.int32)
+        self.symbols = self.registry.symbols_for(self.symbol_ids)
+
+    def fund_exposure(self, fund_values):
+        # ₹ exposure to every stock provided by the held funds
+        ids = self.registry.scheme_ids(fund_values.keys())
+        rows = np.where(ids >= 0, self.row_of_scheme[np.maximum(ids, 0)], UNKNOWN_ID) if len(ids) else ids
+        for scheme_code, row in zip(fund_values, rows.tolist()):
+            if row == UNKNOWN_ID:
+                print(f"Warning: No breakdown found for SchemeID {scheme_code}; its exposure is ignored")
+        values = np.zeros(len(self.scheme_ids))
+        known = rows >= 0
+        np.add.at(values, rows[known], np.fromiter(fund_values.values(), dtype=float, count=len(fund_values))[known])
+        # Stocks without an NSE symbol (symbol None) can't be targets, so they're left out
+        return {symbol: value for symbol, value in zip(self.symbols, (self.weights.T @ values).tolist()) if symbol is not None}
+
+    def direct_targets(self, total_target_percent, fund_values, direct_value, extra_funds=0):
+        """
+        Args:
+            total_target_percent: Mapping of symbol to desired total exposure (% of the whole portfolio).
+            fund_values: Mapping of SchemeID to ₹ held in that fund.
+            direct_value: ₹ currently held in direct stocks.
+            extra_funds: Fresh cash to be invested in direct stocks.
+
+        Returns:
+            A tuple (direct_target_ratios, breakdown_rows) where direct_target_ratios can be passed
+            straight to calculate_rebalancing.
+        """
+        exposure = self.fund_exposure(fund_values)
+        total_value = sum(fund_values.values()) + direct_value + extra_funds
+
+        direct_target_ratios = {}
+        breakdown_rows = []
+        for symbol, target_percent in total_target_percent.items():
+            target_value = target_percent / 100 * total_value
+            from_funds = exposure.get(symbol, 0.0)
+            direct_target = max(target_value - from_funds, 0.0)
+            direct_target_ratios[symbol] = direct_target
+            breakdown_rows.append({
+                "Stock Symbol": symbol,
+                "Target Total Weight (%)": target_percent,
+                "MF Holding Weight (%)": round(from_funds / total_value * 100, 4) if total_value > 0 else 0,
+                "Direct Target Weight (%)": round(direct_target / total_value * 100, 4) if total_value > 0 else 0,
+            })
+        return direct_target_ratios, breakdown_rows
@@ -0,0 +1,203 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.reference_bundle import reference
+
+EXCHANGE = "NSE"
+PRODUCT = "CNC"  # delivery
+# Child orders are kept under this value so a large parent doesn't hit the book in one piece
+MAX_CHILD_VALUE = 5_00_000
+# Kite basket-style columns, so the file can be uploaded to the broker as is
+ORDER_FIELDS = ["order_id", "parent_id", "tradingsymbol", "exchange", "transaction_type", "order_type",
+                "quantity", "price", "product", "tag"]
+BOOK_FIELDS = ["Symbol", "Action", "Net Shares", "Buy Shares", "Sell Shares", "Price", "Net Value", "Accounts"]
+
+# NSE market lots; symbols not listed trade in single shares
+def load_market_lots():
+    try:
+        return reference('market_lots')
+    except FileNotFoundError:
+        print("Warning: EQUITY_L.csv not found. Assuming a market lot of 1 for every symbol.")
+        return {}
+
+
+class OrderBook:
+    """
+    Buys and sells from any number of rebalancing plans, netted per symbol.
+
+    Plans are folded in one at a time (see add_plan), so the book holds one entry per symbol no
+    matter how many accounts feed it.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def add_plan(self, account, actions):
+        # actions: the per-stock dicts returned by plan_rebalancing (Instrument, Action, Shares, Stock Price)
+        for action in actions:
+            entry = self.entries.setdefault(action["Instrument"], {"Buy": 0, "Sell": 0, "Price": 0.0, "Accounts": set()})
+            entry[action["Action"]] += int(action["Shares"])
+            entry["Price"] = float(action["Stock Price"]) or entry["Price"]
+            entry["Accounts"].add(account)
+
+    def net(self):
+        # (symbol, side, shares, price) for every symbol with a non-zero net; sells first so their
+        # proceeds are available for the buys
+        netted = []
+        for symbol, entry in self.entries.items():
+            shares = entry["Buy"] - entry["Sell"]
+            if shares:
+                netted.append((symbol, "Buy" if shares > 0 else "Sell", abs(shares), entry["Price"]))
+        return sorted(netted, key=lambda order: (order[1] != "Sell", order[0]))
+
+    def rows(self):
+        # Summary of the netting, one row per symbol (BOOK_FIELDS)
+        rows = []
+        for symbol, entry in sorted(self.entries.items()):
+            net_shares = entry["Buy"] - entry["Sell"]
+            rows.append({
+                "Symbol": symbol,
+                "Action": "Buy" if net_shares > 0 else "Sell" if net_shares < 0 else "None",
+                "Net Shares": abs(net_shares),
+                "Buy Shares": entry["Buy"],
+                "Sell Shares": entry["Sell"],
+                "Price": entry["Price"],
+                "Net Value": round(abs(net_shares) * entry["Price"], 2),
+                "Accounts": len(entry["Accounts"]),
+            })
+        return rows
+
+
+def read_order_files(paths):
+    # Streams (account, actions) from per-account order CSVs, e.g. batch_rebalancer's orders/ folder
+    for path in paths:
+        with open(path, newline='') as f:
+            actions = [
+                {"Instrument": row["Instrument"], "Action": row["Action"], "Shares": int(float(row["Shares"])),
+                 "Stock Price": float(row["Stock Price"] or 0)}
+                for row in csv.DictReader(f)
+            ]
+        yield os.path.splitext(os.path.basename(path))[0], actions
+
+def slice_order(quantity, price, lot=1, max_child_value=MAX_CHILD_VALUE, max_child_qty=None):
+    """
+    Splits a parent order into child quantities of whole lots, each worth at most max_child_value
+    and at most max_child_qty shares (a single lot is always allowed).
+
+    Yields:
+        Child quantities in shares; they add up to quantity rounded down to whole lots.
+    """
+    lots = quantity // lot
+    child_lots = lots
+    if max_child_value and price > 0:
+        child_lots = min(child_lots, math.floor(max_child_value / (price * lot)))
+    if max_child_qty:
+        child_lots = min(child_lots, max_child_qty // lot)
+    child_lots = max(1, child_lots)
+    while lots > 0:
+        take = min(child_lots, lots)
+        yield take * lot
+        lots -= take
+
+def iter_child_orders(book, market_lots=None, max_child_value=MAX_CHILD_VALUE, max_child_qty=None,
+                      order_type="MARKET", tag=None, odd_lots=None):
+    """
+    Yields exchange-ready child orders (ORDER_FIELDS) for the book's net positions.
+
+    Net quantities are rounded down to whole market lots; the shares left over are recorded in
+    odd_lots ({symbol: shares}) when a dict is passed.
+    """
+    market_lots = load_market_lots() if market_lots is None else market_lots
+    tag = tag or datetime.now().strftime("rebal%Y%m%d%H%M")
+    for symbol, side, shares, price in book.net():
+        lot = market_lots.get(symbol, 1)
+        if shares % lot and odd_lots is not None:
+            odd_lots[symbol] = shares % lot
+        parent_id = f"{tag}-{symbol}"
+        for child, quantity in enumerate(slice_order(shares - shares % lot, price, lot, max_child_value, max_child_qty), 1):
+            yield {
+                "order_id": f"{parent_id}-{child}",
+                "parent_id": parent_id,
+                "tradingsymbol": symbol,
+                "exchange": EXCHANGE,
+                "transaction_type": side.upper(),
+                "order_type": order_type,
+                "quantity": quantity,
+                "price": round(price, 2) if order_type == "LIMIT" else 0,
+                "product": PRODUCT,
+                "tag": tag,
+            }
+
+def write_orders(target, orders, file_format=None):
+    """
+    Streams orders to a CSV, JSON or JSON-lines file one at a time, so even a huge book is never
+    held in memory.
+
+    Args:
+        target: A path, or an open text file (then file_format is required).
+        orders: Any iterable of order dicts, e.g. iter_child_orders(...).
+
+    Returns:
+        The number of orders written.
+    """
+    if isinstance(target, str):
+        file_format = file_format or os.path.splitext(target)[1].lstrip('.').lower()
+        with open(target, 'w', newline='') as f:
+            return write_orders(f, orders, file_format)
+    count = 0
+    if file_format == "csv":
+        writer = csv.DictWriter(target, fieldnames=ORDER_FIELDS)
+        writer.writeheader()
+        for order in orders:
+            writer.writerow(order)
+            count += 1
+    elif file_format == "jsonl":
+        for order in orders:
+            target.write(json.dumps(order) + "\n")
+            count += 1
+    elif file_format == "json":
+        target.write("[")
+        for order in orders:
+            target.write(("," if count else "") + "\n    " + json.dumps(order))
+            count += 1
+        target.write("\n]\n" if count else "]\n")
+    else:
+        raise ValueError(f"Unsupported order file format: {file_format}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Net per-account order files into one exchange-ready order file")
+    parser.add_argument("order_files", nargs="+", help="Per-account order CSVs, or folders of them (e.g. data/batch_orders/orders)")
+    parser.add_argument("--output", default="data/batch_orders/exchange_orders.csv", help="Output file (.csv, .json or .jsonl)")
+    parser.add_argument("--max-child-value", type=float, default=MAX_CHILD_VALUE, help="Largest child order in ₹ (0 for no limit)")
+    parser.add_argument("--max-child-qty", type=int, default=None, help="Largest child order in shares")
+    parser.add_argument("--order-type", choices=["MARKET", "LIMIT"], default="MARKET")
+    parser.add_argument("--tag", help="Order tag / ID prefix (default: rebal<timestamp>)")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.order_files:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.csv'))
+        else:
+            paths.append(path)
+    book = OrderBook()
+    for account, actions in read_order_files(paths):
+        book.add_plan(account, actions)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    odd_lots = {}
+    count = write_orders(args.output, iter_child_orders(
+        book, max_child_value=args.max_child_value, max_child_qty=args.max_child_qty,
+        order_type=args.order_type, tag=args.tag, odd_lots=odd_lots
+    ))
+    print(f"Netted {len(paths)} order files into {len(book.net())} parent orders, {count} child orders: {args.output}")
+    if odd_lots:
+        print(f"Skipped odd lots (less than one market lot): {', '.join(f'{s} ({q})' for s, q in sorted(odd_lots.items()))}")
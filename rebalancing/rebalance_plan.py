@@ -0,0 +1,157 @@
+import math
+import pandas as pd
+from rebalancing.cost_aware_optimizer import DEFAULT_DRIFT_PENALTY, cost_aware_allocation, greedy_allocation
+from rebalancing.sector_caps import apply_sector_caps
+
+# Calculate ideal allocation percentages
+def calculate_ideal_allocations(target_ratios):
+    total_ratio = sum(target_ratios.values())
+    return {stock: round(ratio / total_ratio * 100, 2) if total_ratio > 0 else 0 for stock, ratio in target_ratios.items()}
+
+def target_ratios_from_allocation(ratios_list):
+    # {symbol: weight} from asset_allocation.json records; rows without a symbol or weight are skipped
+    return {
+        item["Stock Symbol"]: float(item["Total Weight (%)"]) for item in ratios_list
+        if item.get("Stock Symbol") and item.get("Total Weight (%)") is not None
+    }
+
+def plan_rebalancing(holdings_df, target_ratios, latest_prices, extra_funds=0,
+                     optimizer="greedy", cost_model=None, drift_penalty=DEFAULT_DRIFT_PENALTY,
+                     stock_sectors=None, sector_caps=None, display_names=None):
+    """
+    Rebalancing plan for one portfolio at the given prices. Pure: no network access or UI, so the
+    Streamlit app and the batch rebalancer share it.
+
+    Args:
+        holdings_df: DataFrame with Instrument, Qty, LTP and Cur_val columns (see holdings_ingest.py).
+        target_ratios: {symbol: target weight}.
+        latest_prices: {symbol: price}; symbols without a price aren't bought.
+        display_names: Optional {symbol: name} for the tentative holdings table.
+
+    Returns:
+        (rebalancing_actions, funds_display, updated_holdings_df, tentative_holdings, ideal_allocations_percent)
+
+    Raises:
+        ValueError: the sector caps can't be met by any allocation.
+    """
+    display_names = display_names or {}
+    if not target_ratios:
+        return [], {"status": "No Action", "amount": 0, "message": "No target ratios provided"}, holdings_df, [], {}
+    if sector_caps:
+        target_ratios = apply_sector_caps(target_ratios, stock_sectors or {}, sector_caps)
+
+    target_stocks = list(target_ratios.keys())
+
+    # Include all target stocks
+    if not holdings_df.empty:
+        existing_holdings = holdings_df[holdings_df['Instrument'].isin(target_stocks)].copy()
+    else:
+        existing_holdings = pd.DataFrame()
+    existing_stocks = set(existing_holdings['Instrument'].tolist()) if not existing_holdings.empty else set()
+    missing_stocks = [stock for stock in target_stocks if stock not in existing_stocks]
+
+    new_stock_entries = pd.DataFrame([
+        {"Instrument": stock, "Qty": 0, "LTP": latest_prices.get(stock, 0), "Cur_val": 0}
+        for stock in missing_stocks
+    ])
+
+    filtered_holdings = pd.concat([existing_holdings, new_stock_entries], ignore_index=True)
+
+    # Update current value with latest prices
+    filtered_holdings['Current Value'] = filtered_holdings.apply(
+        lambda row: row['Qty'] * latest_prices.get(row['Instrument'], row['LTP']) if row['Qty'] > 0 else row['Cur_val'],
+        axis=1)
+    sell_proceeds = filtered_holdings['Current Value'].sum()
+    total_available_funds = sell_proceeds + extra_funds
+
+    total_ratio = sum(target_ratios.values())
+    if total_ratio == 0:
+        return [], {"status": "No Action", "amount": 0, "message": "Sum of target ratios is zero"}, filtered_holdings, [], {}
+
+    ideal_allocations_percent = calculate_ideal_allocations(target_ratios)
+
+    original_quantities = dict(zip(filtered_holdings['Instrument'], filtered_holdings['Qty']))
+    total_trade_cost = None
+    if optimizer == "cost_aware":
+        updated_quantities, available_funds, total_trade_cost = cost_aware_allocation(
+            target_ratios, latest_prices, original_quantities, extra_funds, cost_model, drift_penalty,
+            total_available_funds=total_available_funds, stock_sectors=stock_sectors, sector_caps=sector_caps
+        )
+    else:
+        updated_quantities, available_funds = greedy_allocation(
+            target_ratios, latest_prices, total_available_funds, stock_sectors, sector_caps
+        )
+
+    rebalancing_actions = []
+    for stock in target_stocks:
+        original_qty = original_quantities.get(stock, 0)
+        updated_qty = updated_quantities[stock]
+        stock_price = latest_prices.get(stock, 0)
+        if updated_qty > original_qty:
+            shares = math.floor(updated_qty - original_qty) # floor for buy
+            if shares > 0: # only add action if shares > 0
+                rebalancing_actions.append({
+                    "Instrument": stock,
+                    "Original Qty": original_qty,
+                    "Action": "Buy",
+                    "Shares": shares,
+                    "Value Bought/Sold": shares * stock_price,
+                    "Stock Price": stock_price,
+                    "New Qty": updated_qty
+                })
+        elif updated_qty < original_qty:
+            shares = math.floor(original_qty - updated_qty) # floor for sell
+            if shares > 0: # only add action if shares > 0
+                rebalancing_actions.append({
+                    "Instrument": stock,
+                    "Original Qty": original_qty,
+                    "Action": "Sell",
+                    "Shares": shares,
+                    "Value Bought/Sold": shares * stock_price,
+                    "Stock Price": stock_price,
+                    "New Qty": updated_qty
+                })
+
+    updated_holdings_df = pd.DataFrame([
+        {"Instrument": stock, "Qty": qty, "LTP": latest_prices.get(stock, 0), "Current Value": qty * latest_prices.get(stock, 0)}
+        for stock, qty in updated_quantities.items()
+    ])
+    new_portfolio_value = updated_holdings_df['Current Value'].sum()
+    updated_holdings_df['Allocation %'] = (
+        updated_holdings_df['Current Value'] / new_portfolio_value * 100
+    ).round(2) if new_portfolio_value > 0 else 0
+
+    non_target_holdings = holdings_df[~holdings_df['Instrument'].isin(target_stocks)].copy() if not holdings_df.empty else pd.DataFrame()
+    if not non_target_holdings.empty:
+        non_target_holdings['Current Value'] = non_target_holdings['Qty'] * non_target_holdings['Instrument'].map(latest_prices)
+        non_target_holdings['Allocation %'] = (
+            non_target_holdings['Current Value'] / (new_portfolio_value + non_target_holdings['Current Value'].sum()) * 100
+        ).round(2) if (new_portfolio_value + non_target_holdings['Current Value'].sum()) > 0 else 0
+        updated_holdings_df = pd.concat([updated_holdings_df, non_target_holdings], ignore_index=True)
+
+    funds_display = {
+        "status": "Excess Funds",
+        "amount": available_funds,
+        "message": f"₹{available_funds:.2f} remains unused after rebalancing."
+    }
+    if total_trade_cost is not None:
+        funds_display["message"] += f" Estimated trading costs: ₹{total_trade_cost:.2f}."
+    tentative_holdings = [
+        {
+            "Stock": display_names.get(row['Instrument'], row['Instrument']),
+            "Qty": row['Qty'],
+            "LTP": row['LTP'],
+            "Current Value (Qty × LTP)": row['Current Value'],
+            "Ideal Allocation %": ideal_allocations_percent.get(row['Instrument'], 0),
+            "Actual Allocation %": row['Allocation %']
+        }
+        for _, row in updated_holdings_df.iterrows()
+    ]
+
+    return (
+        sorted(rebalancing_actions, key=lambda x: x["Instrument"]),
+        funds_display,
+        updated_holdings_df,
+        sorted(tentative_holdings, key=lambda x: x["Stock"]),
+        ideal_allocations_percent
+    )
@@ -0,0 +1,65 @@
+# Sector of stocks the taxonomy couldn't classify; sector_taxonomy imports it from here so the
+# optimizers don't pull in the taxonomy's dependencies
+UNCLASSIFIED = 'N/A'
+
+
+def sector_totals(weights, stock_sectors):
+    totals = {}
+    for stock, weight in weights.items():
+        sector = stock_sectors.get(stock, UNCLASSIFIED)
+        totals[sector] = totals.get(sector, 0) + weight
+    return totals
+
+
+def apply_sector_caps(target_ratios, stock_sectors, sector_caps):
+    """
+    Caps the combined target weight of each sector.
+
+    Weight cut from a sector over its cap is handed pro rata to stocks in sectors that still have
+    room, repeating until every cap holds. Each round pins at least one sector, so this takes at
+    most len(sector_caps) rounds.
+
+    Args:
+        target_ratios: {symbol: ratio}, in any scale.
+        stock_sectors: {symbol: normalized sector}; symbols without one count as 'N/A'.
+        sector_caps: {sector: max % of the rebalanced portfolio}.
+
+    Returns:
+        {symbol: weight %} summing to 100 with every capped sector at or below its cap.
+
+    Raises:
+        ValueError: If the caps leave no uncapped stock to absorb the excess weight.
+    """
+    total_ratio = sum(target_ratios.values())
+    if not sector_caps or total_ratio <= 0:
+        return dict(target_ratios)
+
+    weights = {stock: ratio / total_ratio * 100 for stock, ratio in target_ratios.items()}
+    pinned = set()
+    while True:
+        totals = sector_totals(weights, stock_sectors)
+        over = [sector for sector, cap in sector_caps.items() if totals.get(sector, 0) > cap + 1e-9]
+        if not over:
+            return weights
+        for sector in over:
+            scale = sector_caps[sector] / totals[sector]
+            for stock in weights:
+                if stock_sectors.get(stock, UNCLASSIFIED) == sector:
+                    weights[stock] *= scale
+            pinned.add(sector)
+
+        free_stocks = [stock for stock in weights if stock_sectors.get(stock, UNCLASSIFIED) not in pinned]
+        free_weight = sum(weights[stock] for stock in free_stocks)
+        excess = 100 - sum(weights.values())
+        if free_weight <= 0:
+            raise ValueError(f"Sector caps leave {excess:.2f}% of the portfolio unallocated; raise a cap or add stocks from other sectors")
+        for stock in free_stocks:
+            weights[stock] *= (free_weight + excess) / free_weight
+
+
+def within_sector_cap(stock, trade_value, sector_values, total_value, stock_sectors, sector_caps):
+    # Whether buying trade_value more of stock keeps its sector under the cap
+    sector = stock_sectors.get(stock, UNCLASSIFIED)
+    if sector not in sector_caps or total_value <= 0:
+        return True
+    return (sector_values.get(sector, 0) + trade_value) / total_value * 100 <= sector_caps[sector] + 1e-9
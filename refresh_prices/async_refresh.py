@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_table import HoldingsTable
+from portfolio_common.portfolio_store import PortfolioStore
+from refresh_prices import update_mf_prices, update_stock_prices
+
+NAV_URL = 'https://api.mfapi.in/mf/{scheme_id}/latest'
+QUOTE_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/{symbol}.NS'
+MAX_CONCURRENCY = 16
+REQUEST_TIMEOUT = 15
+MAX_RETRIES = 2
+USER_AGENT = 'Mozilla/5.0 (portfolio-refresh)'
+
+
+class AiohttpTransport:
+    """One pooled aiohttp session shared by every request; the semaphore caps requests in flight."""
+
+    def __init__(self, concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': USER_AGENT},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def get_json(self, url, params=None):
+        async with self.semaphore:
+            async with self.session.get(url, params=params) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+
+class MockTransport:
+    """
+    Offline stand-in for AiohttpTransport: answers the NAV and quote endpoints with deterministic
+    fake data after a random delay, so the fan-out can be exercised and timed without a network.
+    """
+
+    def __init__(self, concurrency=MAX_CONCURRENCY, latency=(0.05, 0.3), seed=0):
+        self.concurrency = concurrency
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get_json(self, url, params=None):
+        async with self.semaphore:
+            await asyncio.sleep(self.rng.uniform(*self.latency))
+        key = url.rstrip('/').split('/')[-2 if url.endswith('/latest') else -1]
+        price = 10 + random.Random(key).uniform(0, 990)  # same key, same price on every run
+        if url.startswith(NAV_URL.split('{')[0]):
+            return {"status": "SUCCESS", "meta": {"scheme_name": f"Mock Scheme {key}"},
+                    "data": [{"date": time.strftime("%d-%m-%Y"), "nav": f"{price:.4f}"}]}
+        return {"chart": {"result": [{"meta": {"regularMarketPrice": round(price, 2)}}], "error": None}}
+
+
+async def fetch_with_retry(transport, url, params=None, max_retries=MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        try:
+            return await transport.get_json(url, params)
+        except Exception:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(2 ** attempt)  # back off without holding a semaphore slot
+
+
+async def fetch_nav(transport, scheme_id):
+    # (nav, scheme_name) from mfapi.in, in the shape update_mf_values expects
+    data = await fetch_with_retry(transport, NAV_URL.format(scheme_id=scheme_id))
+    scheme_name = data.get("meta", {}).get("scheme_name", "Unknown")
+    latest = data.get("data") or []
+    return (float(latest[0]["nav"]) if latest and latest[0].get("nav") else None), scheme_name
+
+
+async def fetch_quote(transport, symbol):
+    data = await fetch_with_retry(transport, QUOTE_URL.format(symbol=symbol), params={"range": "1d", "interval": "1d"})
+    result = (data.get("chart", {}).get("result") or [None])[0]
+    price = result.get("meta", {}).get("regularMarketPrice") if result else None
+    return round(float(price), 2) if price is not None else None
+
+
+async def fan_out(fetch, transport, keys):
+    # Every request starts at once (the transport's semaphore limits how many are in flight);
+    # failures come back as exceptions so one bad key doesn't cancel the rest
+    results = await asyncio.gather(*(fetch(transport, key) for key in keys), return_exceptions=True)
+    return dict(zip(keys, results))
+
+
+async def refresh_mf(transport, portfolio_path=update_mf_prices.PORTFOLIO_FILE_PATH):
+    portfolio = update_mf_prices.load_portfolio(portfolio_path)
+    if len(portfolio) == 0:
+        return False
+    original_records = portfolio.to_records()
+    scheme_ids = update_mf_prices.fund_scheme_ids(portfolio)
+    results = await fan_out(fetch_nav, transport, scheme_ids)
+    navs = {}
+    for scheme_id, result in results.items():
+        if isinstance(result, Exception):
+            print(f"Error fetching NAV for SchemeID {scheme_id}: {str(result)}")
+        else:
+            navs[scheme_id] = result
+    updated_portfolio = update_mf_prices.update_mf_values(portfolio, navs)
+    return update_mf_prices.save_if_updated(portfolio, updated_portfolio, original_records, portfolio_path)
+
+
+async def refresh_stocks(transport, breakdown_path=update_stock_prices.STOCK_BREAKDOWN_PATH):
+    if not os.path.exists(breakdown_path):
+        print(f"Error: {breakdown_path} not found!")
+        return False
+    with PortfolioStore() as store:
+        data = HoldingsTable.from_records(store.load_lookthrough_json(breakdown_path))
+        symbols = update_stock_prices.quotable_symbols(data)
+        results = await fan_out(fetch_quote, transport, symbols)
+        prices = {symbol: price for symbol, price in results.items() if isinstance(price, float)}
+        update_stock_prices.report_missing([symbol for symbol in symbols if symbol not in prices])
+        return update_stock_prices.save_revalued(data, prices, breakdown_path, store)
+
+
+async def refresh_all(transport, mf=True, stocks=True):
+    # Both refreshers share one transport and run concurrently in the same event loop
+    async with transport:
+        jobs = ([refresh_mf(transport)] if mf else []) + ([refresh_stocks(transport)] if stocks else [])
+        return await asyncio.gather(*jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh mutual fund NAVs and stock prices concurrently")
+    parser.add_argument("--mock", action="store_true", help="Use the offline mock transport instead of the network")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--mf-only", action="store_true")
+    parser.add_argument("--stocks-only", action="store_true")
+    args = parser.parse_args()
+
+    transport = MockTransport(args.concurrency) if args.mock else AiohttpTransport(args.concurrency)
+    start = time.perf_counter()
+    results = asyncio.run(refresh_all(transport, mf=not args.stocks_only, stocks=not args.mf_only))
+    print(f"Refresh finished in {time.perf_counter() - start:.2f}s ({sum(results)} files updated)")
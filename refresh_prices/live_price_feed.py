@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+import numpy as np
+
+
+# Fetch the latest price for many symbols with a single batched yfinance request
+def fetch_batch_quotes(symbols):
+    if not symbols:
+        return {}
+    import yfinance as yf  # imported on first fetch, not at start-up
+
+    tickers = [f"{symbol}.NS" for symbol in symbols]
+    data = yf.download(tickers, period="1d", interval="1m", progress=False, group_by="column")
+    if data.empty:
+        return {}
+    closes = data['Close']
+    quotes = {}
+    for symbol, ticker in zip(symbols, tickers):
+        try:
+            series = closes[ticker] if ticker in closes else closes
+            series = series.dropna()
+            if not series.empty:
+                quotes[symbol] = float(series.iloc[-1])
+        except Exception as e:
+            print(f"Error reading quote for {symbol}: {e}")
+    return quotes
+
+
+class PriceTable:
+    """Shared in-memory price table; every change bumps a version so readers can pull deltas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = {}
+        self._versions = {}
+        self.version = 0
+        self.last_updated = None
+        self.last_read = time.time()  # lets a refresher notice that nobody reads the table any more
+
+    def update(self, quotes):
+        changed = []
+        with self._lock:
+            for symbol, price in quotes.items():
+                if price is None or math.isnan(price) or self._prices.get(symbol) == price:
+                    continue
+                self.version += 1
+                self._prices[symbol] = price
+                self._versions[symbol] = self.version
+                changed.append(symbol)
+            self.last_updated = time.time()
+        return changed
+
+    def snapshot(self):
+        with self._lock:
+            self.last_read = time.time()
+            return dict(self._prices), self.version
+
+    def changes_since(self, version):
+        # Prices that changed after `version`, plus the version to pass next time
+        with self._lock:
+            self.last_read = time.time()
+            changed = {symbol: self._prices[symbol] for symbol, v in self._versions.items() if v > version}
+            return changed, self.version
+
+
+class BackgroundPriceRefresher(threading.Thread):
+    """
+    Polls a batched quote source on an interval and pushes the results into a PriceTable.
+
+    With max_idle set, it stops by itself once the table hasn't been read for that many seconds
+    (e.g. the browser session that started it was closed).
+    """
+
+    def __init__(self, symbols, price_table, interval=30, quote_source=fetch_batch_quotes, max_idle=None):
+        super().__init__(daemon=True)
+        self.symbols = list(symbols)
+        self.price_table = price_table
+        self.interval = interval
+        self.quote_source = quote_source
+        self.max_idle = max_idle
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.max_idle and time.time() - self.price_table.last_read > self.max_idle:
+                break
+            try:
+                self.price_table.update(self.quote_source(self.symbols))
+            except Exception as e:
+                print(f"Error refreshing live prices: {e}")
+            self._stop_event.wait(self.interval)  # sleeps without spinning and wakes up on stop()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class IncrementalAllocation:
+    """
+    Array-backed holdings valuation that only touches rows whose price changed.
+
+    Rows uploaded with a value but no quantity (e.g. Symbol/Value JSON) get their quantity from
+    the first price they're quoted at, and are revalued like any other row from then on.
+    """
+
+    def __init__(self, instruments, quantities, values, prices=None):
+        self.instruments = list(instruments)
+        # An instrument may appear on several rows (e.g. the same symbol held via two names)
+        self.row_index = {}
+        for i, instrument in enumerate(self.instruments):
+            self.row_index.setdefault(instrument, []).append(i)
+        self.quantities = np.asarray(quantities, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        if prices is None:
+            self.prices = np.where(self.quantities > 0, self.values / np.where(self.quantities > 0, self.quantities, 1), np.nan)
+        else:
+            self.prices = np.array([np.nan if price is None else price for price in prices], dtype=float)
+        self.total_value = float(self.values.sum())
+        self.version = 0
+
+    def apply(self, changed_prices):
+        # Returns the row indexes that were revalued
+        rows = np.array([row for symbol in changed_prices for row in self.row_index.get(symbol, ())], dtype=int)
+        if rows.size:
+            new_prices = np.array([changed_prices[self.instruments[row]] for row in rows], dtype=float)
+            unset = (self.quantities[rows] <= 0) & (self.values[rows] > 0) & (new_prices > 0)
+            self.quantities[rows[unset]] = self.values[rows[unset]] / new_prices[unset]
+            held = self.quantities[rows] > 0
+            rows, new_prices = rows[held], new_prices[held]
+        if rows.size:
+            new_values = self.quantities[rows] * new_prices
+            self.total_value += float((new_values - self.values[rows]).sum())
+            self.values[rows] = new_values
+            self.prices[rows] = new_prices
+        return rows
+
+    def sync(self, price_table):
+        changed, self.version = price_table.changes_since(self.version)
+        return self.apply(changed)
+
+    def allocation_percent(self):
+        if self.total_value <= 0:
+            return np.zeros_like(self.values)
+        return self.values / self.total_value * 100
@@ -1,120 +1,217 @@
-from mftool import Mftool
+import argparse
 import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_table import HoldingsTable
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.reference_bundle import SCHEMA_LINKS_PATH, reference
+from portfolio_common.run_journal import RunJournal
+from portfolio_common.scheme_resolver import SchemeResolver
+from portfolio_common.symbol_registry import scheme_key
 
 # List of known stocks to exclude from MF updates
 stocks = {"CARTRADE", "FSC", "OLAELECTRIC"}
 
-# Initialize Mftool
-mf = Mftool()
+PORTFOLIO_FILE_PATH = 'data/portfolio_data/updated_portfolio.json'
+
+# Created on first use, so importing this module (e.g. from async_refresh.py) has no side effects
+mf = None
+scheme_mapping = None
+# Securities missing from the hand-maintained mapping are resolved against all_schemes.json
+scheme_resolver = None
 
 # Load scheme mapping from JSON file
-try:
-    with open('data/mapping_data/schema_links_mf.json', 'r') as f:
-        scheme_mapping = json.load(f)
-except FileNotFoundError:
-    print("Error: schema_mapping.json file not found!")
-    scheme_mapping = {}
-except json.JSONDecodeError:
-    print("Error: Invalid JSON format in schema_mapping.json!")
-    scheme_mapping = {}
-
-# Load portfolio from the previous output file
-try:
-    with open('data/portfolio_data/updated_portfolio.json', 'r') as f:
-        portfolio = json.load(f)
-except FileNotFoundError:
-    print("Error: updated_portfolio.json file not found!")
-    portfolio = {"holdings": []}
-except json.JSONDecodeError:
-    print("Error: Invalid JSON format in updated_portfolio.json!")
-    portfolio = {"holdings": []}
-
-def update_mf_values(portfolio_data):
-    combined_holdings = {}
-    temp_holdings = []
-    all_nav_available = True
-    
+def load_scheme_mapping(path=SCHEMA_LINKS_PATH):
+    try:
+        if path == SCHEMA_LINKS_PATH:
+            return reference('scheme_links')
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("Error: schema_mapping.json file not found!")
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON format in schema_mapping.json!")
+    return {}
+
+def get_scheme_id(security):
+    global scheme_mapping, scheme_resolver
+    if scheme_mapping is None:
+        scheme_mapping = load_scheme_mapping()
+    if security in scheme_mapping:
+        return scheme_key(scheme_mapping[security])
+    if security in stocks:
+        return "N/A"
+    if scheme_resolver is None:
+        try:
+            scheme_resolver = SchemeResolver()
+        except FileNotFoundError:
+            print("Warning: all_schemes.json not found. Unmapped securities won't be resolved.")
+            scheme_resolver = False
+    scheme_id = scheme_resolver.resolve(security) if scheme_resolver else None
+    if scheme_id:
+        print(f"Resolved {security} to SchemeID {scheme_id}")
+    return scheme_id or "N/A"
+
+# Load portfolio through the store (re-ingesting the JSON file if it was edited by hand)
+def load_portfolio(path=PORTFOLIO_FILE_PATH, store=None):
+    if store is None:
+        with PortfolioStore() as store:
+            return load_portfolio(path, store)
+    try:
+        return HoldingsTable.from_records(store.load_holdings_json(path))
+    except FileNotFoundError:
+        print("Error: updated_portfolio.json file not found!")
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON format in updated_portfolio.json!")
+    return HoldingsTable()
+
+# Distinct scheme IDs of the fund holdings, in portfolio order
+def fund_scheme_ids(portfolio_data):
+    scheme_ids = dict.fromkeys(get_scheme_id(security) for security in portfolio_data.strings("Security"))
+    return [scheme_id for scheme_id in scheme_ids if scheme_id != "N/A"]
+
+# Combine quantities and values for the same SchemeID (direct stocks stay per Security)
+def combine_holdings(portfolio_data):
+    scheme_ids = [get_scheme_id(security) for security in portfolio_data.strings("Security")]
+    portfolio_data.set_column("SchemeID", scheme_ids)
+    portfolio_data.set_column("_GroupKey", [
+        scheme_id if scheme_id != "N/A" else f"N/A:{security}"
+        for scheme_id, security in zip(scheme_ids, portfolio_data.strings("Security"))
+    ])
+    combined_holdings = portfolio_data.group_sum("_GroupKey", ["Qty", "Value"])
+    combined_holdings.drop_column("_GroupKey")
+    portfolio_data.drop_column("_GroupKey")
+    return combined_holdings
+
+# Latest NAV and scheme name from mftool; NAV is None if the quote is missing
+def fetch_nav(scheme_id):
+    global mf
+    if mf is None:
+        from mftool import Mftool  # imported on first fetch, not at start-up
+        mf = Mftool()
+    nav_data = mf.get_scheme_quote(scheme_id)
+    scheme_name = mf.get_scheme_details(scheme_id).get("scheme_name", "Unknown")
+    latest_nav = float(nav_data['nav']) if nav_data and 'nav' in nav_data else None
+    return latest_nav, scheme_name
+
+# Fetch NAVs one by one, checkpointing each in the run journal; a rerun only fetches what failed
+def fetch_navs(scheme_ids, journal, resume=True):
+    pending = journal.start(scheme_ids, resume)
+    for scheme_id in pending:
+        try:
+            latest_nav, scheme_name = fetch_nav(scheme_id)
+            if latest_nav is None:
+                journal.failed(scheme_id, "No NAV data")
+            else:
+                journal.done(scheme_id, [latest_nav, scheme_name])
+        except Exception as e:
+            print(f"Error fetching NAV for SchemeID {scheme_id}: {str(e)}")
+            journal.failed(scheme_id, e)
+    remaining = journal.finish_if_complete(scheme_ids)
+    if remaining:
+        print(f"{len(remaining)} NAVs still missing; rerun to retry just those: {', '.join(sorted(remaining))}")
+    return {scheme_id: tuple(payload) for scheme_id, payload in journal.payloads().items()}
+
+def apply_nav(holding, latest_nav, scheme_name):
+    new_value = latest_nav * holding["Qty"]
+    holding["Value"] = round(new_value, 2)
+    holding["NAV"] = round(latest_nav, 2)
+    holding["SchemeName"] = scheme_name
+    holding["Stale"] = False
+    print(f"Updated {holding['Security']}: Qty = {holding['Qty']:.3f}, NAV = {latest_nav:.2f}, New Value = {new_value:.2f}, SchemeID = {holding['SchemeID']}, SchemeName = {scheme_name}")
+
+def update_mf_values(portfolio_data, navs=None):
+    """
+    Revalues mutual fund holdings at their latest NAV.
+
+    Funds whose NAV couldn't be fetched keep their previous NAV and value and are flagged with
+    "Stale": True, so one failed quote no longer throws away every other update.
+
+    Args:
+        portfolio_data: HoldingsTable of the portfolio.
+        navs: Optional {SchemeID: (nav, scheme_name)} fetched up front (see fetch_navs and
+            async_refresh.py); without it each NAV is fetched in turn with mftool.
+    """
+    if len(portfolio_data) == 0:
+        return portfolio_data
+    stale = []
+
     # First pass: Combine quantities and values for the same SchemeID
-    for holding in portfolio_data["holdings"]:
-        security = holding["Security"]
-        scheme_id = scheme_mapping.get(security, "N/A")
-        
-        if scheme_id in combined_holdings:
-            combined_holdings[scheme_id]["Qty"] += holding["Qty"]
-            combined_holdings[scheme_id]["Value"] += holding["Value"]
-        else:
-            combined_holdings[scheme_id] = holding.copy()
-            combined_holdings[scheme_id]["SchemeID"] = scheme_id
-    
-    # Second pass: Process all holdings and check if we have all NAV data
-    for scheme_id, holding in combined_holdings.items():
+    combined_holdings = combine_holdings(portfolio_data)
+
+    # Second pass: Process all holdings, keeping the last known NAV where a fetch failed
+    for holding in combined_holdings:
         security = holding["Security"]
-        
+        scheme_id = holding["SchemeID"]
+
         # Handle stocks
         if security in stocks:
-            updated_holding = holding.copy()
-            updated_holding["NAV"] = 0.0
-            temp_holdings.append(updated_holding)
+            holding["NAV"] = 0.0
             continue
-            
+
         # Handle mutual funds
         if scheme_id != "N/A":
             try:
-                nav_data = mf.get_scheme_quote(scheme_id)
-                scheme_name = mf.get_scheme_details(scheme_id).get("scheme_name", "Unknown")
-                
-                if nav_data and 'nav' in nav_data:
-                    latest_nav = float(nav_data['nav'])
-                    new_value = latest_nav * holding["Qty"]
-                    updated_holding = holding.copy()
-                    updated_holding["Value"] = round(new_value, 2)
-                    updated_holding["NAV"] = round(latest_nav, 2)
-                    updated_holding["SchemeName"] = scheme_name
-                    temp_holdings.append(updated_holding)
-                    print(f"Updated {security}: Qty = {holding['Qty']:.3f}, NAV = {latest_nav:.2f}, New Value = {new_value:.2f}, SchemeID = {scheme_id}, SchemeName = {scheme_name}")
-                else:
-                    print(f"No NAV data available for {security}")
-                    all_nav_available = False
-                    updated_holding = holding.copy()
-                    updated_holding["NAV"] = 0.0
-                    updated_holding["SchemeName"] = "Unknown"
-                    temp_holdings.append(updated_holding)
+                latest_nav, scheme_name = navs.get(scheme_id, (None, None)) if navs is not None else fetch_nav(scheme_id)
+                if latest_nav is not None:
+                    apply_nav(holding, latest_nav, scheme_name)
+                    continue
+                print(f"No NAV data available for {security}")
             except Exception as e:
                 print(f"Error updating {security}: {str(e)}")
-                all_nav_available = False
-                updated_holding = holding.copy()
-                updated_holding["NAV"] = 0.0
-                updated_holding["SchemeName"] = "Unknown"
-                temp_holdings.append(updated_holding)
+            holding["NAV"] = holding.get("NAV") or 0.0
+            holding["SchemeName"] = holding.get("SchemeName") or "Unknown"
+            holding["Stale"] = True
+            stale.append(security)
         else:
             # Handle N/A cases - these are allowed to proceed
             print(f"No scheme mapping found for {security}")
-            updated_holding = holding.copy()
-            updated_holding["NAV"] = 0.0
-            updated_holding["SchemeName"] = "Unknown"
-            temp_holdings.append(updated_holding)
-    
-    # Only return updated data if all NAVs were successfully retrieved (except N/A cases)
-    if all_nav_available:
-        return {"holdings": temp_holdings}
+            holding["NAV"] = 0.0
+            holding["SchemeName"] = "Unknown"
+
+    if stale:
+        print(f"Warning: {len(stale)} holdings kept their previous NAV and are flagged stale: {', '.join(stale)}")
+    return combined_holdings
+
+# Record fresh NAVs, and save the updated portfolio (store + JSON export) only if it contains new data
+def save_if_updated(portfolio, updated_portfolio, original_records, path=PORTFOLIO_FILE_PATH, store=None):
+    if store is None:
+        with PortfolioStore() as store:
+            return save_if_updated(portfolio, updated_portfolio, original_records, path, store)
+    updated_records = updated_portfolio.to_records()
+    store.put_navs({
+        record["SchemeID"]: record["NAV"] for record in updated_records
+        if record.get("SchemeID", "N/A") != "N/A" and record.get("NAV") and not record.get("Stale")
+    })
+    if updated_portfolio is not portfolio and updated_records != original_records:
+        try:
+            store.put_holdings(updated_records)
+            store.export_holdings_json(path)
+            print("Portfolio successfully updated and saved.")
+            return True
+        except Exception as e:
+            print(f"Error saving updated portfolio: {str(e)}")
     else:
-        print("Warning: Not all NAV data was retrieved successfully. Keeping original portfolio.")
-        return portfolio_data
+        print("Portfolio unchanged; nothing saved.")
+    return False
 
-# Update the portfolio
-updated_portfolio = update_mf_values(portfolio)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Revalue mutual fund holdings at their latest NAV")
+    parser.add_argument("--restart", action="store_true", help="Ignore an unfinished run and fetch every NAV again")
+    args = parser.parse_args()
 
-# Print the updated portfolio
-print("\nUpdated Portfolio:")
-print(json.dumps(updated_portfolio, indent=4))
+    # Update the portfolio
+    portfolio = load_portfolio()
+    original_records = portfolio.to_records()
+    journal = RunJournal("mf_nav")
+    navs = fetch_navs(fund_scheme_ids(portfolio), journal, resume=not args.restart)
+    updated_portfolio = update_mf_values(portfolio, navs)
+    journal.close()
 
-# Save updated portfolio to file only if it contains new data
-if updated_portfolio != portfolio:
-    try:
-        with open('data/portfolio_data/updated_portfolio.json', 'w') as f:
-            json.dump(updated_portfolio, f, indent=4)
-        print("Portfolio successfully updated and saved.")
-    except Exception as e:
-        print(f"Error saving updated portfolio: {str(e)}")
-else:
-    print("Portfolio not updated due to incomplete NAV data.")
\ No newline at end of file
+    # Print the updated portfolio
+    print("\nUpdated Portfolio:")
+    print(json.dumps({"holdings": updated_portfolio.to_records()}, indent=4))
+
+    save_if_updated(portfolio, updated_portfolio, original_records)
@@ -1,68 +1,173 @@
-import yfinance as yf
-import json
+import csv
 import os
+import sys
+import time
+import numpy as np
 from datetime import datetime
 
-def update_stock_prices(json_file_path):
-    # Load existing data or use default
-    if os.path.exists(json_file_path):
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-            12
-    # Add .NS to symbols and fetch current prices
-    symbols = [f"{stock['Symbol']}.NS" for stock in data]
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_table import HoldingsTable
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.reference_bundle import EQUITY_LIST_PATH, reference
+from refresh_prices.live_price_feed import IncrementalAllocation
+
+STOCK_BREAKDOWN_PATH = 'data/portfolio_data/portfolio_stockbreakdown.json'
+CHUNK_SIZE = 100
+MAX_RETRIES = 2
+
+# NSE symbols we can actually quote; anything else (e.g. 'N/A') is never sent to yfinance
+def load_valid_symbols(csv_path=EQUITY_LIST_PATH):
     try:
-        # Get stock data from yfinance
-        stock_data = yf.download(symbols, period="1d", interval="1d")
-        
-        # Update each stock with current price and add qty if not present
-        for stock in data:
-            symbol = f"{stock['Symbol']}.NS"
+        if csv_path == EQUITY_LIST_PATH:
+            return set(reference('equity_symbols'))
+        with open(csv_path, mode='r', encoding='utf-8') as csvfile:
+            return {row['SYMBOL'] for row in csv.DictReader(csvfile)}
+    except FileNotFoundError:
+        print(f"Warning: {csv_path} not found. Symbols won't be validated.")
+        return None
+
+# Download one chunk of symbols and return the latest close for each
+def fetch_chunk(symbols):
+    import yfinance as yf  # imported on first fetch, not at start-up
+
+    tickers = [f"{symbol}.NS" for symbol in symbols]
+    # threads=True: yfinance fetches the chunk's tickers in parallel inside this one call
+    stock_data = yf.download(tickers, period="1d", interval="1d", progress=False, threads=True)
+    prices = {}
+    for symbol, ticker in zip(symbols, tickers):
+        try:
+            closes = stock_data['Close'][ticker].dropna()
+            if not closes.empty:
+                prices[symbol] = round(float(closes.iloc[-1]), 2)
+        except KeyError:
+            continue  # yfinance drops tickers it couldn't find; reported as missing below
+    return prices
+
+# Fetch prices chunk by chunk, then retry whatever is still missing.
+# yf.download keeps its results in module globals, so chunks must not run from our own threads
+# (each call still downloads its tickers in parallel with its own pool); and it
+# drops tickers it couldn't fetch without raising, so retries go by symbol, not by failed chunk.
+def fetch_prices_chunked(symbols, chunk_size=CHUNK_SIZE, max_retries=MAX_RETRIES):
+    prices = {}
+    pending = list(symbols)
+    for attempt in range(max_retries + 1):
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
             try:
-                # Get the most recent closing price
-                current_price = stock_data['Close'][symbol].iloc[-1]
-                
-                # Add price field
-                stock['Price'] = round(float(current_price), 2)
-                
-                # Add quantity field if not present (calculated from Value/Price)
-                if 'Qty' not in stock:
-                    stock['Qty'] = round(stock['Value'] / stock['Price'], 2)
-                                
-                # Update timestamp
-                stock['Last_Updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
+                prices.update(fetch_chunk(chunk))
             except Exception as e:
-                print(f"Error processing {symbol}: {str(e)}")
-                stock['Price'] = None
-                if 'Qty' not in stock:
-                    stock['Qty'] = 0
-                stock['Last_Updated'] = None  # Set date to None for N/A
-
-        # Calculate total value for percentage calculation
-        total_value = sum(stock['Value'] for stock in data if stock['Price'] is not None)
-        
-        # Update percentages
-        for stock in data:
-            if stock['Price'] is not None and total_value > 0:
-                stock['Percentage_of_Total_Holdings'] = round((stock['Value'] / total_value) * 100, 4)
-            else:
-                stock['Percentage_of_Total_Holdings'] = 0.0
-
-        # Save updated data to JSON file
-        with open(json_file_path, 'w') as file:
-            json.dump(data, file, indent=4)
-            
-        print(f"Stock prices updated successfully. File saved as {json_file_path}")
-        return data
-
-    except Exception as e:
-        print(f"Error fetching stock data: {str(e)}")
+                print(f"Attempt {attempt + 1}: Error fetching chunk of {len(chunk)} symbols: {str(e)}")
+        pending = [symbol for symbol in pending if symbol not in prices]
+        if pending and attempt < max_retries:
+            time.sleep(2 ** attempt)  # back off before retrying the missing symbols
+    return prices, pending
+
+# Distinct symbols of the holdings that resolve to an NSE listing
+def quotable_symbols(data):
+    row_symbols = data.strings('Symbol') if data.has_column('Symbol') else [None] * len(data)
+    valid_symbols = load_valid_symbols()
+    symbols = list(dict.fromkeys(
+        symbol for symbol in row_symbols
+        if symbol and symbol != 'N/A' and (valid_symbols is None or symbol in valid_symbols)
+    ))
+    quoted = set(symbols)
+    skipped = sum(1 for symbol in row_symbols if symbol not in quoted)
+    if skipped:
+        print(f"Skipping {skipped} holdings without a valid NSE symbol")
+    return symbols
+
+def report_missing(missing):
+    if missing:
+        print(f"No price available for {len(missing)} symbols: {', '.join(missing[:20])}{'...' if len(missing) > 20 else ''}")
+
+# Revalue with fresh prices and write back (store + JSON export) only if something changed.
+# The quotes always go into the store's price history.
+def save_revalued(data, prices, json_file_path, store=None):
+    if store is None:
+        with PortfolioStore() as store:
+            return save_revalued(data, prices, json_file_path, store)
+    store.put_prices(prices)
+    if revalue_holdings(data, prices):
+        # Save updated data to the store and the JSON file
+        store.put_lookthrough(data.to_records())
+        store.export_lookthrough_json(json_file_path)
+        print(f"Stock prices updated for {len(prices)}/{len(data)} holdings. File saved as {json_file_path}")
+        return True
+    print(f"No prices changed. {json_file_path} left untouched.")
+    return False
+
+def update_stock_prices(json_file_path):
+    # Load existing data or use default
+    if not os.path.exists(json_file_path):
+        print(f"Error: {json_file_path} not found!")
         return None
+    with PortfolioStore() as store:
+        data = HoldingsTable.from_records(store.load_lookthrough_json(json_file_path))
+
+        # Only quote symbols that resolve to an NSE listing
+        prices, missing = fetch_prices_chunked(quotable_symbols(data))
+        report_missing(missing)
+        save_revalued(data, prices, json_file_path, store)
+    return data
+
+# Incrementally revalue holdings in place; returns True if any field changed
+def revalue_holdings(data, prices):
+    changed = False
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    row_symbols = data.strings('Symbol') if data.has_column('Symbol') else [None] * len(data)
+
+    # Add quantity field if not present (calculated from Value/Price)
+    for stock, symbol in zip(data, row_symbols):
+        if 'Qty' not in stock:
+            price = prices.get(symbol)
+            stock['Qty'] = round(stock['Value'] / price, 2) if price else 0
+            changed = True
+
+    valuation = IncrementalAllocation(
+        row_symbols,
+        data.numeric('Qty'),
+        data.numeric('Value'),
+        prices=data.numeric('Price') if data.has_column('Price') else [None] * len(data),
+    )
+
+    # Only prices that moved are applied; their rows get Value = Price × Qty and the total shifts by the delta
+    changed_prices = {
+        symbol: price for symbol, price in prices.items()
+        if any(valuation.prices[row] != price for row in valuation.row_index.get(symbol, ()))
+    }
+    changed_rows = valuation.apply(changed_prices)
+    for row in changed_rows.tolist():
+        stock = data.row(row)
+        if not stock.get('Qty'):
+            stock['Qty'] = round(float(valuation.quantities[row]), 2)  # derived from this first price
+        stock['Price'] = float(valuation.prices[row])
+        stock['Value'] = round(float(valuation.values[row]), 2)
+        stock['Last_Updated'] = now
+        changed = True
+
+    # Rows without a fresh price are excluded from the total, as before
+    priced = np.array([symbol in prices for symbol in row_symbols], dtype=bool)
+    for stock, symbol, has_price in zip(data, row_symbols, priced.tolist()):
+        if not has_price and (stock.get('Price') is not None or 'Price' not in stock):
+            stock['Price'] = None
+            stock['Last_Updated'] = None  # Set date to None for N/A
+            changed = True
+        elif has_price and stock.get('Price') is None:
+            stock['Price'] = prices[symbol]  # zero-quantity rows still record the quote
+            stock['Last_Updated'] = now
+            changed = True
+
+    priced_total = valuation.total_value - float(valuation.values[~priced].sum())
+    percentages = np.where(priced, valuation.values / priced_total * 100, 0.0) if priced_total > 0 else np.zeros(len(data))
+    percentages = np.round(percentages, 4)
+    if not data.has_column('Percentage_of_Total_Holdings') or not np.array_equal(data.numeric('Percentage_of_Total_Holdings'), percentages):
+        data.set_column('Percentage_of_Total_Holdings', percentages)
+        changed = True
+    return changed
 
 # Example usage
 if __name__ == "__main__":
-    updated_data = update_stock_prices('data/portfolio_data/portfolio_stockbreakdown.json')
+    updated_data = update_stock_prices(STOCK_BREAKDOWN_PATH)
     if updated_data:
         print("\nUpdated stock data:")
         for stock in updated_data:
@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import date
+from portfolio_common.symbol_registry import scheme_key
+from update_asset_allocation.stock_symbols import clean_stock_name
+
+SNAPSHOT_DIR = 'data/holdings_snapshots'
+# What identifies a constituent across scrapes; weights, values and quantities change every month
+# and are kept per fund instead
+IDENTITY_FIELDS = ('Stock', 'Sector')
+
+
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class HoldingsSnapshotStore:
+    """
+    Point-in-time store of scraped fund breakdowns, deduplicated across dates.
+
+    Layout under store_dir:
+        rows.jsonl          every distinct constituent (IDENTITY_FIELDS) once, keyed by its hash
+        funds/ab/<rest>.json.gz
+                            one fund's holdings: (stock key, weight, identity hash, the row's other
+                            fields) per row, named by the hash of that list, so an unchanged month
+                            is stored once
+        snapshots/<date>.json
+                            scheme code -> {"fund": name, "hash": fund manifest hash}
+
+    Diffs only need the two date manifests and the fund manifests whose hashes differ; full rows
+    are rebuilt with rows.jsonl only when asked for.
+    """
+
+    def __init__(self, store_dir=SNAPSHOT_DIR):
+        self.store_dir = store_dir
+        self.rows_path = os.path.join(store_dir, 'rows.jsonl')
+        self.funds_dir = os.path.join(store_dir, 'funds')
+        self.snapshots_dir = os.path.join(store_dir, 'snapshots')
+        os.makedirs(self.funds_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        self._row_hashes = None
+        self._fund_cache = {}
+
+    # Writing
+
+    def _known_row_hashes(self):
+        if self._row_hashes is None:
+            self._row_hashes = set()
+            if os.path.exists(self.rows_path):
+                with open(self.rows_path, 'r') as f:
+                    for line in f:
+                        if line.strip():
+                            self._row_hashes.add(json.loads(line)['sha256'])
+        return self._row_hashes
+
+    def _fund_path(self, fund_hash):
+        return os.path.join(self.funds_dir, fund_hash[:2], f"{fund_hash[2:]}.json.gz")
+
+    def put_fund(self, scheme_code, fund_name, rows, snapshot_date=None):
+        """
+        Records one fund's breakdown rows (as written by clean_holding_data) under snapshot_date.
+
+        Returns:
+            The fund manifest hash; equal hashes on two dates mean the holdings didn't change.
+        """
+        snapshot_date = snapshot_date or date.today().isoformat()
+        known = self._known_row_hashes()
+        positions = []
+        new_rows = []
+        for row in rows:
+            identity = {field: row[field] for field in IDENTITY_FIELDS if field in row}
+            row_hash = _digest(identity)
+            if row_hash not in known:
+                known.add(row_hash)
+                new_rows.append(json.dumps({'sha256': row_hash, 'row': identity}))
+            changing = {field: value for field, value in row.items() if field not in IDENTITY_FIELDS}
+            positions.append([clean_stock_name(row.get('Stock', '')), row.get('Percentage_of_Total_Holdings'), row_hash, changing])
+        if new_rows:
+            with open(self.rows_path, 'a') as f:
+                f.write("\n".join(new_rows) + "\n")
+
+        fund_hash = _digest(positions)
+        fund_path = self._fund_path(fund_hash)
+        if not os.path.exists(fund_path):
+            os.makedirs(os.path.dirname(fund_path), exist_ok=True)
+            tmp_path = f"{fund_path}.tmp"
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(positions, f)
+            os.replace(tmp_path, fund_path)
+
+        manifest = self.manifest(snapshot_date)
+        manifest[scheme_key(scheme_code)] = {'fund': fund_name, 'hash': fund_hash}
+        manifest_path = os.path.join(self.snapshots_dir, f"{snapshot_date}.json")
+        with open(f"{manifest_path}.tmp", 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return fund_hash
+
+    def import_dir(self, breakdown_dir, snapshot_date):
+        # Backfill a snapshot from a folder of <fund>_<scheme code>.json breakdowns
+        count = 0
+        for file_name in sorted(f for f in os.listdir(breakdown_dir) if f.endswith('.json')):
+            fund_name, scheme_code = file_name.replace('.json', '').rsplit('_', 1)
+            with open(os.path.join(breakdown_dir, file_name), 'r') as f:
+                rows = json.load(f)
+            if rows:
+                self.put_fund(scheme_code, fund_name, rows, snapshot_date)
+                count += 1
+        return count
+
+    # Reading
+
+    def dates(self):
+        return sorted(f.replace('.json', '') for f in os.listdir(self.snapshots_dir) if f.endswith('.json'))
+
+    def manifest(self, snapshot_date):
+        manifest_path = os.path.join(self.snapshots_dir, f"{snapshot_date}.json")
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    def fund_positions(self, fund_hash):
+        # [(stock key, weight, identity hash, other fields), ...] for one fund manifest
+        if fund_hash not in self._fund_cache:
+            with gzip.open(self._fund_path(fund_hash), 'rt', encoding='utf-8') as f:
+                self._fund_cache[fund_hash] = [tuple(position) for position in json.load(f)]
+        return self._fund_cache[fund_hash]
+
+    def fund_weights(self, fund_hash):
+        # {stock key: weight}; a stock listed twice (e.g. two share classes) is summed
+        weights = {}
+        for stock, weight, *_ in self.fund_positions(fund_hash):
+            weights[stock] = weights.get(stock, 0) + (weight or 0)
+        return weights
+
+    def _lookup_rows(self, row_hashes):
+        # {hash: rows.jsonl entry} for the hashes that are stored
+        wanted = set(row_hashes)
+        found = {}
+        with open(self.rows_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry['sha256'] in wanted:
+                        found[entry['sha256']] = entry['row']
+        return found
+
+    def rows(self, row_hashes):
+        # rows.jsonl entries for the given hashes, in the order asked for
+        found = self._lookup_rows(row_hashes)
+        return [found[row_hash] for row_hash in row_hashes if row_hash in found]
+
+    def fund_rows(self, scheme_code, snapshot_date):
+        # Full breakdown rows: each position's identity joined with its own weights and quantities
+        entry = self.manifest(snapshot_date).get(scheme_key(scheme_code))
+        if not entry:
+            return []
+        positions = self.fund_positions(entry['hash'])
+        identities = self._lookup_rows([position[2] for position in positions])
+        return [
+            {**identities.get(identity_hash, {}), **fields}
+            for _, _, identity_hash, fields in positions
+        ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill the holdings snapshot store from a breakdown folder")
+    parser.add_argument("breakdown_dir", help="Folder of <fund>_<scheme code>.json files, e.g. a replay date folder")
+    parser.add_argument("--date", default=date.today().isoformat(), help="Snapshot date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    store = HoldingsSnapshotStore()
+    count = store.import_dir(args.breakdown_dir, args.date)
+    print(f"Recorded {count} funds for {args.date} in {store.store_dir}")
@@ -1,10 +1,18 @@
+import argparse
 import json
 import re
 import os
-from firecrawl import FirecrawlApp
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.run_journal import RunJournal
+from scrapers_mf_allocations.holdings_snapshots import HoldingsSnapshotStore
+from scrapers_mf_allocations.raw_markdown_cache import RawMarkdownCache
+
 load_dotenv()
 
 def clean_holding_data(markdown_output):
@@ -126,58 +134,165 @@ mf_dict = {
     # 145552:
 }
 
-# Initialize FirecrawlApp
-app = FirecrawlApp(api_key=os.getenv('FIRECRAWL_API_KEY'))
-
-# Ensure output directory exists
-os.makedirs('data/mf_stock_breakdown_data', exist_ok=True)
+OUTPUT_DIR = 'data/mf_stock_breakdown_data'
+REPLAY_DIR = 'data/mf_stock_breakdown_replay'
 
-# Iterate through dictionary, scrape data, clean it, and save it to a file with retry logic
-for schemeid, url in mf_dict.items():
+# File name for a fund's breakdown, derived from its moneycontrol URL
+def breakdown_file_name(schemeid, url, output_dir=OUTPUT_DIR):
     # Extract the mutual fund name for the JSON filename
     fund_name = re.search(r'\/([^/]+)\/portfolio', url).group(1)
     fund_name_clean = fund_name.replace("-", "_")  # Clean the fund name to be a valid filename
-    file_name = f'data/mf_stock_breakdown_data/{fund_name_clean}_{schemeid}.json'
-    
-    max_attempts = 3
-    attempt = 1
-    
-    while attempt <= max_attempts:
-        try:
-            # Scrape the markdown data
-            response = app.scrape_url(url=url, params={'formats': ['markdown']})
-            markdown_output = response['markdown']
-            
-            # Clean the holding data
-            cleaned_holding_data = clean_holding_data(markdown_output)
-            
-            # Check if the result is an empty list
-            if not cleaned_holding_data:  # If empty list []
-                print(f"Attempt {attempt}: Empty data for {fund_name} (Scheme ID: {schemeid})")
+    return os.path.join(output_dir, f'{fund_name_clean}_{schemeid}.json')
+
+# Failed scrapes leave the last good breakdown in place; an empty list is only written for a fund
+# that has never been scraped, so downstream steps still see it
+def save_failed(file_name):
+    if not os.path.exists(file_name):
+        with open(file_name, 'w') as f:
+            json.dump([], f, indent=4)
+
+# Iterate through dictionary, scrape data, clean it, and save it to a file with retry logic.
+# Each fund is checkpointed in the run journal, so a rerun only scrapes the failed or missing ones.
+def scrape_all(raw_cache, snapshots=None, journal=None, resume=True, store=None):
+    from firecrawl import FirecrawlApp
+
+    # Initialize FirecrawlApp
+    app = FirecrawlApp(api_key=os.getenv('FIRECRAWL_API_KEY'))
+
+    # Ensure output directory exists
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    pending = set(journal.start(mf_dict.keys(), resume)) if journal else None
+
+    for schemeid, url in mf_dict.items():
+        if pending is not None and str(schemeid) not in pending:
+            continue
+        fund_name = re.search(r'\/([^/]+)\/portfolio', url).group(1)
+        file_name = breakdown_file_name(schemeid, url)
+
+        max_attempts = 3
+        attempt = 1
+
+        while attempt <= max_attempts:
+            try:
+                # Scrape the markdown data
+                response = app.scrape_url(url=url, params={'formats': ['markdown']})
+                markdown_output = response['markdown']
+
+                # Keep the raw page so parser fixes can be replayed without re-scraping
+                raw_cache.put(url, markdown_output, scheme_id=schemeid)
+
+                # Clean the holding data
+                cleaned_holding_data = clean_holding_data(markdown_output)
+
+                # Check if the result is an empty list
+                if not cleaned_holding_data:  # If empty list []
+                    print(f"Attempt {attempt}: Empty data for {fund_name} (Scheme ID: {schemeid})")
+                    if attempt == max_attempts:
+                        print(f"Max attempts reached for {fund_name} (Scheme ID: {schemeid}). Keeping previous data.")
+                        save_failed(file_name)
+                        if journal:
+                            journal.failed(schemeid, "Empty data")
+                        break
+                    attempt += 1
+                    time.sleep(2)  # Wait before retrying
+                    continue
+
+                # If data is not empty, save and break the retry loop
+                with open(file_name, 'w') as f:
+                    json.dump(cleaned_holding_data, f, indent=4)
+                if snapshots is not None:
+                    snapshots.put_fund(schemeid, fund_name.replace("-", "_"), cleaned_holding_data)
+                if store is not None:
+                    store.import_breakdown_file(file_name)
+                if journal:
+                    journal.done(schemeid, {"file": file_name, "rows": len(cleaned_holding_data)})
+                print(f"Data saved for {fund_name} (Scheme ID: {schemeid}): {file_name} on attempt {attempt}")
+                break
+
+            except Exception as e:
+                print(f"Attempt {attempt}: Error for {fund_name} (Scheme ID: {schemeid}): {str(e)}")
                 if attempt == max_attempts:
-                    print(f"Max attempts reached for {fund_name} (Scheme ID: {schemeid}). Saving empty list.")
-                    with open(file_name, 'w') as f:
-                        json.dump(cleaned_holding_data, f, indent=4)
-                    break
+                    print(f"Max attempts reached for {fund_name} (Scheme ID: {schemeid}). Keeping previous data.")
+                    save_failed(file_name)
+                    if journal:
+                        journal.failed(schemeid, e)
                 attempt += 1
                 time.sleep(2)  # Wait before retrying
-                continue
-            
-            # If data is not empty, save and break the retry loop
-            with open(file_name, 'w') as f:
-                json.dump(cleaned_holding_data, f, indent=4)
-            print(f"Data saved for {fund_name} (Scheme ID: {schemeid}): {file_name} on attempt {attempt}")
-            break
-            
-        except Exception as e:
-            print(f"Attempt {attempt}: Error for {fund_name} (Scheme ID: {schemeid}): {str(e)}")
-            if attempt == max_attempts:
-                print(f"Max attempts reached for {fund_name} (Scheme ID: {schemeid}). Saving empty list due to errors.")
-                with open(file_name, 'w') as f:
-                    json.dump([], f, indent=4)
-            attempt += 1
-            time.sleep(2)  # Wait before retrying
-    
-    time.sleep(5)  # Wait between different funds
 
-print("Processing complete.")
\ No newline at end of file
+        time.sleep(5)  # Wait between different funds
+
+    if journal:
+        remaining = journal.finish_if_complete(mf_dict.keys())
+        if remaining:
+            print(f"{len(remaining)} funds failed; rerun to retry just those: {', '.join(sorted(remaining))}")
+
+# Re-parse one cached page; runs in a worker process
+def replay_one(cache_dir, digest, file_name):
+    markdown_output = RawMarkdownCache(cache_dir).get(digest)
+    cleaned_holding_data = clean_holding_data(markdown_output)
+    with open(file_name, 'w') as f:
+        json.dump(cleaned_holding_data, f, indent=4)
+    return file_name, cleaned_holding_data
+
+# Re-parse cached pages offline, in parallel, for one date or the whole history
+def replay(raw_cache, replay_date=None, all_dates=False, output_dir=None, max_workers=None, snapshots=None, store=None):
+    entries_by_date = raw_cache.entries()
+    if not entries_by_date:
+        print(f"No cached pages found in {raw_cache.cache_dir}")
+        return
+    dates = sorted(entries_by_date) if all_dates else [replay_date or max(entries_by_date)]
+
+    jobs = []
+    for scrape_date in dates:
+        if scrape_date not in entries_by_date:
+            print(f"No cached pages for {scrape_date}")
+            continue
+        # A single-date replay rewrites the live breakdowns; history goes to one folder per date
+        target_dir = output_dir or (os.path.join(REPLAY_DIR, scrape_date) if all_dates else OUTPUT_DIR)
+        os.makedirs(target_dir, exist_ok=True)
+        for url, entry in entries_by_date[scrape_date].items():
+            schemeid = entry.get('scheme_id') or next((k for k, v in mf_dict.items() if v == url), 'unknown')
+            jobs.append((scrape_date, schemeid, (raw_cache.cache_dir, entry['sha256'], breakdown_file_name(schemeid, url, target_dir))))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(replay_one, *job): (scrape_date, schemeid) for scrape_date, schemeid, job in jobs}
+        for future in as_completed(futures):
+            try:
+                file_name, rows = future.result()
+                print(f"Replayed {file_name}: {len(rows)} holdings")
+                # Snapshots and the store are written here, in the parent, so each has a single writer
+                scrape_date, schemeid = futures[future]
+                if snapshots is not None and rows:
+                    fund_name = os.path.basename(file_name).replace('.json', '').rsplit('_', 1)[0]
+                    snapshots.put_fund(schemeid, fund_name, rows, scrape_date)
+                if store is not None:
+                    store.import_breakdown_file(file_name, scrape_date)
+            except Exception as e:
+                print(f"Error replaying cached page: {str(e)}")
+    print(f"Replayed {len(jobs)} pages across {len(dates)} dates in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape mutual fund holdings, or replay them from the raw page cache")
+    parser.add_argument("--replay", action="store_true", help="Re-parse cached pages instead of scraping")
+    parser.add_argument("--date", help="Cache date to replay (YYYY-MM-DD); defaults to the latest")
+    parser.add_argument("--all", action="store_true", help="Replay every cached date")
+    parser.add_argument("--output-dir", help="Where replayed breakdowns are written")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-snapshot", action="store_true", help="Don't record the results in the holdings snapshot store")
+    parser.add_argument("--restart", action="store_true", help="Ignore an unfinished scrape and start over")
+    args = parser.parse_args()
+
+    raw_cache = RawMarkdownCache()
+    snapshots = None if args.no_snapshot else HoldingsSnapshotStore()
+    store = PortfolioStore()
+    if args.replay:
+        replay(raw_cache, args.date, args.all, args.output_dir, args.workers, snapshots, store)
+    else:
+        journal = RunJournal("mf_scrape")
+        scrape_all(raw_cache, snapshots, journal, resume=not args.restart, store=store)
+        journal.close()
+    store.close()
+
+    print("Processing complete.")
@@ -0,0 +1,64 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import date
+
+CACHE_DIR = 'data/raw_scrape_cache'
+
+
+class RawMarkdownCache:
+    """
+    Content-addressed store for raw scraped markdown.
+
+    Blobs are gzip-compressed and named by the SHA-256 of their content, so a page that didn't
+    change between scrapes is stored once. index.jsonl records which blob each (url, date) saw.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.index_path = os.path.join(cache_dir, 'index.jsonl')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest[2:]}.md.gz")
+
+    def put(self, url, markdown, scrape_date=None, scheme_id=None):
+        # Store the markdown (if new) and record it under (url, date); returns the content hash
+        scrape_date = scrape_date or date.today().isoformat()
+        content = markdown.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.tmp"
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+        with open(self.index_path, 'a') as f:
+            f.write(json.dumps({"url": url, "date": scrape_date, "sha256": digest, "scheme_id": scheme_id}) + "\n")
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self._blob_path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def entries(self):
+        # {date: {url: entry}}; a later scrape of the same url on the same day wins
+        by_date = {}
+        if not os.path.exists(self.index_path):
+            return by_date
+        with open(self.index_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    by_date.setdefault(entry['date'], {})[entry['url']] = entry
+        return by_date
+
+    def dates(self):
+        return sorted(self.entries())
+
+    def lookup(self, url, scrape_date):
+        entry = self.entries().get(scrape_date, {}).get(url)
+        return self.get(entry['sha256']) if entry else None
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_table import HoldingsTable
+from portfolio_common.symbol_registry import SymbolRegistry
+from update_asset_allocation.fund_stock_matrix import BREAKDOWN_DIR, MATRIX_CACHE_PATH, FundStockMatrix
+
+STOCK_BREAKDOWN_PATH = 'data/portfolio_data/portfolio_stockbreakdown.json'
+OUTPUT_PATH = 'data/portfolio_data/fund_overlap_analytics.json'
+TOP_N = 10
+
+
+def pairwise_overlap(weights):
+    """
+    Overlap between every pair of funds.
+
+    Returns:
+        A tuple (common_count, cosine, min_overlap) of funds×funds arrays: the number of shared
+        stocks and the cosine similarity of the weight vectors (both from one sparse product),
+        and the classic overlap sum_k min(w_ik, w_jk) accumulated per stock over its holders.
+    """
+    holds = (weights > 0).astype(np.float64)
+    common_count = (holds @ holds.T).toarray()
+
+    gram = (weights @ weights.T).toarray()
+    norms = np.sqrt(np.diag(gram))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = np.nan_to_num(gram / np.outer(norms, norms))
+
+    min_overlap = np.zeros_like(gram)
+    by_stock = weights.tocsc()
+    for column in range(by_stock.shape[1]):
+        start, end = by_stock.indptr[column], by_stock.indptr[column + 1]
+        if end - start < 2:
+            continue
+        holders = by_stock.indices[start:end]
+        stock_weights = by_stock.data[start:end]
+        min_overlap[np.ix_(holders, holders)] += np.minimum.outer(stock_weights, stock_weights)
+    return common_count, cosine, min_overlap
+
+
+def hhi(weights):
+    # Herfindahl-Hirschman index of weights that sum to 1 (0 = diversified, 1 = one position)
+    total = weights.sum()
+    return float(((weights / total) ** 2).sum()) if total > 0 else 0.0
+
+
+def top_n(labels, weights, n=TOP_N):
+    total = weights.sum()
+    order = np.argsort(-weights, kind='stable')[:n]
+    return [{"name": labels[i], "weight_pct": round(float(weights[i] / total * 100), 4)} for i in order.tolist()] if total > 0 else []
+
+
+def group_weights(labels, weights):
+    # Vectorized group-by: one bincount over the label codes
+    unique_labels, codes = np.unique(np.array([label or 'N/A' for label in labels], dtype=str), return_inverse=True)
+    return list(unique_labels), np.bincount(codes, weights=weights, minlength=len(unique_labels))
+
+
+def fund_concentration(matrix, n=TOP_N):
+    weights = matrix.weights
+    fund_hhi = np.asarray(weights.multiply(weights).sum(axis=1)).ravel()
+    row_sums = np.asarray(weights.sum(axis=1)).ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fund_hhi = np.nan_to_num(fund_hhi / row_sums ** 2)
+    top_share = np.zeros(len(matrix.fund_names))
+    for i in range(weights.shape[0]):
+        row = np.sort(weights.data[weights.indptr[i]:weights.indptr[i + 1]])[::-1]
+        top_share[i] = row[:n].sum() / row_sums[i] * 100 if row_sums[i] > 0 else 0.0
+    return [
+        {"fund": name, "scheme_code": scheme, "stocks": int(weights.indptr[i + 1] - weights.indptr[i]),
+         "hhi": round(float(fund_hhi[i]), 6), f"top_{n}_weight_pct": round(float(top_share[i]), 4)}
+        for i, (name, scheme) in enumerate(zip(matrix.fund_names, matrix.scheme_codes))
+    ]
+
+
+def portfolio_concentration(stock_breakdown, n=TOP_N):
+    # Concentration of the combined direct + look-through portfolio
+    values = np.nan_to_num(stock_breakdown.numeric('Value'))
+    symbols = stock_breakdown.strings('Symbol')
+    names = [symbol if symbol and symbol != 'N/A' else name for symbol, name in zip(symbols, stock_breakdown.strings('Stock'))]
+    sector_labels, sector_values = group_weights(stock_breakdown.strings('Sector'), values)
+    return {
+        "stock_hhi": round(hhi(values), 6),
+        f"top_{n}_stocks": top_n(names, values, n),
+        "sector_hhi": round(hhi(sector_values), 6),
+        f"top_{n}_sectors": top_n(sector_labels, sector_values, n),
+    }
+
+
+def run_analytics(breakdown_dir=BREAKDOWN_DIR, stock_breakdown_path=STOCK_BREAKDOWN_PATH, n=TOP_N, max_pairs=50):
+    registry = SymbolRegistry.load()
+    matrix = FundStockMatrix.load(registry, breakdown_dir, MATRIX_CACHE_PATH)
+    matrix.scheme_codes = registry.schemes_for(matrix.scheme_ids)
+
+    common_count, cosine, min_overlap = pairwise_overlap(matrix.weights)
+    upper_i, upper_j = np.triu_indices(len(matrix.fund_names), k=1)
+    order = np.argsort(-min_overlap[upper_i, upper_j], kind='stable')[:max_pairs]
+    pairs = [
+        {
+            "fund_a": matrix.fund_names[i], "fund_b": matrix.fund_names[j],
+            "overlap_pct": round(float(min_overlap[i, j] * 100), 4),
+            "common_stocks": int(common_count[i, j]),
+            "cosine": round(float(cosine[i, j]), 4),
+        }
+        for i, j in zip(upper_i[order].tolist(), upper_j[order].tolist())
+    ]
+
+    results = {"fund_pairs": pairs, "funds": fund_concentration(matrix, n)}
+    if os.path.exists(stock_breakdown_path):
+        results["portfolio"] = portfolio_concentration(HoldingsTable.load_json(stock_breakdown_path), n)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fund overlap and concentration analytics")
+    parser.add_argument("--top", type=int, default=TOP_N)
+    parser.add_argument("--pairs", type=int, default=50, help="Number of most-overlapping fund pairs to report")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_analytics(n=args.top, max_pairs=args.pairs)
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    for pair in results["fund_pairs"][:10]:
+        print(f"{pair['overlap_pct']:>8.2f}%  {pair['common_stocks']:>4} common  {pair['fund_a']} <-> {pair['fund_b']}")
+    if "portfolio" in results:
+        print(f"Portfolio stock HHI: {results['portfolio']['stock_hhi']}, sector HHI: {results['portfolio']['sector_hhi']}")
+    print(f"Analytics saved to: {OUTPUT_PATH} ({time.perf_counter() - start:.2f}s)")
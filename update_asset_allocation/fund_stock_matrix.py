@@ -0,0 +1,103 @@
+import json
+import os
+import numpy as np
+from portfolio_common.symbol_registry import UNKNOWN_ID
+from update_asset_allocation.stock_symbols import clean_stock_name, get_stock_symbol, load_stock_symbol_map
+
+BREAKDOWN_DIR = 'data/mf_stock_breakdown_data'
+MATRIX_CACHE_PATH = 'data/mapping_data/fund_stock_matrix.npz'
+
+
+# Signature of the breakdown files, so the cached matrix is rebuilt only when a scrape changed them
+def breakdown_signature(breakdown_dir=BREAKDOWN_DIR):
+    files = sorted(f for f in os.listdir(breakdown_dir) if f.endswith('.json'))
+    return "|".join(f"{f}:{os.path.getmtime(os.path.join(breakdown_dir, f)):.0f}" for f in files)
+
+
+class FundStockMatrix:
+    """
+    Sparse fund×stock weight matrix built from data/mf_stock_breakdown_data/.
+
+    weights[i, j] is the fraction of fund scheme_ids[i] invested in stock j; scheme_ids and
+    symbol_ids are SymbolRegistry IDs. stock_names[j] is the stock's NSE symbol, or its cleaned
+    name when it has none: such stocks keep their own column but get UNKNOWN_ID in symbol_ids,
+    so a company name never enters the registry as if it were a tradable symbol.
+    sectors[j] is the raw sector label of stock j from the first fund that holds it.
+    """
+
+    def __init__(self, scheme_ids, fund_names, symbol_ids, stock_names, sectors, weights):
+        self.scheme_ids = scheme_ids
+        self.fund_names = fund_names
+        self.symbol_ids = symbol_ids
+        self.stock_names = stock_names
+        self.sectors = sectors
+        self.weights = weights
+
+    @classmethod
+    def build(cls, registry, breakdown_dir=BREAKDOWN_DIR):
+        stock_symbol_map, company_names_list = load_stock_symbol_map()
+        breakdown_files = sorted(f for f in os.listdir(breakdown_dir) if f.endswith('.json'))
+
+        symbol_cache = {}  # the fuzzy lookup is slow and most stocks recur across funds
+        scheme_ids = []
+        fund_names = []
+        column_of_stock = {}
+        symbol_ids = []
+        sectors = []
+        rows, columns, values = [], [], []
+        for file_name in breakdown_files:
+            fund_name, scheme_code = file_name.replace('.json', '').rsplit('_', 1)
+            with open(os.path.join(breakdown_dir, file_name), 'r') as f:
+                breakdown = json.load(f)
+            row = len(scheme_ids)
+            scheme_ids.append(registry.scheme_id(scheme_code, register=True))
+            fund_names.append(fund_name)
+            for stock in breakdown:
+                if stock.get('Percentage_of_Total_Holdings') is None:
+                    continue
+                cleaned_name = clean_stock_name(stock['Stock'])
+                if cleaned_name not in symbol_cache:
+                    symbol_cache[cleaned_name] = get_stock_symbol(stock['Stock'], stock_symbol_map, company_names_list)
+                symbol = symbol_cache[cleaned_name]
+                # Unresolved stocks are told apart by name (prefixed, so one can't share a symbol's column)
+                stock_key = symbol if symbol else f"name:{cleaned_name}"
+                if stock_key not in column_of_stock:
+                    column_of_stock[stock_key] = len(column_of_stock)
+                    symbol_ids.append(registry.symbol_id(symbol, register=True) if symbol else UNKNOWN_ID)
+                    sectors.append(stock.get('Sector') or 'N/A')
+                rows.append(row)
+                columns.append(column_of_stock[stock_key])
+                values.append(stock['Percentage_of_Total_Holdings'])
+        registry.save()
+
+        # Duplicate (fund, stock) entries are summed by the COO -> CSR conversion
+        from scipy import sparse  # scipy is only imported once a matrix is actually needed
+        weights = sparse.coo_matrix(
+            (np.array(values, dtype=float), (np.array(rows, dtype=np.int32), np.array(columns, dtype=np.int32))),
+            shape=(len(scheme_ids), len(column_of_stock))
+        ).tocsr()
+        stock_names = [key[len("name:"):] if key.startswith("name:") else key for key in column_of_stock]
+        return cls(np.array(scheme_ids, dtype=np.int32), fund_names, np.array(symbol_ids, dtype=np.int32), stock_names, sectors, weights)
+
+    @classmethod
+    def load(cls, registry, breakdown_dir=BREAKDOWN_DIR, cache_path=MATRIX_CACHE_PATH):
+        # Reuse the precomputed matrix; symbol resolution is the slow part of building it.
+        # Registry IDs are stable across runs, so the cache stores plain integer arrays.
+        signature = breakdown_signature(breakdown_dir)
+        if cache_path and os.path.exists(cache_path):
+            cached = np.load(cache_path, allow_pickle=False)
+            if 'stock_names' in cached.files and str(cached['signature']) == signature:
+                from scipy import sparse
+                weights = sparse.csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=tuple(cached['shape']))
+                return cls(cached['scheme_ids'], list(cached['fund_names']), cached['symbol_ids'],
+                           cached['stock_names'].tolist(), list(cached['sectors']), weights)
+
+        matrix = cls.build(registry, breakdown_dir)
+        if cache_path:
+            np.savez_compressed(
+                cache_path, signature=signature, scheme_ids=matrix.scheme_ids, symbol_ids=matrix.symbol_ids,
+                fund_names=np.array(matrix.fund_names, dtype=str), stock_names=np.array(matrix.stock_names, dtype=str), sectors=np.array(matrix.sectors, dtype=str),
+                data=matrix.weights.data, indices=matrix.weights.indices, indptr=matrix.weights.indptr,
+                shape=np.array(matrix.weights.shape)
+            )
+        return matrix
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.symbol_registry import scheme_key
+from rebalancing.lookthrough_rebalancing import load_fund_values
+from scrapers_mf_allocations.holdings_snapshots import HoldingsSnapshotStore
+
+OUTPUT_PATH = 'data/portfolio_data/holdings_diff.json'
+MIN_WEIGHT_CHANGE = 0.0005  # weight changes below 0.05% are noise from rounding on the source page
+
+
+def diff_weights(old_weights, new_weights, min_change=MIN_WEIGHT_CHANGE):
+    """
+    Compares two {stock: weight} maps.
+
+    Returns:
+        A dict with "added", "exited" and "changed" lists of {"stock", "old", "new", "change"},
+        each sorted by the size of the move.
+    """
+    added, exited, changed = [], [], []
+    for stock in old_weights.keys() | new_weights.keys():
+        old, new = old_weights.get(stock), new_weights.get(stock)
+        if old is None:
+            added.append({"stock": stock, "old": 0.0, "new": new, "change": new})
+        elif new is None:
+            exited.append({"stock": stock, "old": old, "new": 0.0, "change": -old})
+        elif abs(new - old) >= min_change:
+            changed.append({"stock": stock, "old": old, "new": new, "change": new - old})
+    for entries in (added, exited, changed):
+        entries.sort(key=lambda x: (-abs(x["change"]), x["stock"]))
+    return {"added": added, "exited": exited, "changed": changed}
+
+
+def diff_funds(store, old_date, new_date, scheme_codes=None, min_change=MIN_WEIGHT_CHANGE):
+    # Per-fund diffs; funds whose manifest hash didn't change are skipped without being read
+    old_manifest, new_manifest = store.manifest(old_date), store.manifest(new_date)
+    codes = old_manifest.keys() | new_manifest.keys()
+    if scheme_codes:
+        codes &= {scheme_key(code) for code in scheme_codes}
+
+    results = {}
+    for code in sorted(codes):
+        old_entry, new_entry = old_manifest.get(code), new_manifest.get(code)
+        if old_entry and new_entry and old_entry['hash'] == new_entry['hash']:
+            continue
+        old_weights = store.fund_weights(old_entry['hash']) if old_entry else {}
+        new_weights = store.fund_weights(new_entry['hash']) if new_entry else {}
+        results[code] = {"fund": (new_entry or old_entry)['fund'], **diff_weights(old_weights, new_weights, min_change)}
+    return results
+
+
+def lookthrough_weights(store, snapshot_date, fund_values):
+    # Look-through stock weights of the fund holdings for the given ₹ fund values
+    manifest = store.manifest(snapshot_date)
+    exposure = {}
+    for code, value in fund_values.items():
+        entry = manifest.get(scheme_key(code))
+        if not entry or not value:
+            continue
+        for stock, weight in store.fund_weights(entry['hash']).items():
+            exposure[stock] = exposure.get(stock, 0) + weight * value
+    total = sum(fund_values.values())
+    return {stock: value / total for stock, value in exposure.items()} if total else {}
+
+
+def diff_lookthrough(store, old_date, new_date, fund_values, min_change=MIN_WEIGHT_CHANGE):
+    """
+    Diff of the combined look-through portfolio between two snapshot dates.
+
+    Fund values are held fixed at fund_values for both dates, so the result shows only what the
+    fund managers changed, not market moves or your own buys and sells.
+    """
+    return diff_weights(
+        lookthrough_weights(store, old_date, fund_values),
+        lookthrough_weights(store, new_date, fund_values),
+        min_change
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fund holdings between two snapshot dates")
+    parser.add_argument("old_date", nargs="?", help="Earlier snapshot date (YYYY-MM-DD); defaults to the second latest")
+    parser.add_argument("new_date", nargs="?", help="Later snapshot date (YYYY-MM-DD); defaults to the latest")
+    parser.add_argument("--fund", action="append", help="Only diff this scheme code (repeatable)")
+    parser.add_argument("--min-change", type=float, default=MIN_WEIGHT_CHANGE, help="Smallest weight change reported (fraction)")
+    parser.add_argument("--no-lookthrough", action="store_true", help="Skip the total look-through diff")
+    args = parser.parse_args()
+
+    store = HoldingsSnapshotStore()
+    dates = store.dates()
+    if len(dates) < 2 and not (args.old_date and args.new_date):
+        print(f"Need at least two snapshots in {store.store_dir}, found {len(dates)}")
+        sys.exit(1)
+    old_date = args.old_date or dates[-2]
+    new_date = args.new_date or dates[-1]
+
+    results = {"old_date": old_date, "new_date": new_date, "funds": diff_funds(store, old_date, new_date, args.fund, args.min_change)}
+    for code, fund_diff in results["funds"].items():
+        print(f"{fund_diff['fund']} ({code}): {len(fund_diff['added'])} added, {len(fund_diff['exited'])} exited, {len(fund_diff['changed'])} changed")
+
+    if not args.no_lookthrough:
+        try:
+            results["lookthrough"] = diff_lookthrough(store, old_date, new_date, load_fund_values(), args.min_change)
+            lookthrough = results["lookthrough"]
+            print(f"Look-through: {len(lookthrough['added'])} added, {len(lookthrough['exited'])} exited, {len(lookthrough['changed'])} changed")
+        except FileNotFoundError as e:
+            print(f"Skipping look-through diff, holdings not found: {e}")
+
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Diff saved to: {OUTPUT_PATH}")
@@ -0,0 +1,295 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.portfolio_store import PortfolioStore
+
+STOCK_BREAKDOWN_PATH = 'data/portfolio_data/portfolio_stockbreakdown.json'
+OUTPUT_PATH = 'data/portfolio_data/portfolio_risk.json'
+COVARIANCE_CACHE_DIR = 'data/risk_cache'
+# ICICI Prudential Nifty 50 index fund, as scraped in mf_scraper.mf_dict
+BENCHMARK_SCHEME = '120684'
+LOOKBACK_DAYS = 252
+MIN_OBSERVATIONS = 60  # names with fewer daily returns in the window are left out of the covariance
+MAX_FILL_DAYS = 5  # a price is carried forward over at most this many missing days
+# Calendar days read per trading day of lookback (weekends, holidays, a margin for missed refreshes)
+CALENDAR_DAYS_PER_TRADING_DAY = 1.5
+TRADING_DAYS = 252
+TOP_N = 20
+
+
+def price_panel(store, symbols, end=None, lookback=LOOKBACK_DAYS):
+    """
+    Daily closes from the store's price history as a dates×symbols array.
+
+    Returns:
+        A tuple (dates, symbols, prices) covering the last lookback + 1 price dates up to end;
+        missing prices are NaN after a limited forward fill.
+    """
+    # Only the window is read: lookback trading days back from end, in calendar days with a margin
+    end_date = date.fromisoformat(end) if end else date.today()
+    start = (end_date - timedelta(days=int(lookback * CALENDAR_DAYS_PER_TRADING_DAY) + MAX_FILL_DAYS)).isoformat()
+    rows = store.price_history(symbols, start=start, end=end)
+    if not rows:
+        return [], [], np.zeros((0, 0))
+    row_symbols, row_dates, row_prices = zip(*rows)
+    dates, date_index = np.unique(np.array(row_dates), return_inverse=True)
+    names, symbol_index = np.unique(np.array(row_symbols), return_inverse=True)
+    prices = np.full((len(dates), len(names)), np.nan)
+    prices[date_index, symbol_index] = row_prices
+    prices = prices[-(lookback + 1):]
+    dates = dates[-(lookback + 1):]
+
+    # Carry each column's last price over short gaps (holidays, a missed refresh), vectorized per row
+    last = np.full(len(names), np.nan)
+    gap = np.zeros(len(names), dtype=np.int32)
+    for row in range(len(prices)):
+        present = ~np.isnan(prices[row])
+        gap = np.where(present, 0, gap + 1)
+        last = np.where(present, prices[row], last)
+        prices[row] = np.where(gap <= MAX_FILL_DAYS, last, np.nan)
+    return dates.tolist(), names.tolist(), prices
+
+
+class CovarianceEstimate:
+    """
+    Ledoit-Wolf shrunk covariance of daily log returns: (1 - s) * S + s * mu * I, where S is the
+    sample covariance and mu its average variance.
+
+    Kept in factored form (the T×N demeaned returns), since every risk number here only needs
+    Σ·w: that costs O(T·N) instead of building and storing an N×N matrix for thousands of names.
+    """
+
+    def __init__(self, symbols, returns, shrinkage, mu, as_of=None):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.returns = returns
+        self.shrinkage = float(shrinkage)
+        self.mu = float(mu)
+        self.as_of = as_of
+
+    @classmethod
+    def fit(cls, symbols, returns, as_of=None, min_observations=MIN_OBSERVATIONS):
+        observed = np.isfinite(returns)
+        keep = observed.sum(axis=0) >= min_observations
+        returns = returns[:, keep]
+        observed = observed[:, keep]
+        symbols = [symbol for symbol, kept in zip(symbols, keep.tolist()) if kept]
+        # Demeaned per name; a missing return contributes nothing to any covariance. Each column is
+        # scaled by sqrt(T / its observation count), so X'X / T divides every name's moments by the
+        # days it was actually observed (a recent listing isn't made to look less volatile)
+        means = np.nanmean(returns, axis=0) if returns.size else np.zeros(returns.shape[1])
+        counts = observed.sum(axis=0)
+        x = np.where(observed, returns - means, 0.0)
+        t, n = x.shape
+        if n:
+            x = x * np.sqrt(t / counts)
+        if t == 0 or n == 0:
+            return cls(symbols, x, 1.0, 0.0, as_of)
+
+        # Everything the shrinkage intensity needs comes from the T×T Gram matrix, not the N×N one
+        gram = x @ x.T
+        trace = float(np.trace(gram)) / t  # tr(S)
+        frobenius_sq = float(np.sum(gram ** 2)) / t ** 2  # ||S||²
+        mu = trace / n
+        d_sq = (frobenius_sq - 2 * mu * trace + mu ** 2 * n) / n
+        b_bar_sq = (float(np.sum(np.diag(gram) ** 2)) / t - frobenius_sq) / (t * n)
+        shrinkage = min(b_bar_sq, d_sq) / d_sq if d_sq > 0 else 1.0
+        return cls(symbols, x, shrinkage, mu, as_of)
+
+    def matvec(self, weights):
+        # Σ·w (daily) without forming Σ
+        t = max(len(self.returns), 1)
+        return (1 - self.shrinkage) * (self.returns.T @ (self.returns @ weights)) / t + self.shrinkage * self.mu * weights
+
+    def matrix(self):
+        # Dense Σ, only for small universes or inspection
+        t = max(len(self.returns), 1)
+        return (1 - self.shrinkage) * (self.returns.T @ self.returns) / t + self.shrinkage * self.mu * np.eye(len(self.symbols))
+
+    def vector(self, values):
+        # {symbol: value} → array aligned with self.symbols (names outside the estimate are dropped)
+        vector = np.zeros(len(self.symbols))
+        for symbol, value in values.items():
+            position = self.index.get(symbol)
+            if position is not None:
+                vector[position] += value
+        return vector
+
+    def save(self, path):
+        np.savez_compressed(
+            path, symbols=np.array(self.symbols, dtype=str), returns=self.returns,
+            shrinkage=self.shrinkage, mu=self.mu, as_of=str(self.as_of)
+        )
+
+    @classmethod
+    def load(cls, path):
+        cached = np.load(path, allow_pickle=False)
+        return cls(list(cached['symbols']), cached['returns'].astype(np.float64), cached['shrinkage'], cached['mu'], str(cached['as_of']))
+
+
+def load_covariance(store, symbols, end=None, lookback=LOOKBACK_DAYS, cache_dir=COVARIANCE_CACHE_DIR):
+    """
+    Covariance estimate for symbols as of the latest price date up to end, cached per date.
+
+    The cache key is (price date, lookback) plus a hash of the symbols, dates and prices in the
+    window, so reruns on unchanged prices are a file load, while a new day's prices or history
+    added by a backfill produce a new estimate.
+    """
+    dates, names, prices = price_panel(store, symbols, end, lookback)
+    if len(dates) < 2:
+        return CovarianceEstimate([], np.zeros((0, 0)), 1.0, 0.0, dates[-1] if dates else None)
+    as_of = dates[-1]
+    digest = hashlib.sha1()
+    digest.update("\n".join(names).encode())
+    digest.update("\n".join(dates).encode())
+    digest.update(np.ascontiguousarray(prices, dtype=float).tobytes())
+    digest = digest.hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, f"cov2_{as_of}_{lookback}_{digest}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        return CovarianceEstimate.load(cache_path)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(prices), axis=0)
+    estimate = CovarianceEstimate.fit(names, returns, as_of)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        estimate.save(cache_path)
+    return estimate
+
+
+def lookthrough_values(records):
+    # ₹ exposure per symbol from portfolio_stockbreakdown records (direct + MF look-through)
+    values = {}
+    unmapped = 0.0
+    for record in records:
+        symbol = record.get('Symbol')
+        value = record.get('Value') or 0.0
+        if symbol and symbol != 'N/A':
+            values[symbol] = values.get(symbol, 0.0) + value
+        else:
+            unmapped += value
+    return values, unmapped
+
+
+def risk_metrics(estimate, weights, benchmark_weights=None, top_n=TOP_N):
+    """
+    Annualized volatility, marginal and component risk contributions, and tracking error.
+
+    Args:
+        estimate: CovarianceEstimate.
+        weights: {symbol: weight as a fraction of the whole portfolio}.
+        benchmark_weights: Optional {symbol: weight} of the benchmark fund.
+
+    Returns:
+        A dict of risk numbers in %; weight without price history is reported as uncovered.
+    """
+    w = estimate.vector(weights)
+    sigma_w = estimate.matvec(w)
+    variance = float(w @ sigma_w)
+    volatility = np.sqrt(max(variance, 0.0) * TRADING_DAYS)
+    # d(vol)/d(w): how much a 1-point weight increase moves annualized volatility
+    marginal = sigma_w * TRADING_DAYS / volatility if volatility > 0 else np.zeros_like(w)
+    contribution = w * marginal
+
+    order = np.argsort(-contribution)[:top_n]
+    metrics = {
+        "as_of": estimate.as_of,
+        "observations": len(estimate.returns),
+        "symbols_covered": int(np.count_nonzero(w)),
+        "covered_weight_pct": round(float(w.sum()) * 100, 2),
+        "uncovered_weight_pct": round((sum(weights.values()) - float(w.sum())) * 100, 2),
+        "shrinkage": round(estimate.shrinkage, 4),
+        "volatility_pct": round(float(volatility) * 100, 4),
+        "risk_contributions": [
+            {
+                "Symbol": estimate.symbols[i],
+                "Weight (%)": round(float(w[i]) * 100, 4),
+                "Marginal Risk (%)": round(float(marginal[i]) * 100, 4),
+                "Risk Contribution (%)": round(float(contribution[i]) * 100, 4),
+                "Share of Risk (%)": round(float(contribution[i] / volatility) * 100, 2) if volatility > 0 else 0.0,
+            }
+            for i in order.tolist() if w[i] != 0
+        ],
+    }
+    if benchmark_weights:
+        b = estimate.vector(benchmark_weights)
+        active = w - b
+        tracking_variance = float(active @ estimate.matvec(active)) * TRADING_DAYS
+        benchmark_variance = float(b @ estimate.matvec(b)) * TRADING_DAYS
+        metrics["benchmark_volatility_pct"] = round(float(np.sqrt(max(benchmark_variance, 0.0))) * 100, 4)
+        metrics["tracking_error_pct"] = round(float(np.sqrt(max(tracking_variance, 0.0))) * 100, 4)
+        metrics["benchmark_covered_weight_pct"] = round(float(b.sum()) * 100, 2)
+        metrics["active_share_pct"] = round(float(np.abs(active).sum()) / 2 * 100, 2)
+    return metrics
+
+
+def backfill_prices(store, symbols, period="1y", chunk_size=100):
+    # Seeds the local price history with daily closes from yfinance (the refreshers only add today's)
+    import yfinance as yf  # imported only when backfilling
+
+    symbols = list(symbols)
+    for start in range(0, len(symbols), chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        tickers = [f"{symbol}.NS" for symbol in chunk]
+        closes = yf.download(tickers, period=period, interval="1d", progress=False, threads=False)['Close']
+        for day, row in closes.iterrows():
+            prices = {
+                symbol: round(float(row[ticker]), 2) for symbol, ticker in zip(chunk, tickers)
+                if ticker in row and np.isfinite(row[ticker])
+            }
+            store.put_prices(prices, day.date().isoformat())
+        print(f"Backfilled {min(start + chunk_size, len(symbols))}/{len(symbols)} symbols")
+
+
+def run_risk(store, breakdown_path=STOCK_BREAKDOWN_PATH, benchmark_scheme=BENCHMARK_SCHEME, end=None,
+             lookback=LOOKBACK_DAYS, top_n=TOP_N, backfill=False):
+    values, unmapped = lookthrough_values(store.load_lookthrough_json(breakdown_path))
+    total_value = sum(values.values()) + unmapped
+    if total_value <= 0:
+        raise ValueError(f"No holdings with a value in {breakdown_path}")
+    benchmark_weights = store.constituent_weights(benchmark_scheme) if benchmark_scheme else {}
+    universe = sorted(set(values) | set(benchmark_weights))
+    if backfill:
+        backfill_prices(store, universe)
+
+    estimate = load_covariance(store, universe, end, lookback)
+    metrics = risk_metrics(estimate, {symbol: value / total_value for symbol, value in values.items()}, benchmark_weights, top_n)
+    metrics["portfolio_value"] = round(total_value, 2)
+    metrics["unmapped_weight_pct"] = round(unmapped / total_value * 100, 2)
+    metrics["benchmark_scheme"] = benchmark_scheme if benchmark_weights else None
+    if benchmark_scheme and not benchmark_weights:
+        print(f"Warning: no resolved constituents for benchmark scheme {benchmark_scheme}; tracking error skipped.")
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Volatility, risk contributions and tracking error of the look-through portfolio")
+    parser.add_argument("--as-of", default=None, help="Use prices up to this date (YYYY-MM-DD)")
+    parser.add_argument("--lookback", type=int, default=LOOKBACK_DAYS, help="Daily returns in the estimation window")
+    parser.add_argument("--benchmark", default=BENCHMARK_SCHEME, help="Scheme code of the benchmark fund")
+    parser.add_argument("--top", type=int, default=TOP_N)
+    parser.add_argument("--backfill", action="store_true", help="Fetch a year of daily closes from yfinance first")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = PortfolioStore()
+    metrics = run_risk(store, benchmark_scheme=args.benchmark, end=args.as_of or date.today().isoformat(),
+                       lookback=args.lookback, top_n=args.top, backfill=args.backfill)
+    store.close()
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(metrics, f, indent=4)
+
+    print(f"Prices as of {metrics['as_of']} ({metrics['observations']} daily returns, shrinkage {metrics['shrinkage']})")
+    print(f"Volatility: {metrics['volatility_pct']:.2f}% on {metrics['covered_weight_pct']:.2f}% of the portfolio with price history")
+    if "tracking_error_pct" in metrics:
+        print(f"Tracking error vs {metrics['benchmark_scheme']}: {metrics['tracking_error_pct']:.2f}% (active share {metrics['active_share_pct']:.2f}%)")
+    for row in metrics["risk_contributions"][:10]:
+        print(f"  {row['Symbol']:<15} weight {row['Weight (%)']:>7.2f}%  share of risk {row['Share of Risk (%)']:>6.2f}%")
+    print(f"Risk report saved to: {OUTPUT_PATH} ({time.perf_counter() - start:.2f}s)")
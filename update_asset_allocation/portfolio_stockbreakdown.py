@@ -1,137 +1,142 @@
 import json
-from collections import defaultdict
 import os
-import csv
-from fuzzywuzzy import fuzz
-
-# Function to clean stock names
-def clean_stock_name(stock_name):
-    stock_name = stock_name.replace(' Ltd.', ' Limited').replace(' Ltd', ' Limited').replace(' Limited.', ' Limited')
-    stock_name = stock_name.replace(' Co.', ' Company').replace(' Co', ' Company').replace(' Company.', ' Company')
-    stock_name = stock_name.replace(' Inc.', ' Inc').replace(' Inc', ' Incorporated').replace(' Incorporated.', ' Incorporated')
-    stock_name = stock_name.replace('&', 'and')
-    stock_name = stock_name.strip()  # remove leading/trailing whitespaces
-    return stock_name
-
-# Load stock symbols from CSV and clean names during mapping
-stock_symbol_map = {}
-company_names_list = []
-try:
-    with open('data/mapping_data/EQUITY_L.csv', mode='r', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        for row in csv_reader:
-            cleaned_name = clean_stock_name(row['NAME OF COMPANY'])
-            stock_symbol_map[cleaned_name] = row['SYMBOL']
-            company_names_list.append(cleaned_name)
-except FileNotFoundError:
-    print("Warning: EQUITY_L.csv not found. Stock symbols won't be mapped.")
-
-# Function to get stock symbol
-def get_stock_symbol(stock_name, stock_symbol_map, company_names_list):
-    cleaned_stock_name = clean_stock_name(stock_name)
-
-    # 1. Exact match
-    if cleaned_stock_name in stock_symbol_map:
-        return stock_symbol_map[cleaned_stock_name]
-
-    # 2. Partial matching
-    for company_name in company_names_list:
-        if cleaned_stock_name.lower() in company_name.lower():
-            return stock_symbol_map[company_name]
-
-    # 3. Fuzzy matching
-    best_match_symbol = None
-    best_match_score = 0
-    for company_name in company_names_list:
-        score = fuzz.token_set_ratio(cleaned_stock_name, company_name)
-        if score > best_match_score:
-            best_match_score = score
-            best_match_symbol = stock_symbol_map[company_name]
-
-    if best_match_score > 90:  # Adjustable threshold
-        return best_match_symbol
-
-    return None  # Return None if no good match
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.holdings_table import HoldingsTable
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.symbol_registry import SymbolRegistry
+from update_asset_allocation.sector_taxonomy import SECTORS, SectorIndex, sector_rollup
+from update_asset_allocation.stock_symbols import clean_stock_name, get_stock_symbol, load_stock_symbol_map
 
 # File paths
 HOLDINGS_FILE_PATH = 'data/portfolio_data/updated_portfolio.json'
 BREAKDOWN_DIR = 'data/mf_stock_breakdown_data'
 
-# Load holdings data
-with open(HOLDINGS_FILE_PATH, 'r') as f:
-    holdings_data = json.load(f)
-holdings = holdings_data['holdings']
-
-# Map scheme IDs to breakdown files
-breakdown_files = [f for f in os.listdir(BREAKDOWN_DIR) if f.endswith('.json')]
-scheme_id_to_file = {f.rsplit('_', 1)[-1].replace('.json', ''): os.path.join(BREAKDOWN_DIR, f) for f in breakdown_files}
-
-# Aggregate stock values and track sectors
-stock_values = defaultdict(float)
-stock_to_sector = {}
-stock_to_symbol = {}
-total_portfolio_value = 0
-
-for holding in holdings:
-    scheme_id = holding['SchemeID']
-    value = holding['Value']
-    total_portfolio_value += value
-
-    if scheme_id == 'N/A':
-        # Direct stock holding
-        stock_name = holding['Security']
+
+def main(store):
+    """Writes the look-through stock and sector breakdowns of the holdings in store."""
+    # Load stock symbols from CSV and clean names during mapping
+    stock_symbol_map, company_names_list = load_stock_symbol_map()
+
+    # Load holdings and each fund's latest breakdown through the store (changed JSON files are re-ingested)
+    holdings = HoldingsTable.from_records(store.load_holdings_json(HOLDINGS_FILE_PATH))
+    interner = holdings.interner  # breakdown tables share it so stock names are interned once
+    store.sync_breakdown_dir(BREAKDOWN_DIR)
+    fund_constituents = store.latest_constituents()
+
+    # Map registry scheme IDs to scheme codes with a breakdown so the join runs on integers
+    registry = SymbolRegistry.load()
+    scheme_id_to_code = {registry.scheme_id(code, register=True): code for code in fund_constituents}
+    registry.save()
+    sector_index = SectorIndex.load(BREAKDOWN_DIR)
+    holding_scheme_ids = registry.scheme_ids(holdings.strings('SchemeID'))
+
+    # Symbol lookup is fuzzy and slow, so resolve each cleaned name only once (from the first raw name seen)
+    raw_names = {}
+    def clean_and_track(stock_name):
         cleaned_name = clean_stock_name(stock_name)
-        symbol = get_stock_symbol(stock_name, stock_symbol_map, company_names_list)
-        stock_values[cleaned_name] += value
-        if cleaned_name not in stock_to_sector:
-            stock_to_sector[cleaned_name] = holding.get('Sector', 'N/A')
-        if symbol and cleaned_name not in stock_to_symbol:
-            stock_to_symbol[cleaned_name] = symbol
-    else:
-        # Mutual fund holding
-        breakdown_file = scheme_id_to_file.get(scheme_id)
-        if breakdown_file:
-            with open(breakdown_file, 'r') as f:
-                breakdown = json.load(f)
-            for stock in breakdown:
-                stock_name = stock['Stock']
-                cleaned_name = clean_stock_name(stock_name)
-                symbol = get_stock_symbol(stock_name, stock_symbol_map, company_names_list)
-                percentage = stock['Percentage_of_Total_Holdings']
-                effective_value = percentage * value
-                stock_values[cleaned_name] += effective_value
-                if cleaned_name not in stock_to_sector:
-                    stock_to_sector[cleaned_name] = stock['Sector']
-                if symbol and cleaned_name not in stock_to_symbol:
-                    stock_to_symbol[cleaned_name] = symbol
+        raw_names.setdefault(cleaned_name, stock_name)
+        return cleaned_name
+
+    symbol_cache = {}
+    def resolve_symbol(cleaned_name):
+        if cleaned_name not in symbol_cache:
+            symbol_cache[cleaned_name] = get_stock_symbol(raw_names[cleaned_name], stock_symbol_map, company_names_list) or 'N/A'
+        return symbol_cache[cleaned_name]
+
+    # Collect every look-through contribution as columns, then aggregate in one group-by
+    stock_names = []
+    sectors = []
+    value_chunks = []
+    breakdown_cache = {}
+
+    values = holdings.numeric('Value')
+    total_portfolio_value = float(values.sum())
+
+    for holding in holdings:
+        scheme_id = holding['SchemeID']
+        value = values[holding.index]
+
+        if scheme_id == 'N/A':
+            # Direct stock holding
+            stock_names.append(clean_and_track(holding['Security']))
+            sectors.append(holding.get('Sector') or 'N/A')
+            value_chunks.append(np.array([value]))
         else:
-            print(f"Warning: No breakdown file found for SchemeID {scheme_id}")
-
-# Calculate total stock value after aggregation
-total_stock_value = sum(stock_values.values())
-
-# Build output with symbols
-portfolio_stockbreakdown = [
-    {
-        'Stock': stock_name,
-        'Symbol': stock_to_symbol.get(stock_name, 'N/A'),  # Add symbol, default to 'N/A' if not found
-        'Sector': stock_to_sector.get(stock_name, 'N/A'),
-        'Value': round(value, 2),
-        'Percentage_of_Total_Holdings': round((value / total_stock_value) * 100, 4)
-    }
-    for stock_name, value in stock_values.items()
-]
-
-# Sort by percentage descending
-portfolio_stockbreakdown.sort(key=lambda x: x['Percentage_of_Total_Holdings'], reverse=True)
-
-# Save output
-output_file = 'data/portfolio_data/portfolio_stockbreakdown.json'
-with open(output_file, 'w') as f:
-    json.dump(portfolio_stockbreakdown, f, indent=4)
-
-# Debug output
-print(f"Total Portfolio Value: {total_portfolio_value}")
-print(f"Total Stock Value: {total_stock_value}")
-print(f"Number of Stocks: {len(portfolio_stockbreakdown)}")
-print(f"Portfolio breakdown saved to: {output_file}")
\ No newline at end of file
+            # Mutual fund holding
+            scheme_code = scheme_id_to_code.get(int(holding_scheme_ids[holding.index]))
+            if scheme_code:
+                if scheme_code not in breakdown_cache:
+                    breakdown_cache[scheme_code] = HoldingsTable.from_records(fund_constituents[scheme_code][1], interner=interner)
+                breakdown = breakdown_cache[scheme_code]
+                if len(breakdown) == 0:
+                    continue
+                stock_names.extend(clean_and_track(name) for name in breakdown.strings('Stock'))
+                sectors.extend(breakdown.strings('Sector'))
+                value_chunks.append(np.nan_to_num(breakdown.numeric('Percentage_of_Total_Holdings')) * value)
+            else:
+                print(f"Warning: No breakdown file found for SchemeID {scheme_id}")
+
+    contributions = HoldingsTable.from_records(
+        [{'Stock': name, 'Sector': sector} for name, sector in zip(stock_names, sectors)], interner=interner
+    )
+    contributions.set_column('Value', np.concatenate(value_chunks) if value_chunks else np.zeros(0))
+    stock_breakdown = contributions.group_sum('Stock', ['Value']) if len(contributions) else contributions
+
+    # Calculate total stock value after aggregation
+    stock_values = stock_breakdown.numeric('Value') if len(stock_breakdown) else np.zeros(0)
+    total_stock_value = float(stock_values.sum())
+
+    # Build output with symbols, sorted by percentage descending
+    percentages = np.round(stock_values / total_stock_value * 100, 4) if total_stock_value else np.zeros(len(stock_values))
+    order = np.argsort(-percentages, kind='stable')
+    names = stock_breakdown.strings('Stock') if len(stock_breakdown) else []
+    # Normalized sector per aggregated stock from the precomputed index (raw label as fallback)
+    sector_codes = sector_index.codes_for(names, stock_breakdown.strings('Sector') if len(stock_breakdown) else [])
+    portfolio_stockbreakdown = HoldingsTable.from_records([
+        {
+            'Stock': names[i],
+            'Symbol': resolve_symbol(names[i]),  # Add symbol, default to 'N/A' if not found
+            'Sector': SECTORS[sector_codes[i]],
+            'Value': round(float(stock_values[i]), 2),
+            'Percentage_of_Total_Holdings': float(percentages[i])
+        }
+        for i in order.tolist()
+    ], interner=interner)
+
+    # Save output to the store, export the JSON file, and record resolved symbols on the fund constituents
+    output_file = 'data/portfolio_data/portfolio_stockbreakdown.json'
+    store.put_lookthrough(portfolio_stockbreakdown.to_records())
+    store.export_lookthrough_json(output_file)
+    store.set_constituent_symbols({stock: resolve_symbol(clean_and_track(stock)) for stock in store.unresolved_constituent_stocks()})
+
+    # Sector totals from the same aggregated arrays
+    sector_values = sector_rollup(sector_codes, stock_values)
+    sector_counts = np.bincount(sector_codes, minlength=len(SECTORS))
+    sector_order = [int(code) for code in np.argsort(-sector_values, kind='stable') if sector_counts[code] > 0]
+    sector_output_file = 'data/portfolio_data/portfolio_sectorbreakdown.json'
+    with open(sector_output_file, 'w') as f:
+        json.dump([
+            {
+                'Sector': SECTORS[code],
+                'Value': round(float(sector_values[code]), 2),
+                'Percentage_of_Total_Holdings': round(float(sector_values[code] / total_stock_value * 100), 4) if total_stock_value else 0.0,
+                'Number_of_Stocks': int(sector_counts[code])
+            }
+            for code in sector_order
+        ], f, indent=4)
+
+    # Debug output
+    print(f"Total Portfolio Value: {total_portfolio_value}")
+    print(f"Total Stock Value: {total_stock_value}")
+    print(f"Number of Stocks: {len(portfolio_stockbreakdown)}")
+    print(f"Number of Sectors: {len(sector_order)}")
+    print(f"Portfolio breakdown saved to: {output_file}")
+    print(f"Sector breakdown saved to: {sector_output_file}")
+
+
+if __name__ == "__main__":
+    with PortfolioStore() as store:
+        main(store)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio_common.portfolio_store import PortfolioStore
+from portfolio_common.reference_bundle import ASSET_ALLOCATION_PATH
+from update_asset_allocation.portfolio_risk import LOOKBACK_DAYS, TRADING_DAYS, load_covariance
+
+METHODS = ("risk_parity", "inverse_volatility", "min_variance")
+MAX_WEIGHT = 0.10  # per-name cap for min_variance, which otherwise piles into a handful of low-vol names
+MIN_WEIGHT_PCT = 0.01  # same cut-off as assetallocation_stockbreakdown.py
+MAX_ITERATIONS = 5000
+TOLERANCE = 1e-8
+# Generated targets go next to the hand-maintained asset_allocation.json, never over it by default
+OUTPUT_PATH = 'data/mapping_data/asset_allocation_{method}.json'
+
+
+def variances(estimate):
+    # diag(Σ) straight from the factored estimate
+    t = max(len(estimate.returns), 1)
+    return (1 - estimate.shrinkage) * np.sum(estimate.returns ** 2, axis=0) / t + estimate.shrinkage * estimate.mu
+
+
+def inverse_volatility_weights(estimate):
+    inverse_vol = 1 / np.sqrt(variances(estimate))
+    return inverse_vol / inverse_vol.sum()
+
+
+def risk_parity_weights(estimate, budgets=None, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """
+    Equal (or budgeted) risk contribution weights: w_i·(Σw)_i / w'Σw = b_i.
+
+    Solves Σy = b / y, y > 0 (then w = y / Σy) with damped coordinate updates applied to every
+    name at once, so an iteration is one Σ·y product however many names there are.
+
+    Returns:
+        A tuple (weights, iterations).
+    """
+    n = len(estimate.symbols)
+    budgets = np.full(n, 1 / n) if budgets is None else np.asarray(budgets) / np.sum(budgets)
+    diagonal = variances(estimate)
+    y = 1 / np.sqrt(diagonal)
+    y /= np.sqrt(y @ estimate.matvec(y))
+    for iteration in range(1, max_iterations + 1):
+        # Each coordinate's exact minimizer of ½y'Σy - Σ b·log y, holding the others fixed
+        cross = estimate.matvec(y) - diagonal * y
+        updated = (-cross + np.sqrt(cross ** 2 + 4 * diagonal * budgets)) / (2 * diagonal)
+        y = 0.5 * (y + updated)
+        contributions = y * estimate.matvec(y)
+        if np.max(np.abs(contributions / contributions.sum() - budgets)) < tolerance:
+            break
+    return y / y.sum(), iteration
+
+
+def _project_capped_simplex(v, cap):
+    # Euclidean projection onto {0 ≤ w ≤ cap, Σw = 1}: bisection on the shift, vectorized over names
+    low, high = v.min() - 1, v.max()
+    for _ in range(50):
+        shift = (low + high) / 2
+        if np.clip(v - shift, 0, cap).sum() > 1:
+            low = shift
+        else:
+            high = shift
+    return np.clip(v - high, 0, cap)
+
+
+def min_variance_weights(estimate, max_weight=MAX_WEIGHT, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """
+    Long-only minimum variance weights with a per-name cap, by accelerated projected gradient.
+
+    Returns:
+        A tuple (weights, iterations).
+
+    Raises:
+        ValueError: max_weight is too small for the weights to add up to 100%.
+    """
+    n = len(estimate.symbols)
+    if max_weight * n < 1:
+        raise ValueError(f"A {max_weight:.1%} cap on {n} names can't add up to 100%")
+    # Step size from Σ's largest eigenvalue (power iteration, again only Σ·v products)
+    v = np.random.default_rng(0).random(n)
+    for _ in range(50):
+        v = estimate.matvec(v)
+        v /= np.linalg.norm(v)
+    step = 1 / float(v @ estimate.matvec(v))
+
+    w = _project_capped_simplex(inverse_volatility_weights(estimate), max_weight)
+    z, momentum = w.copy(), 1.0
+    for iteration in range(1, max_iterations + 1):
+        updated = _project_capped_simplex(z - step * estimate.matvec(z), max_weight)
+        if (z - updated) @ (updated - w) > 0:
+            # Momentum is pointing uphill: restart it (keeps accelerated descent from oscillating)
+            momentum = 1.0
+        next_momentum = (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2
+        z = updated + (momentum - 1) / next_momentum * (updated - w)
+        converged = np.max(np.abs(updated - w)) < tolerance
+        w, momentum = updated, next_momentum
+        if converged:
+            break
+    return w, iteration
+
+
+def solve_weights(estimate, method, max_weight=MAX_WEIGHT):
+    if method == "inverse_volatility":
+        return inverse_volatility_weights(estimate), 1
+    if method == "risk_parity":
+        return risk_parity_weights(estimate)
+    if method == "min_variance":
+        return min_variance_weights(estimate, max_weight)
+    raise ValueError(f"Unknown method: {method}")
+
+
+def allocation_records(symbols, weights, names=None, min_weight_pct=MIN_WEIGHT_PCT):
+    # asset_allocation.json rows, largest first; the generated targets are all direct holdings
+    names = names or {}
+    records = []
+    for i in np.argsort(-weights).tolist():
+        weight = round(float(weights[i]) * 100, 2)
+        if weight > min_weight_pct:
+            records.append({
+                "Stock Symbol": symbols[i],
+                "Direct Holding Weight (%)": weight,
+                "MF Holding Weight (%)": 0,
+                "Total Weight (%)": weight,
+                "actual_name": names.get(symbols[i], symbols[i]),
+            })
+    return records
+
+
+def generate_targets(store, symbols, method="risk_parity", end=None, lookback=LOOKBACK_DAYS,
+                     max_weight=MAX_WEIGHT, names=None):
+    """
+    Target weights for symbols from their local price history.
+
+    Returns:
+        A tuple (records in asset_allocation.json format, summary dict).
+    """
+    estimate = load_covariance(store, symbols, end, lookback)
+    if not estimate.symbols:
+        raise ValueError("Not enough price history for any of the symbols; run portfolio_risk.py --backfill first")
+    start = time.perf_counter()
+    weights, iterations = solve_weights(estimate, method, max_weight)
+    solve_seconds = time.perf_counter() - start
+
+    sigma_w = estimate.matvec(weights)
+    contributions = weights * sigma_w / float(weights @ sigma_w)
+    summary = {
+        "method": method,
+        "as_of": estimate.as_of,
+        "symbols": len(estimate.symbols),
+        "skipped": sorted(set(symbols) - set(estimate.symbols)),
+        "iterations": iterations,
+        "solve_seconds": round(solve_seconds, 4),
+        "volatility_pct": round(float(np.sqrt(weights @ sigma_w * TRADING_DAYS)) * 100, 2),
+        "max_share_of_risk_pct": round(float(contributions.max()) * 100, 2),
+    }
+    return allocation_records(estimate.symbols, weights, names), summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate asset_allocation.json targets from local price history")
+    parser.add_argument("--method", choices=METHODS, default="risk_parity")
+    parser.add_argument("--universe", default=ASSET_ALLOCATION_PATH, help="asset_allocation.json-style file whose symbols are weighted")
+    parser.add_argument("--output", default=None, help=f"Default: {OUTPUT_PATH}")
+    parser.add_argument("--force", action="store_true", help="Allow --output to overwrite the --universe file")
+    parser.add_argument("--as-of", default=None, help="Use prices up to this date (YYYY-MM-DD)")
+    parser.add_argument("--lookback", type=int, default=LOOKBACK_DAYS, help="Daily returns in the estimation window")
+    parser.add_argument("--max-weight", type=float, default=MAX_WEIGHT * 100, help="Per-name cap in %% (min_variance)")
+    args = parser.parse_args()
+
+    output = args.output or OUTPUT_PATH.format(method=args.method)
+    # Names without enough history or below the cut-off are dropped from the output, so writing
+    # over the universe would lose them for every later run
+    if os.path.exists(output) and os.path.samefile(output, args.universe) and not args.force:
+        print(f"Error: {output} is the universe file; pass --force to overwrite it")
+        sys.exit(1)
+
+    with open(args.universe, 'r') as f:
+        universe = json.load(f)
+    names = {item["Stock Symbol"]: item.get("actual_name", item["Stock Symbol"]) for item in universe if item.get("Stock Symbol")}
+
+    store = PortfolioStore()
+    try:
+        records, summary = generate_targets(store, sorted(names), args.method, args.as_of or date.today().isoformat(),
+                                            args.lookback, args.max_weight / 100, names)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    finally:
+        store.close()
+
+    with open(output, 'w') as f:
+        json.dump(records, f, indent=4)
+    print(f"{summary['method']} weights for {summary['symbols']} names (prices as of {summary['as_of']}) "
+          f"in {summary['iterations']} iterations, {summary['solve_seconds'] * 1000:.1f} ms")
+    print(f"Expected volatility {summary['volatility_pct']:.2f}%, largest share of risk {summary['max_share_of_risk_pct']:.2f}%")
+    if summary["skipped"]:
+        print(f"Skipped (not enough price history): {', '.join(summary['skipped'])}")
+    print(f"Targets saved to: {output} ({len(records)} names)")
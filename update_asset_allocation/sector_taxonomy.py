@@ -0,0 +1,122 @@
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from rebalancing.sector_caps import UNCLASSIFIED
+from update_asset_allocation.fund_stock_matrix import BREAKDOWN_DIR, breakdown_signature
+from update_asset_allocation.stock_symbols import clean_stock_name
+
+SECTOR_INDEX_PATH = 'data/mapping_data/stock_sector_index.json'
+STOCK_BREAKDOWN_PATH = 'data/portfolio_data/portfolio_stockbreakdown.json'
+OTHERS = 'Others'
+
+# Normalized sector taxonomy. Scraped labels differ by fund ("Bank - Private", "Banks",
+# "Private Sector Bank"), so each label is mapped to one of these by the first matching rule.
+# Order matters: more specific rules come before the broad ones that would also match.
+SECTOR_RULES = [
+    ("Banks", r"\bbank"),
+    ("Insurance", r"insurance"),
+    ("Financial Services", r"financ|nbfc|capital market|broking|stock ?broker|asset management|exchange|depositor|credit|lending|holding compan|investment"),
+    ("Information Technology", r"\bit\b|software|computer|information technology|internet|digital|data processing"),
+    ("Healthcare", r"pharma|health|hospital|diagnostic|biotech|medical|drug|life science"),
+    ("Automobiles", r"\bauto\b|automobile|vehicle|\btyre|\btire|two wheeler|tractor"),
+    ("Consumer Staples", r"fmcg|food|beverage|personal (care|product)|household|cigarette|tobacco|\btea\b|coffee|edible oil|sugar|dairy|breweries|distiller"),
+    ("Oil & Gas", r"\boil\b|\bgas\b|petroleum|refiner|crude|lubricant|petrochemical"),
+    ("Power", r"power|electric utilit|utilities|renewable|solar|wind energy|transmission"),
+    ("Metals & Mining", r"metal|steel|iron|alumin|copper|zinc|\bmining|mineral|ferro|coal"),
+    ("Cement & Building Materials", r"cement|construction material|building product|ceramic|tiles|sanitary|plywood|granite"),
+    ("Chemicals", r"chemical|fertili|pesticide|agro ?chem|paint|plastic|polymer|gases|dyes|pigment"),
+    ("Realty", r"realty|real estate|residential|commercial project"),
+    ("Telecom", r"telecom|communication|cellular|wireless"),
+    ("Media & Entertainment", r"media|entertainment|broadcast|film|publishing|advertising|printing"),
+    ("Consumer Discretionary", r"retail|consumer|durable|textile|apparel|garment|footwear|leisure|hotel|restaurant|jewel|gems|e commerce|travel|education|furniture|electronics"),
+    ("Transport & Logistics", r"logistic|transport|shipping|airline|aviation|\bport|railway|courier"),
+    ("Capital Goods", r"capital goods|industrial|engineering|equipment|machinery|aerospace|defen[cs]e|construction|infrastructure|cables|electrical|bearings|castings|compressor|pumps"),
+]
+SECTORS = [name for name, _ in SECTOR_RULES] + [OTHERS, UNCLASSIFIED]
+SECTOR_CODES = {name: code for code, name in enumerate(SECTORS)}
+_COMPILED_RULES = [(name, re.compile(pattern)) for name, pattern in SECTOR_RULES]
+
+
+@lru_cache(maxsize=None)
+def normalize_sector(label):
+    # Map a scraped sector label to the taxonomy; unknown labels go to 'Others'
+    if not label or label.strip() in ('-', 'N/A'):
+        return UNCLASSIFIED
+    if label in SECTOR_CODES:
+        return label
+    text = re.sub(r'[^a-z0-9]+', ' ', label.lower().replace('&', ' and '))
+    for name, pattern in _COMPILED_RULES:
+        if pattern.search(text):
+            return name
+    return OTHERS
+
+
+def sector_code(label):
+    return SECTOR_CODES[normalize_sector(label)]
+
+
+class SectorIndex:
+    """
+    Precomputed cleaned stock name → normalized sector code.
+
+    A stock's sector is the label most funds agree on after normalization, instead of whichever
+    breakdown happened to be read first. Codes index SECTORS, so rollups are a single bincount.
+    """
+
+    def __init__(self, stock_codes):
+        self.stock_codes = stock_codes
+
+    @classmethod
+    def build(cls, breakdown_dir=BREAKDOWN_DIR):
+        votes = {}
+        for file_name in sorted(f for f in os.listdir(breakdown_dir) if f.endswith('.json')):
+            with open(os.path.join(breakdown_dir, file_name), 'r') as f:
+                breakdown = json.load(f)
+            for stock in breakdown:
+                code = sector_code(stock.get('Sector'))
+                if code != SECTOR_CODES[UNCLASSIFIED]:
+                    votes.setdefault(clean_stock_name(stock['Stock']), Counter())[code] += 1
+        return cls({name: counts.most_common(1)[0][0] for name, counts in votes.items()})
+
+    @classmethod
+    def load(cls, breakdown_dir=BREAKDOWN_DIR, cache_path=SECTOR_INDEX_PATH):
+        # Rebuilt only when the breakdown files change; the cache stores sector names, not codes,
+        # so reordering the taxonomy doesn't silently invalidate it
+        signature = breakdown_signature(breakdown_dir)
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('signature') == signature:
+                return cls({name: SECTOR_CODES[sector] for name, sector in cached['stocks'].items() if sector in SECTOR_CODES})
+
+        index = cls.build(breakdown_dir)
+        if cache_path:
+            with open(cache_path, 'w') as f:
+                json.dump({'signature': signature, 'stocks': {name: SECTORS[code] for name, code in index.stock_codes.items()}}, f)
+        return index
+
+    def codes_for(self, stock_names, fallback_labels=None):
+        # Sector code per stock; stocks missing from the index (e.g. direct holdings) use their own label
+        fallback_labels = fallback_labels if fallback_labels is not None else [None] * len(stock_names)
+        return np.fromiter(
+            (self.stock_codes.get(name, sector_code(label)) for name, label in zip(stock_names, fallback_labels)),
+            dtype=np.int32, count=len(stock_names)
+        )
+
+
+def sector_rollup(codes, values):
+    # ₹ per sector (indexed like SECTORS) in one vectorized group-by
+    return np.bincount(codes, weights=values, minlength=len(SECTORS))
+
+
+def load_symbol_sectors(stock_breakdown_path=STOCK_BREAKDOWN_PATH):
+    # NSE symbol → normalized sector, from the last portfolio_stockbreakdown.py run
+    with open(stock_breakdown_path, 'r') as f:
+        stock_breakdown = json.load(f)
+    return {
+        stock['Symbol']: normalize_sector(stock.get('Sector'))
+        for stock in stock_breakdown if stock.get('Symbol') and stock['Symbol'] != 'N/A'
+    }
@@ -0,0 +1,57 @@
+import csv
+from portfolio_common.reference_bundle import EQUITY_LIST_PATH, reference
+
+# Function to clean stock names
+def clean_stock_name(stock_name):
+    stock_name = stock_name.replace(' Ltd.', ' Limited').replace(' Ltd', ' Limited').replace(' Limited.', ' Limited')
+    stock_name = stock_name.replace(' Co.', ' Company').replace(' Co', ' Company').replace(' Company.', ' Company')
+    stock_name = stock_name.replace(' Inc.', ' Inc').replace(' Inc', ' Incorporated').replace(' Incorporated.', ' Incorporated')
+    stock_name = stock_name.replace('&', 'and')
+    stock_name = stock_name.strip()  # remove leading/trailing whitespaces
+    return stock_name
+
+# Load stock symbols from CSV and clean names during mapping
+def load_stock_symbol_map(csv_path=EQUITY_LIST_PATH):
+    stock_symbol_map = {}
+    company_names_list = []
+    try:
+        if csv_path == EQUITY_LIST_PATH:
+            # Already cleaned in the reference bundle
+            return reference('stock_symbol_map'), reference('company_names')
+        with open(csv_path, mode='r', encoding='utf-8') as csvfile:
+            csv_reader = csv.DictReader(csvfile)
+            for row in csv_reader:
+                cleaned_name = clean_stock_name(row['NAME OF COMPANY'])
+                stock_symbol_map[cleaned_name] = row['SYMBOL']
+                company_names_list.append(cleaned_name)
+    except FileNotFoundError:
+        print("Warning: EQUITY_L.csv not found. Stock symbols won't be mapped.")
+    return stock_symbol_map, company_names_list
+
+# Function to get stock symbol
+def get_stock_symbol(stock_name, stock_symbol_map, company_names_list):
+    cleaned_stock_name = clean_stock_name(stock_name)
+
+    # 1. Exact match
+    if cleaned_stock_name in stock_symbol_map:
+        return stock_symbol_map[cleaned_stock_name]
+
+    # 2. Partial matching
+    for company_name in company_names_list:
+        if cleaned_stock_name.lower() in company_name.lower():
+            return stock_symbol_map[company_name]
+
+    # 3. Fuzzy matching (fuzzywuzzy is only imported once a name gets this far)
+    from fuzzywuzzy import fuzz
+    best_match_symbol = None
+    best_match_score = 0
+    for company_name in company_names_list:
+        score = fuzz.token_set_ratio(cleaned_stock_name, company_name)
+        if score > best_match_score:
+            best_match_score = score
+            best_match_symbol = stock_symbol_map[company_name]
+
+    if best_match_score > 90:  # Adjustable threshold
+        return best_match_symbol
+
+    return None  # Return None if no good match